@@ -3,15 +3,44 @@ Fantasy Adventure Game with Chainlit Integration
 A multi-agent text-based game using LiteLLM, Gemini, and Chainlit for web interface
 """
 
-import random
 import asyncio
-import litellm
-import os
+import time
 import chainlit as cl
 from typing import Dict, Any
+import dice
+import rules
+import engine
+import session_store
+import metrics
+import router
+import scheduler
+import supervisor
+import turnlog
+import warmstart
+import world
+from engine import AgentSpec
+from conversation import ConversationStore
+from state import GameState, coerce
 
-# Set up LiteLLM for Gemini
-litellm.set_verbose = False
+# Set up LiteLLM for Gemini; it is imported by the warm-up (or the first model call)
+def _setup_litellm(litellm):
+    litellm.set_verbose = False
+
+engine.litellm = warmstart.lazy_module("litellm", on_load=_setup_litellm)
+
+# Model tiers for MODEL_ROUTER=on (prices in USD per million tokens)
+routing = router.get_router()
+local_tier = router.local_tier_from_env(prefix="openai/")
+if local_tier is not None:
+    routing.add_tier(local_tier)
+routing.add_tier(router.Tier("flash", "gemini/gemini-1.5-flash", 0.6, 0.075, 0.30, slo=5.0))
+routing.add_tier(router.Tier("pro", "gemini/gemini-1.5-pro", 0.9, 1.25, 5.00, slo=12.0))
+
+# Prometheus-style metrics on METRICS_PORT (if set)
+metrics.serve_from_env()
+
+# Shared world (GAME_WORLD=on): location context for the narrator, travel and news between players
+shared_world = world.world_from_env()
 
 # Game state will be stored in user session
 DEFAULT_GAME_STATE = {
@@ -23,213 +52,172 @@ DEFAULT_GAME_STATE = {
     "current_agent": "NarratorAgent"
 }
 
-# Tool functions
+# Tool functions (rolls come from the session's seeded dice roller; tables live in rules.py)
+@metrics.timed_tool
 def roll_dice():
     """Roll a 20-sided dice"""
-    result = random.randint(1, 20)
-    return result
+    return dice.d(rules.ROLL_SIDES)
 
+@metrics.timed_tool
 def generate_event():
     """Generate a random event for the story"""
-    events = [
-        {"type": "monster", "name": "goblin", "description": "A goblin attacks!"},
-        {"type": "monster", "name": "orc", "description": "An orc warrior appears!"},
-        {"type": "treasure", "item": "magic ring", "description": "You find a treasure chest!"},
-        {"type": "treasure", "item": "healing potion", "description": "You discover a hidden cache!"},
-        {"type": "story", "description": "You meet a wise old wizard"},
-        {"type": "story", "description": "You come across a mysterious merchant"}
-    ]
-    return random.choice(events)
-
-# Agent functions
-async def NarratorAgent(player_action: str, game_state: Dict[str, Any], conversation_history: Dict) -> tuple:
-    """Handles story and exploration"""
-    
-    # Check if player wants to give custom prompt
-    if player_action.lower().startswith("prompt:"):
-        custom_prompt = player_action[7:].strip()
-        
-        conversation_history["NarratorAgent"].append({"role": "user", "content": custom_prompt})
-        
-        response = await litellm.acompletion(
-            model="gemini/gemini-1.5-flash",
-            messages=conversation_history["NarratorAgent"],
-            temperature=0.7,
-            api_key=os.getenv("GOOGLE_API_KEY")
-        )
-        
-        ai_response = response.choices[0].message.content
-        conversation_history["NarratorAgent"].append({"role": "assistant", "content": ai_response})
-        
-        return f"🤖 **AI Response:** {ai_response}", "NarratorAgent"
-    
-    # Normal game flow
+    return rules.EVENT_TABLE.sample()
+
+# Agent specs
+def world_context(game_state: Dict[str, Any]):
+    return shared_world.context(game_state["location"]) if shared_world is not None else None
+
+def narrator_tools(game_state: Dict[str, Any]) -> Dict[str, Any]:
     event = generate_event()
-    
-    # Create prompt for AI
-    prompt = f"""
-    You are telling a fantasy story. The player is in a {game_state['location']} with {game_state['health']} health.
-    Player inventory: {game_state['inventory']}
-    The player said: "{player_action}"
-    A new event happened: {event['description']}
-    
-    Write 2-3 sentences about what happens next. Keep it simple and fun!
-    """
-    
-    conversation_history["NarratorAgent"].append({"role": "user", "content": prompt})
-    
-    response = await litellm.acompletion(
-        model="gemini/gemini-1.5-flash",
-        messages=conversation_history["NarratorAgent"][-5:],
-        temperature=0.7,
-        api_key=os.getenv("GOOGLE_API_KEY")
-    )
-    
-    story = response.choices[0].message.content
-    conversation_history["NarratorAgent"].append({"role": "assistant", "content": story})
-    
+    return {"event": event, "event_description": event["description"]}
+
+def narrator_transition(game_state: Dict[str, Any], facts: Dict[str, Any]) -> Dict[str, Any]:
+    return {"next_agent": rules.apply_event(game_state, facts["event"])}
+
+def narrator_result(game_state: Dict[str, Any], facts: Dict[str, Any], story: str, resolution: Dict[str, Any]) -> str:
+    event = facts["event"]
     result = f"📖 **Event:** {event['description']}\n\n📚 **Story:** {story}"
-    
-    # Check if we need to switch agents
-    if event["type"] == "monster":
-        game_state["in_combat"] = True
-        game_state["enemy"] = event["name"]
-        return result + "\n\n⚔️ **Combat initiated!**", "MonsterAgent"
-    elif event["type"] == "treasure":
-        game_state["inventory"].append(event["item"])
-        return result + f"\n\n🎒 **Added {event['item']} to inventory!**", "ItemAgent"
-    else:
-        return result, "NarratorAgent"
-
-async def MonsterAgent(player_action: str, game_state: Dict[str, Any], conversation_history: Dict) -> tuple:
-    """Handles fighting monsters"""
-    
-    # Check if player wants to give custom prompt
-    if player_action.lower().startswith("prompt:"):
-        custom_prompt = player_action[7:].strip()
-        
-        conversation_history["MonsterAgent"].append({"role": "user", "content": custom_prompt})
-        
-        response = await litellm.acompletion(
-            model="gemini/gemini-1.5-flash",
-            messages=conversation_history["MonsterAgent"],
-            temperature=0.7,
-            api_key=os.getenv("GOOGLE_API_KEY")
-        )
-        
-        ai_response = response.choices[0].message.content
-        conversation_history["MonsterAgent"].append({"role": "assistant", "content": ai_response})
-        
-        return f"🤖 **AI Response:** {ai_response}", "MonsterAgent"
-    
-    # Normal combat flow
-    player_roll = roll_dice()
-    enemy_roll = roll_dice()
-    
-    prompt = f"""
-    The player is fighting a {game_state['enemy']}!
-    Player action: "{player_action}"
+    if resolution["next_agent"] == "MonsterAgent":
+        result += "\n\n⚔️ **Combat initiated!**"
+    elif resolution["next_agent"] == "ItemAgent":
+        result += f"\n\n🎒 **Added {event['item']} to inventory!**"
+    return result
+
+def monster_tools(game_state: Dict[str, Any]) -> Dict[str, Any]:
+    return {"player_roll": roll_dice(), "enemy_roll": roll_dice()}
+
+def monster_transition(game_state: Dict[str, Any], facts: Dict[str, Any]) -> Dict[str, Any]:
+    return rules.resolve_combat(game_state, facts["player_roll"], facts["enemy_roll"])
+
+def monster_result(game_state: Dict[str, Any], facts: Dict[str, Any], story: str, resolution: Dict[str, Any]) -> str:
+    return rules.combat_result_text(game_state, facts["player_roll"], facts["enemy_roll"], story, resolution)
+
+def item_tools(game_state: Dict[str, Any]) -> Dict[str, Any]:
+    return {"item_roll": roll_dice()}
+
+def item_transition(game_state: Dict[str, Any], facts: Dict[str, Any]) -> Dict[str, Any]:
+    return rules.resolve_item(game_state, facts["item_roll"])
+
+def item_result(game_state: Dict[str, Any], facts: Dict[str, Any], story: str, resolution: Dict[str, Any]) -> str:
+    return rules.item_result_text(game_state, facts["item_roll"], story, resolution)
+
+engine.register(AgentSpec(
+    name="NarratorAgent",
+    instructions="""
+    You are telling a fantasy story. Each turn gives the player's location, health and inventory,
+    what the player said, and a new event that just happened.
+    Write 2-3 sentences about what happens next. Keep it simple and fun!
+    Then offer 2-3 numbered choices for what the player could do next.
+    """,
+    template="""
+    Location: {location}
+    Health: {health}
+    Player inventory: {inventory}
+    A new event happened: {event_description}
+    The player said: "{player_action}"
+    """,
+    tools=narrator_tools,
+    transition=narrator_transition,
+    format_result=narrator_result,
+    stream_header=lambda facts: f"📖 **Event:** {facts['event_description']}\n\n📚 **Story:** ",
+    cache_fields=("location", "health", "inventory", "event_description"),
+    context=world_context,
+))
+
+engine.register(AgentSpec(
+    name="MonsterAgent",
+    instructions="""
+    The player is in a fight. Each turn gives the enemy, the player's action, both d20 rolls and the player's health.
+    Write 2-3 sentences about the fight. If player_roll > enemy_roll, player wins.
+    If enemy_roll > player_roll, player takes damage.
+    """,
+    template="""
+    The player is fighting a {enemy}!
+    Player health: {health}
     Player rolled: {player_roll}
     Enemy rolled: {enemy_roll}
-    Player health: {game_state['health']}
-    
-    Write 2-3 sentences about the fight. If player_roll > enemy_roll, player wins. 
-    If enemy_roll > player_roll, player takes damage.
-    """
-    
-    conversation_history["MonsterAgent"].append({"role": "user", "content": prompt})
-    
-    response = await litellm.acompletion(
-        model="gemini/gemini-1.5-flash",
-        messages=conversation_history["MonsterAgent"][-5:],
-        temperature=0.7,
-        api_key=os.getenv("GOOGLE_API_KEY")
-    )
-    
-    combat_story = response.choices[0].message.content
-    conversation_history["MonsterAgent"].append({"role": "assistant", "content": combat_story})
-    
-    result = f"🎲 **Your roll:** {player_roll} | **Enemy roll:** {enemy_roll}\n\n⚔️ **Combat:** {combat_story}"
-    
-    # Update game based on dice rolls
-    if player_roll > enemy_roll:
-        result += "\n\n✅ **You won the fight!**"
-        game_state["in_combat"] = False
-        game_state["enemy"] = None
-        return result, "NarratorAgent"
-    else:
-        game_state["health"] -= 20
-        result += f"\n\n❤️ **You took damage! Health: {game_state['health']}**"
-        if game_state["health"] <= 0:
-            result += "\n\n💀 **Game Over!**"
-            return result, "game_over"
-        return result, "MonsterAgent"
-
-async def ItemAgent(player_action: str, game_state: Dict[str, Any], conversation_history: Dict) -> tuple:
-    """Handles items and inventory"""
-    
-    # Check if player wants to give custom prompt
-    if player_action.lower().startswith("prompt:"):
-        custom_prompt = player_action[7:].strip()
-        
-        conversation_history["ItemAgent"].append({"role": "user", "content": custom_prompt})
-        
-        response = await litellm.acompletion(
-            model="gemini/gemini-1.5-flash",
-            messages=conversation_history["ItemAgent"],
-            temperature=0.7,
-            api_key=os.getenv("GOOGLE_API_KEY")
-        )
-        
-        ai_response = response.choices[0].message.content
-        conversation_history["ItemAgent"].append({"role": "assistant", "content": ai_response})
-        
-        return f"🤖 **AI Response:** {ai_response}", "ItemAgent"
-    
-    # Normal item flow
-    item_roll = roll_dice()
-    
-    prompt = f"""
-    The player found an item! Their inventory has: {game_state['inventory']}
     Player action: "{player_action}"
-    Item roll: {item_roll}
-    Player health: {game_state['health']}
-    
+    """,
+    tools=monster_tools,
+    transition=monster_transition,
+    format_result=monster_result,
+    stream_header=lambda facts: f"🎲 **Your roll:** {facts['player_roll']} | **Enemy roll:** {facts['enemy_roll']}\n\n⚔️ **Combat:** ",
+    mechanical=True,
+    quality=0.3,
+    cache_fields=("enemy",),
+))
+
+engine.register(AgentSpec(
+    name="ItemAgent",
+    instructions="""
+    The player has found an item. Each turn gives their inventory, health, the item roll and their action.
     Write 2-3 sentences about the item they found. If roll > 10, it's a great item!
-    """
-    
-    conversation_history["ItemAgent"].append({"role": "user", "content": prompt})
-    
-    response = await litellm.acompletion(
-        model="gemini/gemini-1.5-flash",
-        messages=conversation_history["ItemAgent"][-5:],
-        temperature=0.7,
-        api_key=os.getenv("GOOGLE_API_KEY")
-    )
-    
-    item_story = response.choices[0].message.content
-    conversation_history["ItemAgent"].append({"role": "assistant", "content": item_story})
-    
-    result = f"🎲 **Item roll:** {item_roll}\n\n🎒 **Item Discovery:** {item_story}"
-    
-    # Maybe heal player if they found something good
-    if item_roll > 15:
-        game_state["health"] = min(100, game_state["health"] + 30)
-        result += f"\n\n✨ **You feel better! Health: {game_state['health']}**"
-    
-    return result, "NarratorAgent"
+    """,
+    template="""
+    The player found an item! Their inventory has: {inventory}
+    Player health: {health}
+    Item roll: {item_roll}
+    Player action: "{player_action}"
+    """,
+    tools=item_tools,
+    transition=item_transition,
+    format_result=item_result,
+    stream_header=lambda facts: f"🎲 **Item roll:** {facts['item_roll']}\n\n🎒 **Item Discovery:** ",
+    mechanical=True,
+    quality=0.3,
+))
+
+# Session records live in the shared session store
+session_store.register_type("conversation", ConversationStore)
+session_store.register_type("game_state", GameState)
+session_store.register_type("dice", dice.DiceRoller)
+
+# Turn log (TURN_LOG) for replay and regression runs
+turnlog.configure("app", flavor=engine.FLAVOR_MODE, world=shared_world is not None)
+
+# Warm-up (WARM_START): import LiteLLM before the first turn needs it
+warmstart.step("litellm", lambda: warmstart.load(engine.litellm))
+warmstart.start()
+
+def share_turn(key: str, before: GameState, changes: Dict[str, Any], game_state: GameState) -> str:
+    """Tell the shared world about a finished turn; returns the news the player missed where they are"""
+    location = game_state["location"]
+    if "location" in changes:
+        shared_world.move_player(key, location)
+    if changes.get("enemy"):
+        shared_world.post(location, f"A {changes['enemy']} was seen prowling here.", key)
+    elif changes.get("in_combat") is False and before["enemy"]:
+        shared_world.post(location, f"An adventurer drove off a {before['enemy']}.", key)
+    if "inventory" in changes:
+        for item in set(changes["inventory"]) - set(before["inventory"]):
+            shared_world.post(location, f"An adventurer found a {item}.", key)
+    snapshot = shared_world.snapshot
+    news = snapshot.news_since(location, cl.user_session.get("world_seen", snapshot.version), exclude=key)
+    cl.user_session.set("world_seen", snapshot.version)
+    if not news:
+        return ""
+    return "\n\n🌍 **Meanwhile:** " + " ".join(event.text for event in news)
+
+def new_session_record(key: str) -> Dict[str, Any]:
+    """Fresh game state, conversation history and dice roller"""
+    return {
+        "game_state": GameState.from_dict(DEFAULT_GAME_STATE),
+        "conversation_history": engine.new_conversation_history(),
+        "dice": dice.DiceRoller.for_session(key),
+    }
 
 # Chainlit event handlers
 @cl.on_chat_start
 async def start():
     """Initialize the game when chat starts"""
-    # Initialize game state and conversation history
-    cl.user_session.set("game_state", DEFAULT_GAME_STATE.copy())
-    cl.user_session.set("conversation_history", {
-        "NarratorAgent": [],
-        "MonsterAgent": [],
-        "ItemAgent": []
-    })
+    # Initialize game state and conversation history (or resume a saved game)
+    store = session_store.get_store()
+    key = session_store.session_key(cl.user_session)
+    cl.user_session.set("session_key", key)
+    record, version = await store.load(key)
+    if record is None:
+        record = new_session_record(key)
+        await store.save(key, record, version)
     
     welcome_message = """
 # 🎮 Welcome to Fantasy Adventure Game!
@@ -255,7 +243,11 @@ async def start():
     await cl.Message(content=welcome_message).send()
     
     # Send initial status
-    game_state = cl.user_session.get("game_state")
+    game_state = coerce(record["game_state"])
+    if shared_world is not None:
+        await shared_world.restore(store)
+        shared_world.move_player(key, game_state["location"])
+        cl.user_session.set("world_seen", shared_world.snapshot.version)
     status_msg = f"❤️ **Health:** {game_state['health']} | 🎒 **Inventory:** {', '.join(game_state['inventory'])} | 📍 **Location:** {game_state['location']}"
     await cl.Message(content=status_msg).send()
 
@@ -263,10 +255,25 @@ async def start():
 async def main(message: cl.Message):
     """Handle user messages"""
     user_input = message.content.strip()
-    
-    # Get game state and history from session
-    game_state = cl.user_session.get("game_state")
-    conversation_history = cl.user_session.get("conversation_history")
+    turn_started = time.perf_counter()
+    metrics.start_turn()
+    
+    # A new message cancels a turn that is still generating
+    previous_turn = cl.user_session.get("turn_task")
+    if previous_turn is not None and not previous_turn.done():
+        previous_turn.cancel()
+    cl.user_session.set("turn_task", asyncio.current_task())
+    
+    # Get game state and history from the session store
+    store = session_store.get_store()
+    key = cl.user_session.get("session_key")
+    scheduler.use_session(key)
+    with metrics.span("session_load"):
+        record, version = await store.load(key)
+    game_state = record["game_state"] = coerce(record["game_state"])
+    conversation_history = record["conversation_history"]
+    roller = record.setdefault("dice", dice.DiceRoller.for_session(key))
+    dice.use(roller)
     
     # Handle special commands
     if user_input.lower() == "status":
@@ -285,7 +292,7 @@ async def main(message: cl.Message):
         current_agent = game_state['current_agent']
         history_msg = f"📚 **Conversation History for {current_agent}:**\n\n"
         
-        for i, msg in enumerate(conversation_history[current_agent][-6:]):
+        for i, msg in enumerate(conversation_history.recent(current_agent, 6)):
             role = "You" if msg["role"] == "user" else "AI"
             content = msg["content"][:150] + "..." if len(msg["content"]) > 150 else msg["content"]
             history_msg += f"{i+1}. **{role}:** {content}\n\n"
@@ -295,50 +302,79 @@ async def main(message: cl.Message):
     
     elif user_input.lower() == "restart":
         # Reset game state
-        cl.user_session.set("game_state", DEFAULT_GAME_STATE.copy())
-        cl.user_session.set("conversation_history", {
-            "NarratorAgent": [],
-            "MonsterAgent": [],
-            "ItemAgent": []
-        })
+        engine.cancel_speculation(key)
+        if engine.narrative_memory is not None:
+            await engine.narrative_memory.forget(key)
+        await store.save(key, new_session_record(key), version)
+        if shared_world is not None:
+            shared_world.move_player(key, DEFAULT_GAME_STATE["location"])
         await cl.Message(content="🔄 **Game restarted!** Your adventure begins anew in the village.").send()
         return
     
     # Handle game logic
     current_agent = game_state['current_agent']
     
+    thinking_msg = cl.Message(content=f"🤖 **{current_agent.replace('_', ' ').title()} is thinking...**")
+    # UI sends run in the background, in order, while the turn works
+    tasks = supervisor.get(cl.user_session.get("id"))
+    # Copy-on-write snapshot for the state delta; a turn that does not complete is simply not saved
+    # (the loaded record is this turn's own copy)
+    before = game_state.snapshot()
+    turn = turnlog.begin(key, user_input, current_agent, before, roller.to_state())
     try:
-        # Show thinking message
-        thinking_msg = cl.Message(content=f"🤖 **{current_agent.replace('_', ' ').title()} is thinking...**")
-        await thinking_msg.send()
+        # Show thinking message (streaming waits for it to arrive)
+        sent = tasks.ui(thinking_msg.send())
         
-        # Call appropriate agent
-        if current_agent == "NarratorAgent":
-            result, next_agent = await NarratorAgent(user_input, game_state, conversation_history)
-        elif current_agent == "MonsterAgent":
-            result, next_agent = await MonsterAgent(user_input, game_state, conversation_history)
-        elif current_agent == "ItemAgent":
-            result, next_agent = await ItemAgent(user_input, game_state, conversation_history)
-        else:
-            result = "💀 **Game Over!** Type `restart` to play again."
-            next_agent = "game_over"
+        # Travel to a neighboring location of the shared world ("I head into the forest")
+        if shared_world is not None and current_agent == "NarratorAgent":
+            destination = shared_world.graph.route(game_state["location"], user_input)
+            if destination is not None:
+                game_state["location"] = destination
         
-        # Update thinking message with result
-        thinking_msg.content = result
-        await thinking_msg.update()
+        # Call appropriate agent (unknown agents, e.g. "game_over", end the game)
+        result, next_agent = await engine.run_turn(current_agent, user_input, game_state, conversation_history,
+                                                   thinking_msg, session=key, ready=sent)
         
         # Update game state
         game_state['current_agent'] = next_agent
         
-        # Show updated status if significant changes
-        if game_state['health'] != DEFAULT_GAME_STATE['health'] or len(game_state['inventory']) > 2:
-            status_msg = f"❤️ **Health:** {game_state['health']} | 🎒 **Inventory:** {', '.join(game_state['inventory'])}"
-            await cl.Message(content=status_msg).send()
+        # Show updated status with the result if significant changes
+        changes = game_state.diff(before)
+        if "health" in changes or "inventory" in changes:
+            result += f"\n\n❤️ **Health:** {game_state['health']} | 🎒 **Inventory:** {', '.join(game_state['inventory'])}"
+        if shared_world is not None:
+            result += share_turn(key, before, changes, game_state)
         
-        # Save updated state
-        cl.user_session.set("game_state", game_state)
-        cl.user_session.set("conversation_history", conversation_history)
+        # Update thinking message with result
+        thinking_msg.content = result
+        tasks.ui(thinking_msg.update())
+        
+        # Save updated state (while the update is on its way)
+        with metrics.span("session_save"):
+            await store.save(key, record, version)
         
+        metrics.TURNS.inc(agent=current_agent)
+        if metrics.sampled():
+            metrics.TURN_SECONDS.observe(time.perf_counter() - turn_started, agent=current_agent)
+        turnlog.end(turn, next_agent, changes, time.perf_counter() - turn_started)
+        
+    except asyncio.CancelledError:
+        thinking_msg.content = "⏹️ **Interrupted** - handling your new message instead."
+        tasks.ui(thinking_msg.update())
+        raise
+    except session_store.VersionConflict:
+        tasks.ui(cl.Message(content="⚠️ **Your game was updated from another window.** This turn was not saved; please try again.").send())
+    except scheduler.Overloaded:
+        thinking_msg.content = "⏳ **The storytellers are busy right now.** Please try your action again in a moment."
+        tasks.ui(thinking_msg.update())
     except Exception as e:
-        await cl.Message(content=f"❌ **Error:** {str(e)}\n\nMake sure your GOOGLE_API_KEY is set correctly!").send()
+        tasks.ui(cl.Message(content=f"❌ **Error:** {str(e)}\n\nMake sure your GOOGLE_API_KEY is set correctly!").send())
+
+@cl.on_chat_end
+async def end():
+    """Flush the session's pending UI sends and flavor text, stop its speculation and leave the world"""
+    engine.cancel_speculation(cl.user_session.get("session_key"))
+    if shared_world is not None:
+        shared_world.leave(cl.user_session.get("session_key"))
+    await supervisor.close(cl.user_session.get("id"))
 
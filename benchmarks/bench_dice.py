@@ -0,0 +1,62 @@
+"""
+Benchmark: dice engine throughput in rolls per second
+Global random.randint/random.choice one at a time vs the seeded roller's batched draws,
+alias-table event sampling and the bulk API used by simulations
+
+Usage: python benchmarks/bench_dice.py [rolls]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dice
+
+EVENTS = ["goblin", "orc", "magic ring", "healing potion", "wizard", "merchant"]
+
+
+def rate(label: str, func, rolls: int):
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<48} {rolls / elapsed:>14,.0f} rolls/s")
+
+
+def run(rolls: int):
+    roller = dice.DiceRoller(seed=1)
+    table = dice.AliasTable(EVENTS, [2, 2, 1, 1, 3, 3])
+    expression = dice.parse("4d6kh3+2")
+    print(f"{rolls:,} rolls each, numpy {'available' if dice.np is not None else 'not installed'}\n")
+
+    rate("random.randint(1, 20) loop", lambda: [random.randint(1, 20) for _ in range(rolls)], rolls)
+    rate("roller.randint(20) loop", lambda: [roller.randint(20) for _ in range(rolls)], rolls)
+    rate("roller.ints(20, n)", lambda: roller.ints(20, rolls), rolls)
+    rate("roller.bulk(20, n)", lambda: roller.bulk(20, rolls), rolls)
+
+    print()
+    rate("random.choices(weights) loop", lambda: [random.choices(EVENTS, [2, 2, 1, 1, 3, 3])[0]
+                                                  for _ in range(rolls)], rolls)
+    rate("AliasTable.sample loop", lambda: [table.sample(roller) for _ in range(rolls)], rolls)
+    rate("AliasTable.sample_many(n)", lambda: table.sample_many(rolls, roller), rolls)
+
+    print()
+    count = rolls // 4
+
+    def naive():
+        for _ in range(count):
+            sum(sorted(random.randint(1, 6) for _ in range(4))[1:]) + 2
+    rate("4d6kh3+2 with random.randint (expressions)", naive, count)
+    rate("4d6kh3+2 roll() loop (expressions)", lambda: [expression.roll(roller).total for _ in range(count)], count)
+    rate("4d6kh3+2 roll_many(n) (expressions)", lambda: expression.roll_many(count, roller), count)
+
+    replay = dice.DiceRoller(seed=1)
+    again = dice.DiceRoller(seed=1)
+    same = [replay.randint(20) for _ in range(5000)] == [again.randint(20) for _ in range(5000)]
+    print(f"\nsame seed replays identically: {same}")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,72 @@
+"""
+Micro-benchmark: per-turn Python overhead of the agent engine, excluding network time
+The model call is replaced by an immediate stub so only engine work is measured
+
+Usage: python benchmarks/bench_engine.py [turns]
+"""
+
+import asyncio
+import os
+import sys
+import time
+import timeit
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_chainlit
+
+
+async def run(turns: int):
+    fake_chainlit.install()
+    import app
+    import engine
+
+    reply = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="The story goes on."))])
+
+    async def stub_acompletion(**kwargs):
+        return reply
+
+    engine.litellm.acompletion = stub_acompletion
+    engine.FLAVOR_MODE = "off"
+    engine.response_cache = None
+
+    print(f"{'agent':>13} {'us/turn':>9}")
+    for agent in engine.AGENTS:
+        game_state = {**app.DEFAULT_GAME_STATE, "inventory": ["sword", "potion"], "enemy": "goblin"}
+        history = engine.new_conversation_history()
+        started = time.perf_counter()
+        for _ in range(turns):
+            game_state["health"] = 100
+            game_state["inventory"] = ["sword", "potion"]
+            await engine.run_turn(agent, "I look around", game_state, history)
+        elapsed = time.perf_counter() - started
+        print(f"{agent:>13} {elapsed / turns * 1e6:>9.2f}")
+
+    # Template rendering: precompiled vs str.format on every call
+    spec = engine.AGENTS["NarratorAgent"]
+    fields = {**app.DEFAULT_GAME_STATE, "player_action": "I look around", "event_description": "A goblin attacks!"}
+    compiled = timeit.timeit(lambda: spec.compiled.render(fields), number=100_000)
+    formatted = timeit.timeit(lambda: spec.template.format(**fields), number=100_000)
+    print(f"\ntemplate render: compiled {compiled * 10:.2f} us, str.format {formatted * 10:.2f} us")
+
+    # Dispatch: registry lookup vs the old if/elif chain
+    names = ["NarratorAgent", "MonsterAgent", "ItemAgent"]
+
+    def chain(name):
+        if name == "NarratorAgent":
+            return 1
+        elif name == "MonsterAgent":
+            return 2
+        elif name == "ItemAgent":
+            return 3
+        return None
+
+    lookup = timeit.timeit(lambda: [engine.AGENTS.get(n) for n in names], number=100_000)
+    branch = timeit.timeit(lambda: [chain(n) for n in names], number=100_000)
+    print(f"dispatch x3: registry {lookup * 10:.2f} us, if/elif {branch * 10:.2f} us")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
@@ -0,0 +1,60 @@
+"""
+Benchmark: per-turn latency of mechanical turns, fast path vs model narration
+Runs app.py's MonsterAgent and ItemAgent specs against a stubbed litellm.acompletion with injected delay
+
+Usage: python benchmarks/bench_fast_path.py [turns] [delay_ms]
+"""
+
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_chainlit
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def run(turns: int, delay: float):
+    fake_chainlit.install()
+    import app
+    import engine
+    import supervisor
+
+    async def stub_acompletion(**kwargs):
+        await asyncio.sleep(delay)
+        message = SimpleNamespace(content="The goblin snarls and swings its rusty blade.")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    engine.litellm.acompletion = stub_acompletion
+    # Measure model latency, not cache hits
+    engine.response_cache = None
+
+    print(f"{'mode':>6} {'agent':>13} {'p50 ms':>9} {'p99 ms':>9}")
+    for mode in ("sync", "async", "off"):
+        engine.FLAVOR_MODE = mode
+        for agent in ("MonsterAgent", "ItemAgent"):
+            latencies = []
+            for _ in range(turns):
+                game_state = {**app.DEFAULT_GAME_STATE, "inventory": ["sword"], "enemy": "goblin",
+                              "in_combat": True, "health": 100}
+                history = engine.new_conversation_history()
+                started = time.perf_counter()
+                await engine.run_turn(agent, "I attack", game_state, history)
+                latencies.append((time.perf_counter() - started) * 1000)
+            print(f"{mode:>6} {agent:>13} {percentile(latencies, 50):>9.3f} {percentile(latencies, 99):>9.3f}")
+        # Let background flavor tasks (run by the session's supervisor) drain before switching modes
+        await supervisor.get(fake_chainlit.UserSession().get("id")).flush()
+
+
+if __name__ == "__main__":
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    delay_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 400
+    asyncio.run(run(turns, delay_ms / 1000))
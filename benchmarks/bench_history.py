@@ -0,0 +1,60 @@
+"""
+Benchmark: prompt size over a long session
+Compares the old unbounded chat_history list with ChatHistory compaction
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compaction import ChatHistory, estimate_tokens
+
+TURNS = 500
+REPLY = ("You push through the brambles and the path opens onto a moonlit clearing. "
+         "A fox watches you from the treeline. **What do you do?**\n"
+         "1. Follow the fox\n2. Make camp\n3. Return to the village")
+
+
+def game_state_for(turn: int) -> dict:
+    return {
+        "player": {"name": "Adventurer", "health": 50 - turn % 30, "gold": 20 + turn},
+        "inventory": ["Sword", "Armor", "Potion"],
+        "location": "Village",
+        "quest": "Find the Lost Gem",
+    }
+
+
+def run():
+    legacy = []
+    history = ChatHistory()
+    legacy_time = compact_time = 0.0
+
+    print(f"{'turn':>6} {'legacy tokens':>14} {'compacted tokens':>17}")
+    for turn in range(1, TURNS + 1):
+        action = f"I choose option {turn % 3 + 1}"
+        state = game_state_for(turn)
+
+        start = time.perf_counter()
+        legacy.append({"role": "user", "content": f"Action: {action}\nState: {json.dumps(state)}"})
+        legacy_tokens = sum(estimate_tokens(m["content"]) for m in legacy)
+        legacy.append({"role": "assistant", "content": REPLY})
+        legacy_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        messages = history.build_input("NarratorAgent", action, state)
+        compact_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        history.add_turn(action, REPLY)
+        compact_time += time.perf_counter() - start
+
+        if turn in (1, 10, 50, 100, 250, 500):
+            print(f"{turn:>6} {legacy_tokens:>14} {compact_tokens:>17}")
+
+    print(f"\nlegacy build time:    {legacy_time * 1000:.1f} ms total")
+    print(f"compacted build time: {compact_time * 1000:.1f} ms total")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,130 @@
+"""
+Benchmark: narrative memory retrieval
+Fills one session's memory index with synthetic turns (with a few planted ones), then measures
+indexing throughput, search latency at that size (numpy when installed, otherwise the stdlib
+fallback), recall latency through the thread pool as a turn sees it, event loop lag while turns are
+being indexed in the background, and whether the planted turns are the ones recalled
+
+Usage: python benchmarks/bench_memory.py [turns] [queries]
+"""
+
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import memory
+
+PLACES = ["village", "tavern", "forest", "river", "ruins", "cave", "road", "mountain pass", "marsh", "tower"]
+FOES = ["wolf", "goblin", "bandit", "troll", "spider", "wraith", "boar", "cultist"]
+DEEDS = ["You strike the {foe} and it staggers back.", "The {foe} circles you in the {place}.",
+         "You rest in the {place} and bind your wounds.", "A merchant on the {place} sells you bread.",
+         "You search the {place} and find a few coins.", "The {foe} flees into the {place}."]
+ACTIONS = ["I attack the {foe}", "I look around the {place}", "I travel to the {place}", "I rest", "I search"]
+PLANTED = [
+    ("I ask the blacksmith Brom about the silver sword", "Brom swears to reforge the silver sword if you bring moonstone."),
+    ("I promise the widow Alma to find her lost son", "Alma gives you her son's carved wooden ring."),
+    ("I read the runes on the sealed vault door", "The runes name a key hidden beneath the drowned chapel."),
+]
+
+
+def synthetic_turn(rng: random.Random) -> str:
+    words = {"foe": rng.choice(FOES), "place": rng.choice(PLACES)}
+    return f"Player: {rng.choice(ACTIONS).format(**words)}\n{rng.choice(DEEDS).format(**words)}"
+
+
+def show(label: str, times: list):
+    times = sorted(times)
+    print(f"  {label:<40} p50 {times[len(times) // 2] * 1000:8.2f} ms, p99 {times[int(len(times) * 0.99)] * 1000:8.2f} ms")
+
+
+def fill(store: memory.NarrativeMemory, session: str, turns: int, rng: random.Random) -> list:
+    """Add synthetic turns in batches; the planted turns go in early and are returned with their positions"""
+    planted = {}
+    batch = []
+    started = time.perf_counter()
+    for n in range(turns):
+        if n in (turns // 10, turns // 3, turns // 2):
+            action, story = PLANTED[len(planted)]
+            planted[n] = f"Player: {action}\n{story}"
+            batch.append(planted[n])
+        else:
+            batch.append(synthetic_turn(rng))
+        if len(batch) == 1000:
+            store.add(session, batch)
+            batch = []
+    if batch:
+        store.add(session, batch)
+    elapsed = time.perf_counter() - started
+    print(f"indexed {turns:,} turns in {elapsed:.2f} s ({turns / elapsed:,.0f} turns/s, batches of 1,000); "
+          f"{os.path.getsize(os.path.join(store.path(session), 'vectors.f32')) / 2 ** 20:.1f} MiB of vectors")
+    return list(planted.values())
+
+
+async def loop_lag(store: memory.NarrativeMemory, session: str, rng: random.Random, turns: int) -> list:
+    """Event loop tick delays while turns are remembered one by one in the background"""
+    lags = []
+    pending = [asyncio.create_task(store.remember(session, synthetic_turn(rng))) for _ in range(turns)]
+    while any(not task.done() for task in pending):
+        started = time.perf_counter()
+        await asyncio.sleep(0)
+        lags.append(time.perf_counter() - started)
+    await asyncio.gather(*pending)
+    return lags
+
+
+async def recall_times(store: memory.NarrativeMemory, session: str, queries: list) -> list:
+    times = []
+    for query in queries:
+        started = time.perf_counter()
+        await store.recall(session, query)
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def run(turns: int, queries: int):
+    rng = random.Random(3)
+    directory = tempfile.mkdtemp(prefix="bench_memory_")
+    store = memory.NarrativeMemory(directory)
+    session = "bench"
+    try:
+        print(f"scoring with {'numpy' if memory.np is not None else 'the stdlib fallback (numpy not installed)'}, "
+              f"{memory.DEFAULT_DIM} hashed features")
+        planted = fill(store, session, turns, rng)
+        texts = [synthetic_turn(rng).split("\n")[0][len("Player: "):] for _ in range(queries)]
+
+        store.search(session, texts[0])  # maps the matrix
+        times = []
+        for query in texts:
+            started = time.perf_counter()
+            store.search(session, query)
+            times.append(time.perf_counter() - started)
+        print(f"at {len(store.index(session)):,} stored turns:")
+        show("search (in the calling thread)", times)
+        show("recall (thread pool hop + budget)", asyncio.run(recall_times(store, session, texts)))
+
+        found = 0
+        for text in planted:
+            action = text.split("\n")[0][len("Player: "):]
+            hits = store.search(session, action.replace("I ", "I again ", 1))
+            found += any(hit == text for _, hit in hits)
+        print(f"  planted turns recalled in the top {store.top_k}: {found}/{len(planted)}")
+
+        lags = asyncio.run(loop_lag(store, session, rng, 500))
+        print(f"while remembering 500 turns in the background ({len(lags):,} loop ticks):")
+        show("event loop tick", lags)
+    finally:
+        store.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 50,
+    )
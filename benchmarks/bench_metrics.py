@@ -0,0 +1,123 @@
+"""
+Benchmark: instrumentation overhead per turn
+Measures the cost of one turn's worth of spans/counters and compares it with turn time; the turn
+runs alternate spans off and on for a few rounds, each playing the same game, and the medians are compared
+
+Usage: python benchmarks/bench_metrics.py [turns] [model_delay_ms] [rounds]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import dice
+import fake_chainlit
+import metrics
+
+
+def instrumentation_bundle():
+    """Roughly what one app.py turn records"""
+    metrics.start_turn()
+    for stage in ("session_load", "ui_send", "prompt_build", "ui_send", "session_save"):
+        with metrics.span(stage, agent="NarratorAgent"):
+            pass
+    with metrics.span("tool", tool="generate_event"):
+        pass
+    metrics.TOKENS.inc(120, agent="NarratorAgent", direction="in")
+    metrics.TOKENS.inc(60, agent="NarratorAgent", direction="out")
+    if metrics.sampled():
+        metrics.MODEL_TTFT_SECONDS.observe(0.2, agent="NarratorAgent")
+        metrics.MODEL_SECONDS.observe(0.6, agent="NarratorAgent")
+        metrics.TURN_SECONDS.observe(0.6, agent="NarratorAgent")
+    metrics.TURNS.inc(agent="NarratorAgent")
+
+
+async def turn_time(turns: int, delay: float, sample_rate: float) -> tuple:
+    """Mean turn time and the agents that played each turn (identical for every sample rate)"""
+    import app
+    import engine
+    import session_store
+
+    text = "The story goes on."
+    reply = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+    async def chunks():
+        for word in text.split(" "):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))])
+
+    async def stub_acompletion(stream=False, **kwargs):
+        if delay:
+            await asyncio.sleep(delay)
+        return chunks() if stream else reply
+
+    engine.litellm.acompletion = stub_acompletion
+    engine.response_cache = None
+    engine.FLAVOR_MODE = "off"
+    metrics.SAMPLE_RATE = sample_rate
+
+    # Every run plays the same game: one session key (so a restart after a lost game reseeds the
+    # dice the same way) and a fresh record with the same dice; restarts are outside the timed section
+    dice.BASE_SEED = "7"
+    fake_chainlit.use_session("bench")
+    await app.start()
+    store = session_store.get_store()
+    key = fake_chainlit.sessions()["bench"]["session_key"]
+    _, version = await store.load(key)
+    record = app.new_session_record(key)
+    record["dice"] = dice.DiceRoller(seed=7)
+    await store.save(key, record, version)
+    elapsed = 0.0
+    played = []
+    for _ in range(turns):
+        started = time.perf_counter()
+        # Chainlit runs each message in its own task
+        await asyncio.create_task(app.main(fake_chainlit.Message(content="I look around")))
+        elapsed += time.perf_counter() - started
+        record, _ = await store.load(key)
+        played.append(record["game_state"]["current_agent"])
+        if record["game_state"]["current_agent"] == "game_over":
+            await asyncio.create_task(app.main(fake_chainlit.Message(content="restart")))
+    return elapsed / turns, played
+
+
+async def run(turns: int, delay: float, rounds: int):
+    fake_chainlit.install()
+
+    bundle = {}
+    for rate in (1.0, 0.1):
+        metrics.SAMPLE_RATE = rate
+        started = time.perf_counter()
+        for _ in range(turns):
+            instrumentation_bundle()
+        bundle[rate] = (time.perf_counter() - started) / turns
+        print(f"instrumentation per turn (sample rate {rate}): {bundle[rate] * 1e6:.2f} us")
+
+    _, game = await turn_time(min(turns, 200), delay, 1.0)  # warm-up: imports, caches and allocator
+    offs, ons, games = [], [], []
+    for _ in range(rounds):
+        for rate, times in ((0.0, offs), (1.0, ons)):
+            elapsed, game = await turn_time(turns, delay, rate)
+            times.append(elapsed)
+            games.append(game)
+    off, on = statistics.median(offs), statistics.median(ons)
+    print(f"\nturn time, spans off: {off * 1000:.3f} ms (median of {rounds} runs)")
+    print(f"turn time, spans on:  {on * 1000:.3f} ms (median of {rounds} runs)")
+    print(f"same game every run:  {'yes' if all(g == games[0] for g in games) else 'NO'} "
+          f"({games[0].count('game_over')} games lost)")
+    print(f"measured difference:  {(on - off) / off * 100:.2f} % "
+          f"(per round: {', '.join(f'{(b - a) / a * 100:+.1f}' for a, b in zip(offs, ons))})")
+    print(f"instrumentation share: {bundle[1.0] / on * 100:.2f} % of a turn")
+    print(f"error messages:       {fake_chainlit.stats['error_messages']}")
+
+
+if __name__ == "__main__":
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    delay_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+    asyncio.run(run(turns, delay_ms / 1000, rounds))
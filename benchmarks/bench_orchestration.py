@@ -0,0 +1,157 @@
+"""
+Benchmark: handoff-free turn routing for main.py
+Scores intent.py's classifier on a labeled set of player actions, then (when the Agents SDK is
+installed) plays main.py against the stub server with ORCHESTRATION=handoff and =direct; the stub
+answers Game Master requests with the handoff a good model would make, so the comparison counts
+model calls per turn, turn latency, failed turns (error replies) and how often the turn succeeded
+at the right agent
+
+Usage: python benchmarks/bench_orchestration.py [players] [turns] [latency_ms]
+"""
+
+import asyncio
+import importlib.util
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_chainlit
+import intent
+from stub_llm import REPLY, StubLLMServer
+
+# Player actions and the agent that should handle them ("1"-"3" pick from the stub's REPLY choices)
+LABELED = {
+    "start": "NarratorAgent",
+    "I look around": "NarratorAgent",
+    "I follow the river north": "NarratorAgent",
+    "I talk to the innkeeper": "NarratorAgent",
+    "Let's rest for the night": "NarratorAgent",
+    "I explore the ruins": "NarratorAgent",
+    "I ask the guard about the gem": "NarratorAgent",
+    "I run away to the village": "NarratorAgent",
+    "What now?": "NarratorAgent",
+    "hmm": "NarratorAgent",
+    "I attack the wolf": "MonsterAgent",
+    "Swing my sword at the bandit": "MonsterAgent",
+    "I cast a fireball": "MonsterAgent",
+    "Dodge and strike back": "MonsterAgent",
+    "I fight the goblin": "MonsterAgent",
+    "I block with my shield": "MonsterAgent",
+    "Kill it!": "MonsterAgent",
+    "I pick up the sword": "ItemAgent",
+    "Open the chest": "ItemAgent",
+    "I drink a potion": "ItemAgent",
+    "Check my inventory": "ItemAgent",
+    "I sell the gem to the merchant": "ItemAgent",
+    "Loot the bodies": "ItemAgent",
+    "Take the gold": "ItemAgent",
+    "1": "NarratorAgent",   # Follow the road
+    "2": "ItemAgent",       # Search the bushes
+    "3": "NarratorAgent",   # Rest
+}
+
+
+def bench_classifier(rounds: int = 2000):
+    routed = correct = 0
+    for action, label in LABELED.items():
+        decision = intent.classify(action, {"in_combat": False}, REPLY)
+        if decision.agent is not None:
+            routed += 1
+            correct += decision.agent == label
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for action in LABELED:
+            intent.classify(action, {"in_combat": False}, REPLY)
+    per_call = (time.perf_counter() - started) / (rounds * len(LABELED))
+    print(f"classifier: {routed}/{len(LABELED)} actions routed locally, {correct}/{routed} to the right agent, "
+          f"{per_call * 1e6:.1f} us per message")
+
+
+def handoff_oracle(body: dict):
+    """Hand off to the labeled agent for the current action, as a well-behaved Game Master would"""
+    action = None
+    for message in reversed(body.get("messages", [])):
+        content = message.get("content")
+        if message.get("role") == "user" and isinstance(content, str) and content.startswith("Action: "):
+            action = content[len("Action: "):].split("\nState:", 1)[0]
+            break
+    label = LABELED.get(action)
+    for tool in body.get("tools", []):
+        name = tool.get("function", {}).get("name", "")
+        if label and name.startswith("transfer_to_") and name.endswith(label.lower()):
+            return name
+    return None
+
+
+async def play(game, server, players: int, turns: int, mode: str) -> dict:
+    import session_store
+    import supervisor
+
+    game.ORCHESTRATION = mode
+    requests_before = server.requests
+    latencies = []
+    right = failed = 0
+
+    async def player(n: int):
+        nonlocal right, failed
+        rng = random.Random(n)
+        session_id = f"{mode}-{n}"
+        fake_chainlit.use_session(session_id)
+        await game.start()
+        key = fake_chainlit.sessions()[session_id]["session_key"]
+        for turn in range(turns):
+            action = "start" if turn == 0 else rng.choice(list(LABELED))
+            errors = fake_chainlit.errors(session_id)
+            started = time.perf_counter()
+            await asyncio.create_task(game.main(fake_chainlit.Message(content=action)))
+            latencies.append(time.perf_counter() - started)
+            await supervisor.get(session_id).flush()  # the error reply is sent in the background
+            if fake_chainlit.errors(session_id) > errors:
+                failed += 1
+                continue
+            record, _ = await session_store.get_store().load(key)
+            right += record["agent"] == LABELED[action]
+
+    await asyncio.gather(*(player(n) for n in range(players)))
+    total = players * turns
+    return {
+        "calls_per_turn": (server.requests - requests_before) / total,
+        "p50": statistics.median(latencies),
+        "p95": statistics.quantiles(latencies, n=20)[-1],
+        "failed": failed / total,
+        "right_agent": right / total,
+    }
+
+
+async def run(players: int, turns: int, latency: float):
+    bench_classifier()
+    if importlib.util.find_spec("agents") is None:
+        print("openai-agents is not installed; skipping the main.py comparison")
+        return
+
+    server = await StubLLMServer(latency=latency, tool_choice=handoff_oracle).start()
+    os.environ["OPENROUTER_BASE_URL"] = server.base_url
+    os.environ.setdefault("OPENROUTER_API_KEY", "stub")
+    fake_chainlit.install()
+    import main as game
+
+    print(f"{players} players x {turns} turns, model latency {latency * 1000:.0f} ms")
+    for mode in ("handoff", "direct"):
+        result = await play(game, server, players, turns, mode)
+        print(f"  ORCHESTRATION={mode:<8} {result['calls_per_turn']:.2f} model calls/turn, "
+              f"turn p50 {result['p50'] * 1000:6.1f} ms, p95 {result['p95'] * 1000:6.1f} ms, "
+              f"failed {result['failed']:.0%}, right agent {result['right_agent']:.0%}")
+    await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 20,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 10,
+        (float(sys.argv[3]) if len(sys.argv) > 3 else 200) / 1000,
+    ))
@@ -0,0 +1,113 @@
+"""
+Benchmark: cache-friendly prompt prefixes
+Plays app.py sessions against a stub model and measures, for every model call, how many prompt
+tokens repeat a prefix already sent (what a provider prompt cache or a KV cache could reuse);
+also measures main.py's compacted history layout
+
+Usage: python benchmarks/bench_prompts.py [players] [turns]
+"""
+
+import asyncio
+import os
+import random
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_chainlit
+import prompts
+
+STORY = ("The wind carries the smell of smoke across the square.\n"
+         "1. Follow the smoke\n2. Ask the blacksmith\n3. Head for the forest")
+ACTIONS = ["I look around", "1", "I follow the smoke", "I talk to the blacksmith", "2", "I rest"]
+# Stand-in for main.py's GameMasterAgent instructions (main.py needs the agents SDK to import)
+GAME_MASTER = prompts.canonical("""
+    You are the Game Master of a fantasy adventure. Welcome the player, describe the world and the
+    quest, and hand off to the narrator, combat or reward agent when the story calls for it.
+    """ * 4)
+
+
+def install_stub(engine, trackers: dict):
+    reply = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=STORY))])
+
+    async def chunks():
+        for word in STORY.split(" "):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))])
+
+    async def stub_acompletion(model, messages, stream=False, **kwargs):
+        prefix, total = trackers.setdefault(model, prompts.PrefixTracker()).observe(messages)
+        trackers.setdefault("totals", [0, 0, 0])
+        trackers["totals"][0] += 1
+        trackers["totals"][1] += prefix
+        trackers["totals"][2] += total
+        await asyncio.sleep(0.001)
+        return chunks() if stream else reply
+
+    engine.litellm.acompletion = stub_acompletion
+
+
+async def play_app(players: int, turns: int):
+    import app
+    import engine
+    import session_store
+
+    trackers = {}
+    install_stub(engine, trackers)
+    engine.response_cache = None
+
+    async def player(n: int):
+        rng = random.Random(n)
+        session_id = f"prompts-{n}"
+        fake_chainlit.use_session(session_id)
+        await app.start()
+        key = fake_chainlit.sessions()[session_id]["session_key"]
+        for _ in range(turns):
+            record, _ = await session_store.get_store().load(key)
+            action = "restart" if record["game_state"]["current_agent"] == "game_over" else rng.choice(ACTIONS)
+            await asyncio.create_task(app.main(fake_chainlit.Message(content=action)))
+        await asyncio.sleep(0.01)  # let async flavor calls finish
+
+    await asyncio.gather(*(player(n) for n in range(players)))
+    calls, prefix, total = trackers["totals"]
+    print(f"app.py: {calls} model calls, {total / calls:.0f} prompt tokens/call, "
+          f"{prefix / total:.1%} in a repeated prefix")
+
+
+def play_main(players: int, turns: int):
+    from compaction import ChatHistory
+    from state import GameState
+
+    tracker = prompts.PrefixTracker()
+    prefix = total = 0
+    for n in range(players):
+        rng = random.Random(n)
+        history = ChatHistory()
+        game_state = GameState.from_dict({"name": "Adventurer", "health": 50, "gold": 20, "location": "Village",
+                                          "inventory": ["Sword", "Armor", "Potion"], "quest": "Find the Lost Gem"})
+        for turn in range(turns):
+            action = rng.choice(ACTIONS)
+            messages = [{"role": "system", "content": GAME_MASTER}]
+            messages += history.build_input("GameMasterAgent", action, game_state)
+            reused, sent = tracker.observe(messages)
+            prefix += reused
+            total += sent
+            history.add_turn(action, " ".join([STORY] * rng.randint(2, 4)))
+            game_state["gold"] += rng.randint(0, 5)
+    print(f"main.py history layout: {players * turns} calls, {total / (players * turns):.0f} prompt tokens/call, "
+          f"{prefix / total:.1%} in a repeated prefix")
+
+
+async def run(players: int, turns: int):
+    fake_chainlit.install()
+    print(f"{players} players x {turns} turns")
+    await play_app(players, turns)
+    play_main(players, turns)
+
+
+if __name__ == "__main__":
+    asyncio.run(run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 20,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 30,
+    ))
@@ -0,0 +1,138 @@
+"""
+Benchmark: model routing tiers
+Measures the cost of a routing decision, then plays app.py sessions against stub models with
+different speeds, prices and occasional stalls, with routing off (every agent on its own model)
+and on (cheapest sufficient tier, SLO fallback), reporting turn latency and cost per tier
+
+Usage: python benchmarks/bench_router.py [players] [turns] [stall_rate]
+"""
+
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_chainlit
+
+STORY = ("The ferryman names his price and the river fog thickens around the boat.\n"
+         "1. Pay him\n2. Haggle\n3. Swim for it")
+ACTIONS = ["1", "2", "I look around", "I fight on", "I search the bushes",
+           "prompt: Describe the whole history of the river kingdom and its drowned kings in detail"]
+# Stub model latencies in seconds (a stalled call takes STALL instead)
+DELAYS = {"local": 0.010, "gemini/gemini-1.5-flash": 0.030, "gemini/gemini-1.5-pro": 0.080}
+STALL = 0.5
+
+
+def install_stub(engine, stall_rate: float, rng: random.Random, calls: dict):
+    reply = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=STORY))])
+
+    async def chunks():
+        for word in STORY.split(" "):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))])
+
+    async def stub_acompletion(model, messages, stream=False, **kwargs):
+        name = "local" if kwargs.get("api_base") else model
+        calls[name] = calls.get(name, 0) + 1
+        # The flash tier occasionally stalls (a provider brown-out)
+        stalled = name == "gemini/gemini-1.5-flash" and rng.random() < stall_rate
+        await asyncio.sleep(STALL if stalled else DELAYS[name])
+        return chunks() if stream else reply
+
+    engine.litellm.acompletion = stub_acompletion
+
+
+def bench_route(router, decisions: int = 200000):
+    routing = router.Router()
+    routing.add_tier(router.Tier("local", "local", 0.3, slo=0.05, api_base="http://local"))
+    routing.add_tier(router.Tier("flash", "gemini/gemini-1.5-flash", 0.6, 0.075, 0.30, slo=0.1))
+    routing.add_tier(router.Tier("pro", "gemini/gemini-1.5-pro", 0.9, 1.25, 5.00, slo=1.0))
+    kinds = list(router.KIND_QUALITY)
+    started = time.perf_counter()
+    for n in range(decisions):
+        routing.route("NarratorAgent", kinds[n % len(kinds)], n % 3000, 0.5)
+    elapsed = time.perf_counter() - started
+    print(f"route(): {elapsed / decisions * 1e6:.2f} us per decision ({decisions / elapsed:,.0f}/s)")
+
+
+async def play(app, players: int, turns: int, label: str) -> list:
+    import session_store
+
+    latencies = []
+
+    async def player(n: int):
+        rng = random.Random(n)
+        session_id = f"{label}-{n}"
+        fake_chainlit.use_session(session_id)
+        await app.start()
+        key = fake_chainlit.sessions()[session_id]["session_key"]
+        for _ in range(turns):
+            record, _ = await session_store.get_store().load(key)
+            action = "restart" if record["game_state"]["current_agent"] == "game_over" else rng.choice(ACTIONS)
+            started = time.perf_counter()
+            await asyncio.create_task(app.main(fake_chainlit.Message(content=action)))
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(player(n) for n in range(players)))
+    return latencies
+
+
+def summary(label: str, latencies: list, calls: dict, cost: float):
+    p95 = statistics.quantiles(latencies, n=20)[-1]
+    print(f"{label}: turn p50 {statistics.median(latencies) * 1000:6.1f} ms, p95 {p95 * 1000:6.1f} ms, "
+          f"max {max(latencies) * 1000:6.1f} ms, est. cost ${cost:.4f}")
+    print("  calls: " + ", ".join(f"{model} {count}" for model, count in sorted(calls.items())))
+
+
+async def run(players: int, turns: int, stall_rate: float):
+    fake_chainlit.install()
+    import app
+    import dice
+    import engine
+    import router
+
+    dice.BASE_SEED = "7"
+    engine.response_cache = None
+    engine.FLAVOR_MODE = "sync"
+    bench_route(router)
+    print(f"{players} players x {turns} turns, flash stalls {stall_rate:.0%} of calls for {STALL * 1000:.0f} ms")
+
+    # Routing off: every agent uses its spec's model (flash); cost priced as the flash tier
+    calls = {}
+    install_stub(engine, stall_rate, random.Random(1), calls)
+    router.ENABLED = False
+    latencies = await play(app, players, turns, "off")
+    flash = next(tier for tier in app.routing.tiers if tier.name == "flash")
+    tokens = sum(engine.estimate_tokens(STORY) for _ in range(sum(calls.values())))
+    summary("routing off", latencies, calls, tokens * (flash.cost_in + flash.cost_out) / 1e6)
+
+    # Routing on: a free local tier for recaps, flash for turns, pro for long custom prompts;
+    # flash's SLO is short enough that a stall falls back to pro, and a degraded flash recovers quickly
+    routing = app.routing
+    routing.add_tier(router.Tier("local", "local", 0.3, slo=0.05, api_base="http://local"))
+    flash.slo = 0.1
+    router.COOLDOWN = 0.5
+    calls = {}
+    install_stub(engine, stall_rate, random.Random(1), calls)
+    router.ENABLED = True
+    latencies = await play(app, players, turns, "on")
+    report = routing.report()
+    summary("routing on ", latencies, calls, sum(tier["cost_usd"] for tier in report.values()))
+    for name, tier in report.items():
+        print(f"  {name:<6} {tier['calls']:5d} calls, {tier['errors']:3d} errors, "
+              f"avg {tier['avg_seconds'] * 1000:6.1f} ms, ${tier['cost_usd']:.4f}, healthy {tier['healthy']}")
+    fallbacks = {labels: value for labels, value in router.ROUTED.series.items() if "fallback" in str(labels)}
+    print(f"  fallbacks: {sum(fallbacks.values()):.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 20,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20,
+        float(sys.argv[3]) if len(sys.argv) > 3 else 0.1,
+    ))
@@ -0,0 +1,128 @@
+"""
+Benchmark: model call scheduler against a rate-limited stub server
+Compares firing calls directly with going through the scheduler, then checks per-session
+fairness and priority under a backlog
+
+Usage: python benchmarks/bench_scheduler.py [rate_limit_per_second]
+"""
+
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import scheduler
+from stub_llm import StubLLMServer
+
+
+class StubError(Exception):
+    def __init__(self, status_code: int, headers: dict):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.headers = headers
+
+
+async def post(server: StubLLMServer, prompt: str) -> str:
+    """One chat completion over a fresh connection"""
+    reader, writer = await asyncio.open_connection(server.host, server.port)
+    body = json.dumps({"model": "stub", "messages": [{"role": "user", "content": prompt}]}).encode()
+    writer.write(b"POST /v1/chat/completions HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode().partition(":")
+        headers[name.strip().lower()] = value.strip()
+    payload = await reader.readexactly(int(headers["content-length"]))
+    writer.close()
+    if status != 200:
+        raise StubError(status, headers)
+    return json.loads(payload)["choices"][0]["message"]["content"]
+
+
+async def burst(server: StubLLMServer, sched, calls: int):
+    """All calls at once; returns (successes, failures, seconds)"""
+    async def one(n: int):
+        try:
+            if sched is None:
+                await post(server, f"call {n}")
+            else:
+                await sched.call("stub", post, server, f"call {n}")
+            return True
+        except Exception:
+            return False
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(n) for n in range(calls)))
+    return sum(results), calls - sum(results), time.perf_counter() - started
+
+
+async def fairness(server: StubLLMServer, sched, sessions: bool):
+    """One player floods 100 calls, then 10 players send 2 calls each; returns their mean latencies"""
+    latencies = {"spammer": [], "others": []}
+
+    async def one(who: str, session: str, priority: int = scheduler.NORMAL):
+        scheduler.use_session(session if sessions else None)
+        started = time.perf_counter()
+        await sched.call("stub", post, server, who, priority=priority)
+        latencies[who].append(time.perf_counter() - started)
+
+    spam = [asyncio.create_task(one("spammer", "spammer")) for _ in range(100)]
+    await asyncio.sleep(0.05)
+    others = [asyncio.create_task(one("others", f"player-{n}")) for n in range(10) for _ in range(2)]
+    await asyncio.gather(*spam, *others)
+    return statistics.mean(latencies["spammer"]), statistics.mean(latencies["others"])
+
+
+async def priority_wait(server: StubLLMServer, sched):
+    """Latency of a HIGH call queued behind a backlog of NORMAL calls"""
+    backlog = [asyncio.create_task(sched.call("stub", post, server, "backlog")) for _ in range(60)]
+    await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    await sched.call("stub", post, server, "combat", priority=scheduler.HIGH)
+    high = time.perf_counter() - started
+    await asyncio.gather(*backlog)
+    return high
+
+
+async def run(rate: float):
+    server = await StubLLMServer(latency=0.02, rate_limit=rate, burst=5).start()
+    calls = int(rate * 4)
+
+    def make_scheduler(**kwargs):
+        # Stay just under the provider's limit
+        return scheduler.Scheduler(rate=rate * 0.95, burst=5, concurrency=64, queue_limit=10000,
+                                   session_queue_limit=1000, retry_base=0.1, **kwargs)
+
+    print(f"stub limit: {rate:.0f} req/s, {calls} concurrent calls")
+    ok, failed, elapsed = await burst(server, None, calls)
+    print(f"{'direct':>12}: {ok:>5} ok {failed:>5} failed  {elapsed:6.2f} s  ({server.rate_limited} rate limited)")
+
+    await asyncio.sleep(1)
+    limited_before = server.rate_limited
+    ok, failed, elapsed = await burst(server, make_scheduler(), calls)
+    print(f"{'scheduled':>12}: {ok:>5} ok {failed:>5} failed  {elapsed:6.2f} s  "
+          f"({server.rate_limited - limited_before} rate limited)")
+
+    await asyncio.sleep(1)
+    spam, others = await fairness(server, make_scheduler(), sessions=False)
+    print(f"\nFIFO         : spammer {spam:5.2f} s  others {others:5.2f} s mean latency")
+    await asyncio.sleep(1)
+    spam, others = await fairness(server, make_scheduler(), sessions=True)
+    print(f"per-session  : spammer {spam:5.2f} s  others {others:5.2f} s mean latency")
+
+    await asyncio.sleep(1)
+    high = await priority_wait(server, make_scheduler())
+    print(f"\nHIGH priority call behind 60 queued NORMAL calls: {high:.2f} s")
+    await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(float(sys.argv[1]) if len(sys.argv) > 1 else 50))
@@ -0,0 +1,78 @@
+"""
+Benchmark: session state load/save cost per turn for each SessionStore backend
+The Redis backend runs against the local RESP stand-in
+
+Usage: python benchmarks/bench_session_store.py [turns]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import session_store
+from conversation import ConversationStore
+from resp_stub import RespStubServer
+
+STORY = ("You push through the brambles and the path opens onto a moonlit clearing. "
+         "A fox watches you from the treeline. Somewhere an owl calls twice. ")
+
+
+def make_record() -> dict:
+    history = ConversationStore({"NarratorAgent": 20, "MonsterAgent": 20, "ItemAgent": 20})
+    for turn in range(30):
+        history.append("NarratorAgent", "user", f"The player said: explore {turn}")
+        history.append("NarratorAgent", "assistant", STORY * 2)
+    return {
+        "game_state": {"health": 80, "inventory": ["sword", "potion", "magic ring"], "location": "village",
+                       "in_combat": False, "enemy": None, "current_agent": "NarratorAgent"},
+        "conversation_history": history,
+    }
+
+
+async def measure(name: str, store: session_store.SessionStore, turns: int, players: int = 50):
+    record = make_record()
+    versions = {}
+    started = time.perf_counter()
+    for turn in range(turns):
+        key = f"player-{turn % players}"
+        loaded, version = await store.load(key)
+        versions[key] = await store.save(key, loaded or record, version)
+    await store.flush()
+    elapsed = time.perf_counter() - started
+    size = len(session_store.encode(record))
+    print(f"{name:>26} {elapsed / turns * 1e6:>12.1f} {size:>10}")
+    await store.close()
+
+
+async def run(turns: int):
+    session_store.register_type("conversation", ConversationStore)
+    tmp = tempfile.mkdtemp()
+    redis = await RespStubServer().start()
+
+    print(f"{'backend':>26} {'us/turn':>12} {'bytes':>10}")
+    await measure("memory", session_store.SessionStore(), turns)
+    await measure("sqlite write-through", session_store.SessionStore(
+        session_store.SqliteBackend(os.path.join(tmp, "a.db"))), turns)
+    await measure("sqlite write-behind 20ms", session_store.SessionStore(
+        session_store.SqliteBackend(os.path.join(tmp, "b.db")), write_behind=0.02), turns)
+    await measure("redis write-through", session_store.SessionStore(
+        session_store.RedisBackend(redis.url)), turns)
+    await measure("redis write-behind 20ms", session_store.SessionStore(
+        session_store.RedisBackend(redis.url), write_behind=0.02), turns)
+
+    record = make_record()
+    encoded = session_store.encode(record)
+    started = time.perf_counter()
+    for _ in range(1000):
+        session_store.decode(session_store.encode(record))
+    print(f"\ncodec round trip: {(time.perf_counter() - started) * 1000:.1f} us, {len(encoded)} bytes")
+    await redis.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
@@ -0,0 +1,105 @@
+"""
+Benchmark: speculative pre-generation of offered choices
+Players read for a while, then usually pick one of the narrator's numbered choices;
+compares turn latency with speculation off and on, and reports hit rate and wasted tokens
+
+Usage: python benchmarks/bench_speculation.py [players] [turns] [model_delay_ms] [pick_rate]
+"""
+
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_chainlit
+
+STORY = ("The lantern light catches a rune carved into the old stone gate. "
+         "Behind it, something shuffles in the dark.\n"
+         "1. Open the gate\n2. Study the rune\n3. Call out into the dark")
+FREE_ACTIONS = ["I look for another way around", "I check my inventory", "I sing to keep my spirits up"]
+
+
+def install_stub(engine, delay: float):
+    reply = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=STORY))])
+
+    async def chunks():
+        for word in STORY.split(" "):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))])
+
+    async def stub_acompletion(stream=False, **kwargs):
+        await asyncio.sleep(delay)
+        return chunks() if stream else reply
+
+    engine.litellm.acompletion = stub_acompletion
+
+
+async def play(app, players: int, turns: int, pick_rate: float, think: float, label: str) -> list:
+    import session_store
+
+    latencies = []
+
+    async def player(n: int):
+        rng = random.Random(n)
+        session_id = f"{label}-{n}"
+        fake_chainlit.use_session(session_id)
+        await app.start()
+        key = fake_chainlit.sessions()[session_id]["session_key"]
+        for _ in range(turns):
+            record, _ = await session_store.get_store().load(key)
+            if record["game_state"]["current_agent"] == "game_over":
+                await asyncio.create_task(app.main(fake_chainlit.Message(content="restart")))
+            elif record["game_state"]["current_agent"] != "NarratorAgent":
+                # Fights and loot resolve by the rules; only narration is being measured
+                await asyncio.create_task(app.main(fake_chainlit.Message(content="I fight on")))
+                continue
+            action = str(rng.randint(1, 3)) if rng.random() < pick_rate else rng.choice(FREE_ACTIONS)
+            started = time.perf_counter()
+            await asyncio.create_task(app.main(fake_chainlit.Message(content=action)))
+            latencies.append(time.perf_counter() - started)
+            await asyncio.sleep(rng.uniform(0.5, 1.5) * think)
+
+    await asyncio.gather(*(player(n) for n in range(players)))
+    return latencies
+
+
+async def run(players: int, turns: int, delay: float, pick_rate: float):
+    fake_chainlit.install()
+    import app
+    import dice
+    import engine
+    import speculation
+
+    install_stub(engine, delay)
+    engine.response_cache = None
+    engine.FLAVOR_MODE = "off"
+    think = delay * 3
+
+    print(f"{players} players x {turns} turns, model {delay * 1000:.0f} ms, pick rate {pick_rate:.0%}")
+    for label, speculator in (("off", None), ("on", speculation.Speculator(token_budget=10 ** 9))):
+        engine.speculator = speculator
+        random.seed(3)
+        dice.BASE_SEED = "3"
+        latencies = sorted(await play(app, players, turns, pick_rate, think, label))
+        print(f"\nspeculation {label}: narrator turn p50 {statistics.median(latencies) * 1000:7.1f} ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:7.1f} ms, mean {statistics.mean(latencies) * 1000:7.1f} ms")
+        if speculator is not None:
+            report = speculator.report()
+            print(f"  hit rate {report['hit_rate']:.0%} ({report['hits']} ready, {report['late_hits']} in flight, "
+                  f"{report['misses']} misses, {report['stale']} stale)")
+            print(f"  tokens used {report['tokens_used']}, wasted {report['tokens_wasted']} "
+                  f"({report['waste_ratio']:.0%} of speculative tokens)")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 20,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 10,
+        (float(sys.argv[3]) if len(sys.argv) > 3 else 300) / 1000,
+        float(sys.argv[4]) if len(sys.argv) > 4 else 0.7,
+    ))
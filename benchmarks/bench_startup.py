@@ -0,0 +1,126 @@
+"""
+Benchmark: cold start
+Breaks a worker's import time down by top-level package (python -X importtime), then starts fresh
+processes under each WARM_START mode and times the import, and the first turn a player sends
+`arrival` ms after the worker is up; --record appends the results as a JSON line (with the commit)
+so startup can be tracked over time
+
+Usage: python benchmarks/bench_startup.py [--target app.py] [--runs 5] [--arrival MS] [--record FILE]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+MODES = ("off", "background", "eager")
+
+# Child process: import the entry module, wait for the player, then play one turn against a stub model
+CHILD = r"""
+import asyncio, json, sys, time
+from types import SimpleNamespace
+started = time.perf_counter()
+sys.path[:0] = [{root!r}, {benchmarks!r}]
+import fake_chainlit
+fake_chainlit.install()
+import {module} as game
+imported = time.perf_counter()
+
+async def stub_acompletion(stream=False, **kwargs):
+    reply = "A crow lands on the signpost.\n1. Go north\n2. Go south"
+    if not stream:
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=reply))])
+    async def chunks():
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=reply))])
+    return chunks()
+
+async def first_turn():
+    import engine, warmstart
+    fake_chainlit.use_session("startup")
+    await game.start()
+    turn_started = time.perf_counter()
+    # The first model call imports LiteLLM unless the warm-up already has (or waits for it)
+    warmstart.load(engine.litellm).acompletion = stub_acompletion
+    await asyncio.create_task(game.main(fake_chainlit.Message(content="I look around")))
+    return turn_started
+
+time.sleep({arrival})
+turn_started = asyncio.run(first_turn())
+done = time.perf_counter()
+print(json.dumps({{"import": imported - started, "first_turn": done - turn_started,
+                  "total": done - started - {arrival}}}))
+"""
+
+
+def import_breakdown(module: str, top: int = 12) -> dict:
+    """Import seconds (self time) per top-level package, from -X importtime"""
+    code = (f"import sys; sys.path[:0] = [{ROOT!r}, {BENCHMARKS!r}]\n"
+            "try:\n    import chainlit\nexcept ImportError:\n    import fake_chainlit; fake_chainlit.install()\n"
+            f"import {module}")
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                            env={**os.environ, "WARM_START": "off"}, capture_output=True, text=True)
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        root = name.strip().split(".")[0]
+        packages[root] = packages.get(root, 0) + int(self_us) / 1e6
+    return dict(sorted(packages.items(), key=lambda item: -item[1])[:top])
+
+
+def first_turns(module: str, mode: str, runs: int, arrival: float) -> dict:
+    code = CHILD.format(root=ROOT, benchmarks=BENCHMARKS, module=module, arrival=arrival)
+    samples = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True,
+                                env={**os.environ, "WARM_START": mode, "METRICS_PORT": ""})
+        if result.returncode != 0:
+            raise RuntimeError(f"{mode} run failed:\n{result.stderr}")
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return {key: statistics.median(sample[key] for sample in samples)
+            for key in ("import", "first_turn", "total")}
+
+
+def commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start: import breakdown and time to first turn")
+    parser.add_argument("--target", default="app.py", help="entry module (its first turn is played)")
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per mode (medians reported)")
+    parser.add_argument("--arrival", type=float, default=0.0, help="ms between worker start and the first message")
+    parser.add_argument("--record", help="append the results as a JSON line to this file")
+    args = parser.parse_args()
+    module = os.path.splitext(os.path.basename(args.target))[0]
+
+    breakdown = import_breakdown(module)
+    print(f"Import time of {module} by package (self time, WARM_START=off):")
+    for package, seconds in breakdown.items():
+        print(f"  {package:<20} {seconds * 1000:8.1f} ms")
+
+    print(f"\nFirst turn {args.arrival:.0f} ms after start ({args.runs} runs per mode, medians):")
+    results = {}
+    for mode in MODES:
+        results[mode] = timings = first_turns(module, mode, args.runs, args.arrival / 1000)
+        print(f"  WARM_START={mode:<10} import {timings['import'] * 1000:7.1f} ms, "
+              f"first turn {timings['first_turn'] * 1000:7.1f} ms, start to reply {timings['total'] * 1000:7.1f} ms")
+
+    if args.record:
+        with open(args.record, "a") as f:
+            f.write(json.dumps({"commit": commit(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "target": module,
+                                "arrival_ms": args.arrival, "imports": breakdown, "modes": results}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark: typed GameState vs plain dict state at 10k sessions
+Memory held, persistence codec, prompt JSON, and per-turn snapshot + delta cost
+
+Usage: python benchmarks/bench_state.py [sessions]
+"""
+
+import copy
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import session_store
+from state import GameState, add_item
+
+DEFAULT = {
+    "health": 100,
+    "inventory": ["sword", "potion"],
+    "location": "village",
+    "in_combat": False,
+    "enemy": None,
+    "current_agent": "NarratorAgent",
+}
+ITEMS = ["magic ring", "healing potion", "rope", "torch", "silver key"]
+
+
+def play(state, rng: random.Random, turns: int = 5):
+    """A few turns worth of the mutations the rules make"""
+    for _ in range(turns):
+        roll = rng.random()
+        if roll < 0.3:
+            add_item(state, rng.choice(ITEMS))
+        elif roll < 0.6:
+            state["health"] -= 20
+        elif roll < 0.8:
+            state["in_combat"] = True
+            state["enemy"] = "goblin"
+        state["current_agent"] = "NarratorAgent"
+
+
+def measure_memory(factory, sessions: int) -> int:
+    rng = random.Random(1)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    states = [factory() for _ in range(sessions)]
+    for state in states:
+        play(state, rng)
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del states
+    return held
+
+
+def timed(label: str, func, repeat: int, unit: str = "us"):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    per_call = (time.perf_counter() - started) / repeat
+    print(f"{label:<44} {per_call * 1e6:>10.2f} {unit}")
+    return per_call
+
+
+def run(sessions: int):
+    session_store.register_type("game_state", GameState)
+
+    dict_bytes = measure_memory(lambda: copy.deepcopy(DEFAULT), sessions)
+    typed_bytes = measure_memory(lambda: GameState.from_dict(DEFAULT), sessions)
+    print(f"{sessions} sessions after 5 turns each")
+    print(f"{'dict state memory':<44} {dict_bytes / sessions:>10.0f} bytes/session")
+    print(f"{'GameState memory':<44} {typed_bytes / sessions:>10.0f} bytes/session")
+
+    rng = random.Random(2)
+    plain = copy.deepcopy(DEFAULT)
+    typed = GameState.from_dict(DEFAULT)
+    play(plain, rng)
+    play(typed, random.Random(2))
+    repeat = 20000
+
+    print(f"\n{'persistence (session_store codec)':<44}")
+    timed("  dict encode", lambda: session_store.encode(plain), repeat)
+    timed("  GameState encode", lambda: session_store.encode(typed), repeat)
+    plain_blob, typed_blob = session_store.encode(plain), session_store.encode(typed)
+    timed("  dict decode", lambda: session_store.decode(plain_blob), repeat)
+    timed("  GameState decode", lambda: session_store.decode(typed_blob), repeat)
+    print(f"{'  dict / GameState size':<44} {len(plain_blob):>5} / {len(typed_blob)} bytes")
+
+    print(f"\n{'prompt JSON':<44}")
+    timed("  json.dumps(dict)", lambda: json.dumps(plain), repeat)
+    timed("  GameState.to_json, unchanged", typed.to_json, repeat)
+
+    def one_change():
+        typed["health"] = typed["health"]
+        typed.to_json()
+    timed("  GameState.to_json, one field changed", one_change, repeat)
+
+    print(f"\n{'per-turn snapshot + change detection':<44}")
+
+    def dict_turn():
+        before = copy.deepcopy(plain)
+        plain["health"] -= 1
+        {key: value for key, value in plain.items() if before.get(key) != value}
+    timed("  deepcopy + compare (dict)", dict_turn, repeat)
+
+    def typed_turn():
+        before = typed.snapshot()
+        typed["health"] -= 1
+        typed.diff(before)
+    timed("  snapshot + diff (GameState)", typed_turn, repeat)
+
+    before = typed.snapshot()
+    typed["health"] -= 1
+    delta = typed.diff(before)
+    print(f"{'  full state / delta encoded':<44} {len(session_store.encode(typed)):>5} / "
+          f"{len(session_store.encode(delta))} bytes")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
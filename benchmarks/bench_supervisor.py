@@ -0,0 +1,150 @@
+"""
+Benchmark: UI sends pipelined with model work by the task supervisor
+Plays app.py with a simulated websocket round trip on every message send/update and a streaming
+stub model, and measures per turn the time until the result (and status) is fully shown, the time
+the handler holds the turn, and the UI messages sent. With --baseline, the same run is repeated
+against an older checkout (e.g. `git worktree add /tmp/base HEAD~1`) and the latency saved is reported
+
+Usage: python benchmarks/bench_supervisor.py [--players N] [--turns K] [--ui-ms MS] [--model-ms MS] [--baseline PATH]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STORY = "The wolf circles, snarling, then lunges for your shield arm as the torchlight gutters."
+ACTIONS = ["I look around", "I attack", "I search the ruins", "I follow the road", "I drink a potion"]
+
+
+def install_stub(engine, delay: float):
+    async def chunks():
+        for word in STORY.split(" "):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))])
+
+    async def stub_acompletion(stream=False, **kwargs):
+        await asyncio.sleep(delay)
+        if stream:
+            return chunks()
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=STORY))])
+
+    engine.litellm.acompletion = stub_acompletion
+
+
+def add_ui_latency(fake_chainlit, latency: float, shown: dict):
+    """Every send/update takes a round trip; `shown` keeps when each session's last one finished"""
+    Message = fake_chainlit.Message
+    send, update = Message.send, Message.update
+
+    async def timed(op, message):
+        await asyncio.sleep(latency)
+        result = await op(message)
+        shown[fake_chainlit.UserSession().get("id")] = time.perf_counter()
+        return result
+
+    Message.send = lambda self: timed(send, self)
+    Message.update = lambda self: timed(update, self)
+
+
+async def play(players: int, turns: int, ui_latency: float, model_delay: float) -> dict:
+    import fake_chainlit
+    fake_chainlit.install()
+    import app
+    import engine
+    import session_store
+    try:
+        import supervisor
+    except ImportError:
+        supervisor = None  # a checkout from before the supervisor
+
+    install_stub(engine, model_delay)
+    engine.response_cache = None
+    engine.speculator = None
+    engine.FLAVOR_MODE = "sync"
+    shown = {}
+    add_ui_latency(fake_chainlit, ui_latency, shown)
+    visible, held = [], []
+
+    async def player(n: int):
+        rng = random.Random(n)
+        session_id = f"player-{n}"
+        fake_chainlit.use_session(session_id)
+        await app.start()
+        key = fake_chainlit.sessions()[session_id]["session_key"]
+        for _ in range(turns):
+            record, _ = await session_store.get_store().load(key)
+            action = "restart" if record["game_state"]["current_agent"] == "game_over" else rng.choice(ACTIONS)
+            started = time.perf_counter()
+            await asyncio.create_task(app.main(fake_chainlit.Message(content=action)))
+            held.append(time.perf_counter() - started)
+            if supervisor is not None:
+                await supervisor.get(session_id).flush()
+            visible.append(shown[session_id] - started)
+            await asyncio.sleep(rng.uniform(0, 0.05))
+
+    messages_before = fake_chainlit.stats["messages"] + fake_chainlit.stats["updates"]
+    await asyncio.gather(*(player(n) for n in range(players)))
+    total = players * turns
+    return {
+        "visible_p50": statistics.median(visible),
+        "visible_p95": statistics.quantiles(visible, n=20)[-1],
+        "held_p50": statistics.median(held),
+        "ui_per_turn": (fake_chainlit.stats["messages"] + fake_chainlit.stats["updates"] - messages_before
+                        - 2 * players) / total,  # less the welcome and status messages
+    }
+
+
+def baseline(path: str, args) -> dict:
+    """The same run against another checkout, in a subprocess"""
+    command = [sys.executable, os.path.abspath(__file__), "--tree", path, "--json", "--players", str(args.players),
+               "--turns", str(args.turns), "--ui-ms", str(args.ui_ms), "--model-ms", str(args.model_ms)]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def show(label: str, result: dict):
+    print(f"  {label:<10} result shown p50 {result['visible_p50'] * 1000:6.1f} ms, "
+          f"p95 {result['visible_p95'] * 1000:6.1f} ms, handler p50 {result['held_p50'] * 1000:6.1f} ms, "
+          f"{result['ui_per_turn']:.2f} UI sends/turn")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UI send pipelining benchmark")
+    parser.add_argument("--players", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--ui-ms", type=float, default=40, help="round trip of each message send/update")
+    parser.add_argument("--model-ms", type=float, default=150, help="model time to first token")
+    parser.add_argument("--baseline", help="older checkout to compare against")
+    parser.add_argument("--tree", help=argparse.SUPPRESS)
+    parser.add_argument("--json", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    os.environ.update({"METRICS_PORT": "", "WARM_START": "off", "SESSION_STORE": "memory", "TURN_LOG": "",
+                       "RESPONSE_CACHE": "off", "GAME_SPECULATE": "off", "MODEL_ROUTER": "off"})
+    sys.path.insert(0, os.path.abspath(args.tree) if args.tree else os.path.dirname(BENCH_DIR))
+    sys.path.insert(0, BENCH_DIR)
+    result = asyncio.run(play(args.players, args.turns, args.ui_ms / 1000, args.model_ms / 1000))
+    if args.json:
+        print(json.dumps(result))
+        return
+
+    print(f"{args.players} players x {args.turns} turns, UI round trip {args.ui_ms:.0f} ms, "
+          f"model {args.model_ms:.0f} ms")
+    show("this tree", result)
+    if args.baseline:
+        before = baseline(args.baseline, args)
+        show("baseline", before)
+        print(f"latency saved per turn: p50 {(before['visible_p50'] - result['visible_p50']) * 1000:.1f} ms, "
+              f"p95 {(before['visible_p95'] - result['visible_p95']) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark: shared world index
+Builds a synthetic grid world and measures, with thousands of players moving and posting news:
+context retrieval from the current snapshot (cached card, first render after a change, and a
+scan-everything baseline without the inverted index), movement routing, publishing batches of
+updates, and context retrieval from reader threads while a writer keeps publishing
+
+Usage: python benchmarks/bench_world.py [locations] [entities] [players]
+"""
+
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import world
+
+
+def grid_world(locations: int, entities: int, seed: int = 7) -> world.World:
+    rng = random.Random(seed)
+    side = max(1, int(locations ** 0.5))
+    rows = []
+    for r in range(side):
+        for c in range(side):
+            exits = [f"r{r + 1}c{c}"] if r + 1 < side else []
+            exits += [f"r{r}c{c + 1}"] if c + 1 < side else []
+            rows.append({"id": f"r{r}c{c}", "name": f"Glade {r}-{c}", "exits": exits,
+                         "description": f"A glade of the {rng.choice(['old', 'dark', 'bright'])} forest."})
+    kinds = ("npc", "creature", "item")
+    things = [{"id": f"e{n}", "kind": kinds[n % 3], "name": f"thing {n}", "description": "plain",
+               "location": rng.choice(rows)["id"]} for n in range(entities)]
+    return world.build({"locations": rows, "entities": things}, publish_interval=None)
+
+
+def timed(func, calls: list, repeat: int = 1) -> list:
+    """Per-call time (ns) of func(arg) for each argument"""
+    times = []
+    for _ in range(repeat):
+        for arg in calls:
+            started = time.perf_counter_ns()
+            func(arg)
+            times.append(time.perf_counter_ns() - started)
+    return times
+
+
+def show(label: str, times: list):
+    times = sorted(times)
+    print(f"  {label:<42} p50 {times[len(times) // 2] / 1000:8.2f} us, p99 {times[int(len(times) * 0.99)] / 1000:8.2f} us")
+
+
+def scan_context(snapshot: world.Snapshot, location: str) -> str:
+    """Baseline: find what is at a location by scanning every entity, rendering every time"""
+    present = [e for e in snapshot.entities.values() if e.location == location]
+    names = [snapshot.graph.locations[other].name for other in snapshot.graph.adjacency[location]]
+    return f"{location}: {', '.join(names)} | {'; '.join(e.name for e in present)}"
+
+
+def run(locations: int, entities: int, players: int):
+    rng = random.Random(1)
+    started = time.perf_counter()
+    shared = grid_world(locations, entities)
+    ids = list(shared.graph.locations)
+    print(f"{len(ids):,} locations, {entities:,} entities, {players:,} players; built in "
+          f"{(time.perf_counter() - started) * 1000:.0f} ms")
+    for n in range(players):
+        shared.move_player(f"p{n}", rng.choice(ids))
+    shared.publish()
+
+    picks = [rng.choice(ids) for _ in range(20000)]
+    snapshot = shared.snapshot
+    snapshot.cards.clear()
+    show("context, first render", timed(snapshot.context, picks[:2000]))
+    for location_id in ids:
+        snapshot.context(location_id)
+    show("context, cached card", timed(lambda location: shared.snapshot.context(location), picks))
+    show("context, scan baseline (no index)", timed(lambda location: scan_context(snapshot, location), picks[:500]))
+
+    phrases = [f"I walk to glade {location_id[1:].replace('c', '-')}" for location_id in picks[:5000]]
+    origins = [rng.choice(ids) for _ in phrases]
+    pairs = list(zip(origins, phrases))
+    for origin in set(origins):
+        shared.graph.route(origin, "")  # movement patterns are compiled on first use
+    show("movement routing", timed(lambda pair: shared.graph.route(*pair), pairs))
+
+    # Each player takes a turn: move (a third of them), post news (a tenth) and an entity moves now and then
+    print("publishing one batch of updates per round:")
+    for batch_players in (100, 1000, players):
+        publish_times = []
+        for _ in range(20):
+            for n in rng.sample(range(players), min(batch_players, players)):
+                if n % 3 == 0:
+                    shared.move_player(f"p{n}", rng.choice(ids))
+                if n % 10 == 0:
+                    shared.post(rng.choice(ids), f"Player {n} did something brave.", f"p{n}")
+                if n % 50 == 0:
+                    shared.place(f"e{rng.randrange(entities)}", rng.choice(ids))
+            started = time.perf_counter_ns()
+            shared.publish()
+            publish_times.append(time.perf_counter_ns() - started)
+        updates = batch_players * (1 / 3 + 1 / 10 + 1 / 50)
+        median = statistics.median(publish_times)
+        print(f"  {batch_players:>6,} player turns/batch: publish p50 {median / 1e6:7.2f} ms "
+              f"({median / updates / 1000:.2f} us per update)")
+
+    # Readers keep retrieving while one writer publishes batches
+    stop = threading.Event()
+    reader_times = []
+
+    def reader(seed: int):
+        local = random.Random(seed)
+        times = []
+        while not stop.is_set():
+            location = local.choice(ids)
+            started = time.perf_counter_ns()
+            shared.snapshot.context(location)
+            times.append(time.perf_counter_ns() - started)
+        reader_times.extend(times)
+
+    readers = [threading.Thread(target=reader, args=(n,)) for n in range(4)]
+    for thread in readers:
+        thread.start()
+    published = 0
+    deadline = time.perf_counter() + 2.0
+    while time.perf_counter() < deadline:
+        for n in rng.sample(range(players), min(200, players)):
+            shared.move_player(f"p{n}", rng.choice(ids))
+            if n % 10 == 0:
+                shared.place(f"e{rng.randrange(entities)}", rng.choice(ids))
+        shared.publish()
+        published += 1
+    stop.set()
+    for thread in readers:
+        thread.join()
+    print(f"4 reader threads during {published} publishes in 2 s:")
+    show("context while publishing", reader_times)
+
+
+if __name__ == "__main__":
+    run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 2500,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 10000,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 5000,
+    )
@@ -0,0 +1,93 @@
+"""
+Headless stand-in for the parts of chainlit the game uses
+Install it with install() before importing app.py or main.py
+"""
+
+import contextvars
+import sys
+import types
+from typing import Dict, Any
+
+_session_id = contextvars.ContextVar("session_id", default="default")
+_sessions: Dict[str, Dict[str, Any]] = {}
+_errors: Dict[str, int] = {}
+
+# Totals across all sessions, for benchmark reports
+stats = {"messages": 0, "updates": 0, "tokens_streamed": 0, "bytes_sent": 0, "error_messages": 0}
+
+
+class UserSession:
+    """Per-session key/value store keyed by the current context's session id"""
+
+    def get(self, key, default=None):
+        if key == "id":
+            return _session_id.get()
+        return _sessions.get(_session_id.get(), {}).get(key, default)
+
+    def set(self, key, value):
+        _sessions.setdefault(_session_id.get(), {})[key] = value
+
+
+class Message:
+    """Records what would have been sent over the websocket"""
+
+    def __init__(self, content: str = "", **kwargs):
+        self.content = content
+        self.session = _session_id.get()
+
+    def _count_error(self):
+        if self.content.startswith("❌"):
+            stats["error_messages"] += 1
+            _errors[self.session] = _errors.get(self.session, 0) + 1
+
+    async def send(self):
+        stats["messages"] += 1
+        self._count_error()
+        stats["bytes_sent"] += len(self.content.encode())
+        return self
+
+    async def update(self):
+        stats["updates"] += 1
+        self._count_error()
+        stats["bytes_sent"] += len(self.content.encode())
+        return True
+
+    async def stream_token(self, token: str, is_sequence: bool = False):
+        stats["tokens_streamed"] += 1
+        stats["bytes_sent"] += len(token.encode())
+        self.content += token
+
+
+def _passthrough(func):
+    return func
+
+
+def use_session(session_id: str):
+    """Bind the current task (and tasks it spawns) to a session"""
+    _session_id.set(session_id)
+
+
+def drop_session(session_id: str):
+    _sessions.pop(session_id, None)
+    _errors.pop(session_id, None)
+
+
+def errors(session_id: str) -> int:
+    """Error replies ("❌ ...") sent or updated in a session so far"""
+    return _errors.get(session_id, 0)
+
+
+def sessions() -> Dict[str, Dict[str, Any]]:
+    return _sessions
+
+
+def install():
+    """Register this module as `chainlit` in sys.modules"""
+    module = types.ModuleType("chainlit")
+    module.user_session = UserSession()
+    module.Message = Message
+    module.on_chat_start = _passthrough
+    module.on_message = _passthrough
+    module.on_chat_end = _passthrough
+    sys.modules["chainlit"] = module
+    return module
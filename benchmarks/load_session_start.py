@@ -0,0 +1,64 @@
+"""
+Load test: session start latency and open sockets at N concurrent chats
+Runs main.py's handlers against the local stub server
+
+Usage: python benchmarks/load_session_start.py [sessions]
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fake_chainlit
+from stub_llm import StubLLMServer
+
+
+async def run(sessions: int):
+    server = await StubLLMServer(latency=0.05).start()
+    os.environ["OPENROUTER_BASE_URL"] = server.base_url
+    os.environ.setdefault("OPENROUTER_API_KEY", "stub")
+
+    fake_chainlit.install()
+    import main as game
+
+    start_times = []
+    turn_times = []
+
+    async def player(n: int):
+        fake_chainlit.use_session(f"player-{n}")
+        started = time.perf_counter()
+        await game.start()
+        start_times.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await game.main(fake_chainlit.Message(content="start"))
+        turn_times.append(time.perf_counter() - started)
+
+    began = time.perf_counter()
+    await asyncio.gather(*(player(n) for n in range(sessions)))
+    elapsed = time.perf_counter() - began
+
+    start_times.sort()
+    turn_times.sort()
+    print(f"sessions:               {sessions}")
+    print(f"wall time:              {elapsed:.2f} s")
+    print(f"session start p50/p99:  {statistics.median(start_times) * 1000:.2f} / "
+          f"{start_times[int(len(start_times) * 0.99) - 1] * 1000:.2f} ms")
+    print(f"first turn p50/p99:     {statistics.median(turn_times) * 1000:.1f} / "
+          f"{turn_times[int(len(turn_times) * 0.99) - 1] * 1000:.1f} ms")
+    print(f"connections opened:     {server.total_connections}")
+    print(f"peak open sockets:      {server.peak_connections}")
+    print(f"model requests:         {server.requests}")
+
+    import model_pool
+    await model_pool.close()
+    await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000))
@@ -0,0 +1,270 @@
+"""
+Load generator: N concurrent players driving app.py and/or main.py headlessly
+Players follow a scripted action mix against the local stub LLM server; results are written as JSON
+so runs can be compared across commits
+
+Usage:
+    python benchmarks/loadgen.py --app both --players 200 --turns 10 --output results.json
+    python benchmarks/loadgen.py --app app --mix explore=6,fight=2,loot=2 --latency 300 --token-rate 40
+    python benchmarks/loadgen.py --compare before.json after.json
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import dice
+import fake_chainlit
+from stub_llm import StubLLMServer
+
+# What each scripted action sends
+ACTIONS = {
+    "explore": ["I explore the forest path", "I head towards the ruins", "I look around the village square"],
+    "fight": ["I attack with my sword", "I charge the enemy", "I strike quickly"],
+    "loot": ["I search for treasure", "I check the chest", "I pick up what I find"],
+    "status": ["status"],
+    "history": ["history"],
+}
+DEFAULT_MIX = "explore=5,fight=2,loot=2,status=1,history=1"
+
+# Environment that changes what a run measures, recorded with the results
+RECORDED_ENV = ("GAME_LLM_FLAVOR", "RESPONSE_CACHE", "SESSION_STORE", "SESSION_WRITE_BEHIND_MS",
+                "CONVERSATION_COMPRESS", "STREAM_FLUSH_MS", "METRICS_SAMPLE_RATE", "MODEL_RATE", "MODEL_BURST",
+                "MODEL_CONCURRENCY", "MODEL_RATE_LIMITS", "MODEL_MAX_RETRIES")
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ACTIONS:
+            raise SystemExit(f"Unknown action '{name}' (choose from {', '.join(ACTIONS)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def rss_bytes() -> int:
+    """Current resident set size (Linux), falling back to peak RSS elsewhere"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def load_app(server: StubLLMServer):
+    """Import app.py with every agent pointed at the stub's OpenAI-compatible endpoint"""
+    import litellm
+    import app
+    import engine
+
+    litellm.api_base = server.base_url
+    os.environ.setdefault("GOOGLE_API_KEY", "stub")
+    for name, spec in list(engine.AGENTS.items()):
+        if not spec.model.startswith("openai/"):
+            engine.AGENTS[name] = dataclasses.replace(spec, model=f"openai/{spec.model}")
+    return app
+
+
+def load_main(server: StubLLMServer):
+    """Import main.py with the shared model pool pointed at the stub"""
+    os.environ["OPENROUTER_BASE_URL"] = server.base_url
+    os.environ.setdefault("OPENROUTER_API_KEY", "stub")
+    import main
+    return main
+
+
+async def run_app(name: str, game, args, mix: dict) -> dict:
+    import session_store
+
+    actions, weights = list(mix), list(mix.values())
+    turn_times = []
+    action_counts = {action: 0 for action in mix}
+    before = dict(fake_chainlit.stats)
+    rss_before = rss_bytes()
+
+    async def player(n: int):
+        rng = random.Random(args.seed * 100003 + n)
+        session_id = f"{name}-{n}"
+        fake_chainlit.use_session(session_id)
+        await game.start()
+        for _ in range(args.turns):
+            action = rng.choices(actions, weights)[0]
+            action_counts[action] += 1
+            message = fake_chainlit.Message(content=rng.choice(ACTIONS[action]))
+            started = time.perf_counter()
+            # Chainlit runs each message in its own task
+            await asyncio.create_task(game.main(message))
+            turn_times.append(time.perf_counter() - started)
+
+            if name == "app":
+                record, _ = await session_store.get_store().load(fake_chainlit.sessions()[session_id]["session_key"])
+                if record and record["game_state"]["current_agent"] == "game_over":
+                    await asyncio.create_task(game.main(fake_chainlit.Message(content="restart")))
+            if args.think_time:
+                await asyncio.sleep(rng.uniform(0, 2 * args.think_time))
+
+    began = time.perf_counter()
+    await asyncio.gather(*(player(n) for n in range(args.players)))
+    elapsed = time.perf_counter() - began
+    rss_after = rss_bytes()
+
+    # Size of the persisted session records, independent of allocator noise
+    store = session_store.get_store()
+    record_bytes = []
+    for session_id, values in fake_chainlit.sessions().items():
+        if session_id.startswith(f"{name}-") and "session_key" in values:
+            record, _ = await store.load(values["session_key"])
+            if record is not None:
+                record_bytes.append(len(session_store.encode(record)))
+    await store.flush()
+
+    sent = {key: fake_chainlit.stats[key] - before.get(key, 0) for key in fake_chainlit.stats}
+    turns = len(turn_times)
+    return {
+        "players": args.players,
+        "turns": turns,
+        "wall_seconds": round(elapsed, 4),
+        "turns_per_second": round(turns / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(turn_times, 50) * 1000, 3),
+            "p95": round(percentile(turn_times, 95) * 1000, 3),
+            "p99": round(percentile(turn_times, 99) * 1000, 3),
+            "max": round(max(turn_times, default=0) * 1000, 3),
+        },
+        "memory_per_session_bytes": (rss_after - rss_before) // max(1, args.players),
+        "record_bytes_per_session": sum(record_bytes) // max(1, len(record_bytes)),
+        "bytes_sent": sent["bytes_sent"],
+        "bytes_sent_per_turn": sent["bytes_sent"] // max(1, turns),
+        "messages": sent["messages"],
+        "updates": sent["updates"],
+        "tokens_streamed": sent["tokens_streamed"],
+        "error_messages": sent["error_messages"],
+        "actions": action_counts,
+    }
+
+
+async def run(args) -> dict:
+    mix = parse_mix(args.mix)
+    fake_chainlit.install()
+    server = await StubLLMServer(latency=args.latency / 1000, tokens_per_second=args.token_rate,
+                                 error_rate=args.error_rate, error_status=args.error_status,
+                                 rate_limit=args.rate_limit, burst=args.burst).start()
+
+    results = {}
+    apps = ["app", "main"] if args.app == "both" else [args.app]
+    for name in apps:
+        requests, errors, rate_limited = server.requests, server.errors, server.rate_limited
+        server.peak_connections = server.open_connections
+        game = load_app(server) if name == "app" else load_main(server)
+        results[name] = await run_app(name, game, args, mix)
+        results[name]["model_requests"] = server.requests - requests
+        results[name]["model_errors"] = server.errors - errors
+        results[name]["model_rate_limited"] = server.rate_limited - rate_limited
+        results[name]["peak_connections"] = server.peak_connections
+
+    if "main" in apps:
+        import model_pool
+        await model_pool.close()
+    await server.stop()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "config": {
+            "players": args.players, "turns": args.turns, "mix": mix, "seed": args.seed,
+            "latency_ms": args.latency, "token_rate": args.token_rate, "error_rate": args.error_rate,
+            "error_status": args.error_status, "rate_limit": args.rate_limit, "burst": args.burst,
+            "think_time": args.think_time,
+            "env": {name: os.environ[name] for name in RECORDED_ENV if name in os.environ},
+        },
+        "results": results,
+    }
+
+
+def compare(before_path: str, after_path: str):
+    """Print per-metric changes between two result files"""
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{before.get('commit') or before_path} -> {after.get('commit') or after_path}")
+    for name in after["results"]:
+        if name not in before["results"]:
+            continue
+        old, new = before["results"][name], after["results"][name]
+        print(f"\n[{name}]")
+        rows = [(key, old.get(key), new.get(key)) for key in new if isinstance(new[key], (int, float))]
+        rows += [(f"latency_{key}", old["latency_ms"].get(key), value) for key, value in new["latency_ms"].items()]
+        for key, a, b in rows:
+            if a is None:
+                continue
+            change = f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+            print(f"  {key:<28} {a:>14} {b:>14} {change:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--app", choices=["app", "main", "both"], default="both")
+    parser.add_argument("--players", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=10, help="turns per player")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="weighted actions, e.g. explore=5,fight=2")
+    parser.add_argument("--latency", type=float, default=200, help="stub model latency in ms")
+    parser.add_argument("--token-rate", type=float, default=0, help="stub tokens per second (0 = instant)")
+    parser.add_argument("--error-rate", type=float, default=0, help="fraction of stub requests failing")
+    parser.add_argument("--error-status", type=int, default=429, help="HTTP status of injected failures")
+    parser.add_argument("--rate-limit", type=float, default=0, help="stub requests per second (0 = unlimited)")
+    parser.add_argument("--burst", type=int, default=1, help="stub rate limit burst")
+    parser.add_argument("--think-time", type=float, default=0, help="mean seconds between a player's turns")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="diff two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    random.seed(args.seed)
+    dice.BASE_SEED = str(args.seed)
+    results = asyncio.run(run(args))
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        for name, result in results["results"].items():
+            latency = result["latency_ms"]
+            print(f"{name}: {result['turns_per_second']} turns/s, p50/p95/p99 {latency['p50']}/"
+                  f"{latency['p95']}/{latency['p99']} ms, {result['error_messages']} errors")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Replay recorded turn logs (TURN_LOG) through app.py or main.py at full CPU speed
+Each logged turn is re-run from its recorded state, dice state and tool facts, with the recorded
+model outputs served instantly in place of the model; the resulting state delta and next agent are
+checked against the log, so the run is both a realistic hot-path profile and a regression check.
+Sessions are spread across worker processes, each reading the log through mmap
+
+Usage: python benchmarks/replay.py LOG [--workers N] [--repeat K] [--limit TURNS] [--profile FILE]
+"""
+
+import argparse
+import asyncio
+import cProfile
+import dataclasses
+import os
+import pstats
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from typing import Dict, Any, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import turnlog
+
+MAIN_AGENTS = ("GameMasterAgent", "NarratorAgent", "MonsterAgent", "ItemAgent")
+
+# The turn being replayed (read by the stub model, tools and Runner)
+_turn: Dict[str, Any] = {"record": None, "outputs": [], "extra_calls": 0}
+
+
+def _setup(header: Dict[str, Any]):
+    """Import the entry point headlessly with the model, caches and side channels replaced"""
+    os.environ.update({"TURN_LOG": "", "METRICS_PORT": "", "WARM_START": "off", "SESSION_STORE": "memory",
+                       "RESPONSE_CACHE": "off", "GAME_SPECULATE": "off", "MODEL_ROUTER": "off",
+                       "GAME_LLM_FLAVOR": "sync" if header.get("flavor") == "sync" else "off",
+                       "GAME_WORLD": "on" if header.get("world") else "off", "WORLD_KEY": "",
+                       "GAME_MEMORY": "off"})
+    os.environ.setdefault("OPENROUTER_API_KEY", "replay")
+    import fake_chainlit
+    fake_chainlit.install()
+    if header["app"] == "main":
+        return _setup_main(header)
+    return _setup_app()
+
+
+def _next_output() -> str:
+    if _turn["outputs"]:
+        return _turn["outputs"].pop(0)
+    _turn["extra_calls"] += 1
+    return ""
+
+
+def _setup_app():
+    import app
+    import engine
+
+    async def replay_acompletion(stream=False, **kwargs):
+        text = _next_output()
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+        async def chunks():
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+        return chunks()
+
+    engine.litellm.acompletion = replay_acompletion
+    engine.response_cache = None
+    engine.speculator = None
+    # Tools return the facts (dice rolls, events) the logged turn was played with
+    for name, spec in list(engine.AGENTS.items()):
+        engine.AGENTS[name] = dataclasses.replace(spec, tools=lambda game_state: dict(_turn["record"]["facts"]))
+    return app
+
+
+def _setup_main(header: Dict[str, Any]):
+    import fake_chainlit
+    import main as game
+
+    agents = {name: SimpleNamespace(name=name) for name in MAIN_AGENTS}
+
+    class ReplayRun:
+        def __init__(self, text: str):
+            self.text = text
+
+        async def stream_events(self):
+            yield SimpleNamespace(type="raw_response_event", data=SimpleNamespace(delta=self.text))
+
+    class ReplayRunner:
+        @staticmethod
+        def run_streamed(starting_agent, input, run_config):
+            # The logged run ended at the agent it handed off to, with the outcomes its tools had
+            fake_chainlit.UserSession().set("agent", agents[_turn["record"]["next"]])
+            game._turn_facts.get().update(_turn["record"]["facts"] or {})
+            return ReplayRun(_next_output())
+
+    game.agents = SimpleNamespace(Runner=ReplayRunner)
+    game._agent_graph = {"agents": agents, "configs": dict.fromkeys(MAIN_AGENTS)}
+    game.ORCHESTRATION = header.get("orchestration", "handoff")
+    return game
+
+
+async def _replay(game, header: Dict[str, Any], sessions: List[Tuple[str, List[Dict]]], repeat: int) -> Dict[str, Any]:
+    import dice
+    import fake_chainlit
+    import session_store
+    from state import GameState, coerce
+
+    store = session_store.get_store()
+    history_field = "chat_history" if header["app"] == "main" else "conversation_history"
+    durations = []
+    mismatches = []
+    cpu_started = time.process_time()
+    for round_ in range(repeat):
+        for session, records in sessions:
+            sid = f"replay-{round_}-{session}"
+            fake_chainlit.use_session(sid)
+            fake_chainlit.UserSession().set("session_key", sid)
+            history = None
+            for record in records:
+                saved, version = await store.load(sid)
+                if history is None:
+                    history = game.new_session_record(sid)[history_field]
+                state = {"game_state": GameState.from_state(record["state"]), history_field: history,
+                         "dice": dice.DiceRoller.from_state(record["dice"])}
+                if header["app"] == "main":
+                    state["agent"] = record["agent"]
+                await store.save(sid, state, version)
+
+                _turn.update(record=record, outputs=list(record["out"]))
+                started = time.perf_counter()
+                await asyncio.create_task(game.main(fake_chainlit.Message(content=record["in"])))
+                durations.append(time.perf_counter() - started)
+
+                saved, _ = await store.load(sid)
+                history = saved[history_field]
+                expected = GameState.from_state(record["state"])
+                expected.apply(record["delta"])
+                actual = coerce(saved["game_state"])
+                agent = saved["agent"] if header["app"] == "main" else actual["current_agent"]
+                if actual != expected or agent != record["next"]:
+                    mismatches.append({"session": session, "input": record["in"], "expected": expected.to_dict(),
+                                       "actual": actual.to_dict(), "next": [record["next"], agent]})
+            fake_chainlit.drop_session(sid)
+    return {"durations": durations, "mismatches": mismatches, "cpu": time.process_time() - cpu_started,
+            "extra_calls": _turn["extra_calls"]}
+
+
+def _run_worker(job: tuple) -> Dict[str, Any]:
+    path, header, assignment, repeat = job
+    game = _setup(header)
+    with turnlog.LogReader(path) as reader:
+        sessions = [(session, [reader.record_at(offset) for offset in offsets]) for session, offsets in assignment]
+    return asyncio.run(_replay(game, header, sessions, repeat))
+
+
+def plan(path: str, workers: int, limit: int = 0) -> Tuple[Dict[str, Any], List[List[Tuple[str, List[int]]]]]:
+    """The log's (latest) header and its sessions split into balanced per-worker assignments"""
+    with turnlog.LogReader(path) as reader:
+        headers = reader.headers()
+        index = reader.index()
+    if not headers:
+        raise ValueError(f"{path} has no header")
+    if len({header["app"] for header in headers}) > 1:
+        raise ValueError(f"{path} mixes entry points; replay one at a time")
+    assignments = [[] for _ in range(workers)]
+    loads = [0] * workers
+    budget = limit or float("inf")
+    for session, offsets in sorted(index.items(), key=lambda item: -len(item[1])):
+        offsets = offsets[:int(min(len(offsets), budget))]
+        if not offsets:
+            break
+        budget -= len(offsets)
+        target = loads.index(min(loads))
+        assignments[target].append((session, offsets))
+        loads[target] += len(offsets)
+    return headers[-1], [assignment for assignment in assignments if assignment]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a turn log through app.py or main.py")
+    parser.add_argument("log")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=1, help="replay every session this many times")
+    parser.add_argument("--limit", type=int, default=0, help="replay at most this many turns")
+    parser.add_argument("--profile", help="replay in this process under cProfile and save the stats here")
+    args = parser.parse_args()
+
+    header, assignments = plan(args.log, 1 if args.profile else args.workers, args.limit)
+    jobs = [(args.log, header, assignment, args.repeat) for assignment in assignments]
+    started = time.perf_counter()
+    if args.profile:
+        profiler = cProfile.Profile()
+        results = [profiler.runcall(_run_worker, jobs[0])]
+        profiler.dump_stats(args.profile)
+    elif len(jobs) == 1:
+        results = [_run_worker(jobs[0])]
+    else:
+        with ProcessPoolExecutor(len(jobs)) as pool:
+            results = list(pool.map(_run_worker, jobs))
+    elapsed = time.perf_counter() - started
+
+    durations = [d for result in results for d in result["durations"]]
+    mismatches = [m for result in results for m in result["mismatches"]]
+    sessions = sum(len(assignment) for assignment in assignments)
+    print(f"{header['app']}.py: {len(durations):,} turns from {sessions:,} sessions on {len(jobs)} workers "
+          f"in {elapsed:.2f}s ({len(durations) / elapsed:,.0f} turns/s)")
+    if durations:
+        quantiles = statistics.quantiles(durations, n=100) if len(durations) > 1 else durations * 99
+        print(f"turn time: p50 {quantiles[49] * 1e6:,.0f} us, p99 {quantiles[98] * 1e6:,.0f} us, "
+              f"CPU {sum(result['cpu'] for result in results) / len(durations) * 1e6:,.0f} us/turn")
+    extra = sum(result["extra_calls"] for result in results)
+    if extra:
+        print(f"{extra} model calls had no recorded output (served empty)")
+    print(f"mismatches: {len(mismatches)}")
+    for mismatch in mismatches[:5]:
+        print(f"  {mismatch}")
+    if args.profile:
+        pstats.Stats(args.profile).sort_stats("cumulative").print_stats(15)
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
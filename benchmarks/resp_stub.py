@@ -0,0 +1,104 @@
+"""
+Local Redis-protocol stand-in for benchmarks
+Supports the commands the session store uses: PING, SELECT, GET, SET, DEL, WATCH, UNWATCH, MULTI, EXEC
+"""
+
+import asyncio
+
+
+class RespStubServer:
+    """In-memory RESP2 server with optimistic WATCH/MULTI/EXEC semantics"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.server = None
+        self.data = {}
+        self.revisions = {}  # key -> modification counter, for WATCH
+        self.commands = 0
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _read_command(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        count = int(line[1:-2])
+        args = []
+        for _ in range(count):
+            size = int((await reader.readline())[1:-2])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    async def _handle(self, reader, writer):
+        watched = {}
+        queued = None
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    break
+                self.commands += 1
+                name = args[0].upper()
+                if queued is not None and name not in (b"EXEC", b"MULTI"):
+                    queued.append(args)
+                    writer.write(b"+QUEUED\r\n")
+                elif name == b"MULTI":
+                    queued = []
+                    writer.write(b"+OK\r\n")
+                elif name == b"EXEC":
+                    if any(self.revisions.get(key, 0) != rev for key, rev in watched.items()):
+                        writer.write(b"*-1\r\n")
+                    else:
+                        replies = [self._execute(command) for command in queued]
+                        writer.write(b"*%d\r\n" % len(replies) + b"".join(replies))
+                    queued = None
+                    watched = {}
+                elif name == b"WATCH":
+                    for key in args[1:]:
+                        watched[key] = self.revisions.get(key, 0)
+                    writer.write(b"+OK\r\n")
+                elif name == b"UNWATCH":
+                    watched = {}
+                    writer.write(b"+OK\r\n")
+                else:
+                    writer.write(self._execute(args))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _execute(self, args) -> bytes:
+        name = args[0].upper()
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name == b"SELECT":
+            return b"+OK\r\n"
+        if name == b"GET":
+            value = self.data.get(args[1])
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+        if name == b"SET":
+            self.data[args[1]] = args[2]
+            self.revisions[args[1]] = self.revisions.get(args[1], 0) + 1
+            return b"+OK\r\n"
+        if name == b"DEL":
+            removed = 0
+            for key in args[1:]:
+                if self.data.pop(key, None) is not None:
+                    removed += 1
+                    self.revisions[key] = self.revisions.get(key, 0) + 1
+            return b":%d\r\n" % removed
+        return b"-ERR unknown command\r\n"
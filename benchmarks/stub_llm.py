@@ -0,0 +1,203 @@
+"""
+Local OpenAI-compatible stub server for benchmarks
+Serves /chat/completions (streaming and non-streaming) with configurable latency,
+injected errors, an enforced request rate limit and optional tool calls
+"""
+
+import asyncio
+import json
+import math
+import random
+import time
+
+REPLY = ("You step onto the old forest road as dusk settles over the trees. "
+         "**What do you do?**\n1. Follow the road\n2. Search the bushes\n3. Rest")
+
+
+class StubLLMServer:
+    """Minimal HTTP/1.1 keep-alive server speaking the chat completions API"""
+
+    def __init__(self, latency: float = 0.0, tokens_per_second: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 429, rate_limit: float = 0.0, burst: int = 1, reply: str = REPLY,
+                 host: str = "127.0.0.1", port: int = 0, tool_choice=None):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.error_status = error_status
+        # Requests per second (token bucket); excess requests get 429 with Retry-After
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.allowance = float(burst)
+        self.allowance_updated = time.monotonic()
+        self.reply = reply
+        # tool_choice(request body) -> name of a tool to call instead of replying (e.g. a handoff), or None
+        self.tool_choice = tool_choice
+        self.host = host
+        self.port = port
+        self.server = None
+        self.open_connections = 0
+        self.peak_connections = 0
+        self.total_connections = 0
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.tool_calls = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.open_connections += 1
+        self.total_connections += 1
+        self.peak_connections = max(self.peak_connections, self.open_connections)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", "0"))
+                body = json.loads(await reader.readexactly(length)) if length else {}
+                await self._respond(writer, body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.open_connections -= 1
+            writer.close()
+
+    def _over_rate_limit(self) -> float:
+        """Seconds until the next request is allowed, or 0 if this one is"""
+        if not self.rate_limit:
+            return 0.0
+        now = time.monotonic()
+        self.allowance = min(self.burst, self.allowance + (now - self.allowance_updated) * self.rate_limit)
+        self.allowance_updated = now
+        if self.allowance >= 1:
+            self.allowance -= 1
+            return 0.0
+        return (1 - self.allowance) / self.rate_limit
+
+    async def _error(self, writer, status: int, retry_after: float = 0.0):
+        reason = {429: "Too Many Requests", 500: "Internal Server Error", 502: "Bad Gateway",
+                  503: "Service Unavailable"}.get(status, "Error")
+        payload = json.dumps({"error": {"message": "stub overloaded", "type": "rate_limit" if status == 429 else "server"}}).encode()
+        headers = f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\nContent-Length: {len(payload)}\r\n"
+        if retry_after:
+            headers += f"Retry-After: {math.ceil(retry_after)}\r\n"
+        writer.write(headers.encode() + b"\r\n" + payload)
+        await writer.drain()
+
+    async def _respond(self, writer, body: dict):
+        self.requests += 1
+        wait = self._over_rate_limit()
+        if wait:
+            self.rate_limited += 1
+            await self._error(writer, 429, wait)
+            return
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if self.error_rate and random.random() < self.error_rate:
+            self.errors += 1
+            await self._error(writer, self.error_status)
+            return
+
+        model = body.get("model", "stub")
+        created = int(time.time())
+        words = self.reply.split(" ")
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+        tool = self.tool_choice(body) if self.tool_choice and body.get("tools") else None
+        if tool:
+            self.tool_calls += 1
+            await self._tool_call(writer, body, tool, model, created, prompt_tokens)
+            return
+
+        if not body.get("stream"):
+            if self.tokens_per_second:
+                await asyncio.sleep(len(words) / self.tokens_per_second)
+            payload = json.dumps({
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": self.reply}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                          "total_tokens": prompt_tokens + len(words)},
+            }).encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: " + str(len(payload)).encode() + b"\r\n\r\n" + payload)
+            await writer.drain()
+            return
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Transfer-Encoding: chunked\r\n\r\n")
+        for i, word in enumerate(words):
+            delta = word if i == 0 else " " + word
+            chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created,
+                     "model": model, "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]}
+            self._write_chunk(writer, f"data: {json.dumps(chunk)}\n\n".encode())
+            if self.tokens_per_second:
+                await writer.drain()
+                await asyncio.sleep(1 / self.tokens_per_second)
+        final = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                 "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                           "total_tokens": prompt_tokens + len(words)}}
+        self._write_chunk(writer, f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _tool_call(self, writer, body: dict, tool: str, model: str, created: int, prompt_tokens: int):
+        call = {"id": f"call_stub_{self.tool_calls}", "type": "function", "function": {"name": tool, "arguments": "{}"}}
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": 5, "total_tokens": prompt_tokens + 5}
+        if not body.get("stream"):
+            payload = json.dumps({
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "tool_calls",
+                             "message": {"role": "assistant", "content": None, "tool_calls": [call]}}],
+                "usage": usage,
+            }).encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: " + str(len(payload)).encode() + b"\r\n\r\n" + payload)
+            await writer.drain()
+            return
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Transfer-Encoding: chunked\r\n\r\n")
+        chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                 "choices": [{"index": 0, "delta": {"role": "assistant", "tool_calls": [{"index": 0, **call}]},
+                              "finish_reason": None}]}
+        final = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": created, "model": model,
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "tool_calls"}], "usage": usage}
+        self._write_chunk(writer, f"data: {json.dumps(chunk)}\n\n".encode())
+        self._write_chunk(writer, f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    def _write_chunk(writer, data: bytes):
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+
+if __name__ == "__main__":
+    async def serve():
+        server = await StubLLMServer(port=8765).start()
+        print(f"Stub LLM listening on {server.base_url}")
+        await server.server.serve_forever()
+
+    asyncio.run(serve())
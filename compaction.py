@@ -0,0 +1,147 @@
+"""
+Chat history compaction for the Game Master agents
+Keeps prompts flat by folding old turns into a rolling summary
+"""
+
+import json
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+# Token budget per agent (prompt side only, excluding instructions)
+AGENT_TOKEN_BUDGETS = {
+    "GameMasterAgent": 1200,
+    "NarratorAgent": 2000,
+    "MonsterAgent": 1000,
+    "ItemAgent": 1000,
+}
+DEFAULT_TOKEN_BUDGET = 1500
+
+# Share of the budget reserved for the rolling summary
+SUMMARY_SHARE = 0.25
+
+# Longest line kept per turn in the summary
+SUMMARY_LINE_CHARS = 160
+
+# Once over budget, compact down to this share of it: the following turns then only append,
+# so the prompt prefix (summary and older turns) stays byte-identical and cacheable
+COMPACTION_TARGET = 0.6
+
+# State fields that rarely change go before the history as world context; the rest is sent last
+WORLD_FIELDS = ("name", "quest")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate (~4 characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def _summarize_turn(action: str, response: str) -> str:
+    """Turn a full exchange into one short summary line"""
+    response = " ".join(response.split())
+    # Keep only the first sentence of the reply
+    for stop in (". ", "! ", "? "):
+        cut = response.find(stop)
+        if cut != -1:
+            response = response[:cut + 1]
+            break
+    line = f"Player: {' '.join(action.split())} -> {response}"
+    if len(line) > SUMMARY_LINE_CHARS:
+        line = line[:SUMMARY_LINE_CHARS - 3] + "..."
+    return line
+
+
+class ChatHistory:
+    """Bounded chat history with a rolling summary of evicted turns"""
+
+    def __init__(self):
+        self.turns = deque()  # (action, response, tokens)
+        self.turn_tokens = 0
+        self.summary = deque()  # (line, tokens)
+        self.summary_tokens = 0
+        self.turn_count = 0
+
+    def add_turn(self, action: str, response: str):
+        """Record a finished exchange between the player and an agent"""
+        tokens = estimate_tokens(action) + estimate_tokens(response)
+        self.turns.append((action, response, tokens))
+        self.turn_tokens += tokens
+        self.turn_count += 1
+
+    def last_response(self) -> str:
+        """The most recent agent response (empty before the first turn)"""
+        return self.turns[-1][1] if self.turns else ""
+
+    def _compact(self, budget: int):
+        """Fold the oldest turns into the summary until the budget fits"""
+        summary_budget = int(budget * SUMMARY_SHARE)
+        turn_budget = budget - summary_budget
+        if self.turn_tokens <= turn_budget and self.summary_tokens <= summary_budget:
+            return
+        turn_budget = int(turn_budget * COMPACTION_TARGET)
+        summary_budget = int(summary_budget * COMPACTION_TARGET)
+
+        # Always keep the latest exchange verbatim
+        while self.turn_tokens > turn_budget and len(self.turns) > 1:
+            action, response, tokens = self.turns.popleft()
+            self.turn_tokens -= tokens
+            line = _summarize_turn(action, response)
+            line_tokens = estimate_tokens(line)
+            self.summary.append((line, line_tokens))
+            self.summary_tokens += line_tokens
+
+        # Oldest summary lines fall off last
+        while self.summary_tokens > summary_budget and self.summary:
+            _, line_tokens = self.summary.popleft()
+            self.summary_tokens -= line_tokens
+
+    def build_input(self, agent_name: str, action: str, game_state: Dict[str, Any],
+                    context: Optional[str] = None) -> List[Dict]:
+        """Build the model input for a new turn within the agent's budget (context: pre-retrieved world context)"""
+        budget = AGENT_TOKEN_BUDGETS.get(agent_name, DEFAULT_TOKEN_BUDGET)
+        self._compact(budget)
+
+        messages = []
+        world = {key: game_state[key] for key in WORLD_FIELDS if game_state.get(key) is not None}
+        if world:
+            messages.append({"role": "system", "content": f"World: {json.dumps(world, sort_keys=True)}"})
+        if context:
+            messages.append({"role": "system", "content": context})
+        if self.summary:
+            story = "\n".join(line for line, _ in self.summary)
+            messages.append({"role": "system", "content": f"Story so far:\n{story}"})
+        for past_action, response, _ in self.turns:
+            messages.append({"role": "user", "content": f"Action: {past_action}"})
+            messages.append({"role": "assistant", "content": response})
+
+        # Only the current state snapshot is sent, last (typed state re-encodes only changed fields)
+        volatile = [key for key in game_state.keys() if key not in WORLD_FIELDS]
+        if hasattr(game_state, "to_json"):
+            state_json = game_state.to_json(fields=volatile)
+        else:
+            state_json = json.dumps({key: game_state[key] for key in volatile})
+        messages.append({"role": "user", "content": f"Action: {action}\nState: {state_json}"})
+        return messages
+
+    def to_state(self) -> Dict:
+        """Plain form for session persistence"""
+        return {
+            "turns": [list(turn) for turn in self.turns],
+            "summary": [list(line) for line in self.summary],
+            "turn_count": self.turn_count,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict) -> "ChatHistory":
+        history = cls()
+        for action, response, tokens in state["turns"]:
+            history.turns.append((action, response, tokens))
+            history.turn_tokens += tokens
+        for line, tokens in state["summary"]:
+            history.summary.append((line, tokens))
+            history.summary_tokens += tokens
+        history.turn_count = state["turn_count"]
+        return history
+
+    def prompt_tokens(self) -> int:
+        """Estimated tokens of history currently kept"""
+        return self.turn_tokens + self.summary_tokens
@@ -0,0 +1,148 @@
+"""
+Bounded, memory-compact conversation store
+Per-agent ring buffers of slotted message records with optional compression of cold entries
+"""
+
+import os
+import sys
+import zlib
+from collections import deque
+from typing import Dict, List
+from compaction import estimate_tokens
+
+# Roles are shared strings, not one copy per message
+USER = sys.intern("user")
+ASSISTANT = sys.intern("assistant")
+_ROLES = {USER: USER, ASSISTANT: ASSISTANT}
+
+DEFAULT_DEPTH = 20
+# The newest messages stay uncompressed; older ones are zlib-compressed if long enough
+HOT_MESSAGES = 6
+COMPRESS_MIN_BYTES = 256
+COMPRESS = os.getenv("CONVERSATION_COMPRESS", "on") != "off"
+
+
+class Message:
+    """One stored message; content may be held as compressed bytes"""
+
+    __slots__ = ("role", "data", "compressed")
+
+    def __init__(self, role: str, content: str):
+        self.role = _ROLES.get(role) or sys.intern(role)
+        self.data = content
+        self.compressed = False
+
+    @property
+    def content(self) -> str:
+        if self.compressed:
+            return zlib.decompress(self.data).decode()
+        return self.data
+
+    def compress(self):
+        if self.compressed:
+            return
+        raw = self.data.encode()
+        if len(raw) >= COMPRESS_MIN_BYTES:
+            packed = zlib.compress(raw, 6)
+            if len(packed) < len(raw):
+                self.data = packed
+                self.compressed = True
+
+    def as_dict(self) -> Dict[str, str]:
+        return {"role": self.role, "content": self.content}
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self) + sys.getsizeof(self.data)
+
+
+class ConversationStore:
+    """Conversation history for one session, one ring buffer per agent"""
+
+    __slots__ = ("buffers", "compress", "counts")
+
+    def __init__(self, depths: Dict[str, int], compress: bool = COMPRESS):
+        self.buffers = {agent: deque(maxlen=depth or DEFAULT_DEPTH) for agent, depth in depths.items()}
+        self.compress = compress
+        self.counts: Dict[str, int] = {}  # messages ever appended per agent
+
+    def append(self, agent: str, role: str, content: str):
+        buffer = self.buffers.get(agent)
+        if buffer is None:
+            buffer = self.buffers[agent] = deque(maxlen=DEFAULT_DEPTH)
+        buffer.append(Message(role, content))
+        self.counts[agent] = self.counts.get(agent, len(buffer) - 1) + 1
+        if self.compress and len(buffer) > HOT_MESSAGES:
+            buffer[-HOT_MESSAGES - 1].compress()
+
+    def recent(self, agent: str, count: int) -> List[Dict[str, str]]:
+        """The newest `count` messages in chat-completions form"""
+        buffer = self.buffers.get(agent, ())
+        start = max(0, len(buffer) - count)
+        return [buffer[i].as_dict() for i in range(start, len(buffer))]
+
+    def stable_recent(self, agent: str, count: int, step: int = 0) -> List[Dict[str, str]]:
+        """At least the newest `count` messages, starting from a point that only moves every `step` messages
+
+        Unlike recent(), consecutive turns then send the same leading messages, so the prompt
+        prefix stays cacheable; the window holds between count and count + step - 1 messages.
+        """
+        buffer = self.buffers.get(agent, ())
+        if count <= 0 or not buffer:
+            return []
+        step = max(step, count)
+        step += step % 2  # whole user/assistant pairs
+        total = self.counts.get(agent, len(buffer))
+        first = max(0, (total - count) // step * step)
+        start = max(0, first - (total - len(buffer)))
+        return [buffer[i].as_dict() for i in range(start, len(buffer))]
+
+    def within_budget(self, agent: str, max_tokens: int) -> List[Dict[str, str]]:
+        """The newest messages that fit in a token budget (at least the last one)"""
+        buffer = self.buffers.get(agent, ())
+        messages = []
+        used = 0
+        for message in reversed(buffer):
+            content = message.content
+            used += estimate_tokens(content)
+            if messages and used > max_tokens:
+                break
+            messages.append({"role": message.role, "content": content})
+        messages.reverse()
+        return messages
+
+    def to_state(self) -> Dict:
+        """Plain form for session persistence (compressed entries stay compressed)"""
+        return {
+            "compress": self.compress,
+            "counts": self.counts,
+            "buffers": {
+                agent: [buffer.maxlen, [[m.role, m.data, m.compressed] for m in buffer]]
+                for agent, buffer in self.buffers.items()
+            },
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict) -> "ConversationStore":
+        store = cls({}, compress=state["compress"])
+        for agent, (depth, messages) in state["buffers"].items():
+            buffer = store.buffers[agent] = deque(maxlen=depth)
+            for role, data, compressed in messages:
+                message = Message(role, data)
+                message.compressed = compressed
+                buffer.append(message)
+        store.counts = dict(state.get("counts", {}))
+        return store
+
+    def __len__(self):
+        return sum(len(buffer) for buffer in self.buffers.values())
+
+    def message_count(self) -> int:
+        """Messages ever appended; unlike len() it keeps growing once the buffers are full"""
+        return sum(self.counts.get(agent, len(buffer)) for agent, buffer in self.buffers.items())
+
+    def memory_bytes(self) -> int:
+        """Approximate bytes held by this session's history"""
+        total = sys.getsizeof(self) + sys.getsizeof(self.buffers)
+        for buffer in self.buffers.values():
+            total += sys.getsizeof(buffer) + sum(message.nbytes() for message in buffer)
+        return total
@@ -0,0 +1,383 @@
+"""
+Dice and event engine
+Dice expressions (4d6kh3+2, d20 advantage), per-session seeded rollers that draw in batches,
+O(1) weighted event tables and bulk rolls for simulations
+"""
+
+import contextvars
+import hashlib
+import os
+import random
+import re
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; bulk rolls fall back to the stdlib batches
+    np = None
+
+# Batch of 16-bit draws fetched per refill
+BATCH = 1024
+# Limits for dice expressions coming from players or models
+MAX_DICE = 1000
+MAX_SIDES = 10000
+
+# DICE_SEED makes every session's rolls reproducible (replays, tests); unset means random seeds
+BASE_SEED = os.getenv("DICE_SEED")
+
+
+class DiceError(ValueError):
+    """A dice expression that cannot be rolled"""
+
+
+def derive_seed(*parts) -> int:
+    """Stable seed from any parts (e.g. base seed and session key)"""
+    digest = hashlib.blake2b(":".join(map(str, parts)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") >> 1  # 63 bits: fits the session codec's int64
+
+
+class DiceRoller:
+    """Seeded random source for one session
+
+    Values come from numbered blocks, each generated from (seed, block number); bulk draws
+    come from their own numbered streams, so they never move the block stream. The roller's
+    whole position is four integers and persists cheaply with the session.
+    """
+
+    __slots__ = ("seed", "block", "position", "bulks", "buffer")
+
+    def __init__(self, seed: Optional[int] = None, block: int = 0, position: int = 0, bulks: int = 0):
+        if seed is None:
+            seed = derive_seed(BASE_SEED, os.urandom(8).hex()) if BASE_SEED is None else derive_seed(BASE_SEED)
+        self.seed = seed
+        self.block = block
+        self.position = position
+        self.bulks = bulks
+        self.buffer = self._generate(block - 1) if block else array("H")
+
+    @classmethod
+    def for_session(cls, key: str) -> "DiceRoller":
+        """Roller whose seed follows from DICE_SEED and the session key (random if DICE_SEED is unset)"""
+        if BASE_SEED is None:
+            return cls()
+        return cls(derive_seed(BASE_SEED, key))
+
+    def _generate(self, block: int, size: int = BATCH) -> array:
+        values = array("H", random.Random(derive_seed(self.seed, block)).randbytes(size * 2))
+        if values.itemsize != 2:
+            raise RuntimeError("array('H') must be 16 bits")
+        return values
+
+    def _refill(self):
+        self.buffer = self._generate(self.block)
+        self.block += 1
+        self.position = 0
+
+    def bulk_seed(self) -> int:
+        """Seed for the next bulk draw (a stream apart from the single rolls)"""
+        seed = derive_seed(self.seed, "bulk", self.bulks)
+        self.bulks += 1
+        return seed
+
+    def bits16(self) -> int:
+        if self.position >= len(self.buffer):
+            self._refill()
+        value = self.buffer[self.position]
+        self.position += 1
+        return value
+
+    def randint(self, sides: int) -> int:
+        """Uniform integer in 1..sides (rejection sampling, no modulo bias)"""
+        if sides > 65536:
+            return (self.bits16() << 16 | self.bits16()) % sides + 1
+        limit = 65536 - 65536 % sides
+        while True:
+            value = self.bits16()
+            if value < limit:
+                return value % sides + 1
+
+    def ints(self, sides: int, count: int) -> List[int]:
+        """count rolls of 1..sides, drawn from the buffer in one pass"""
+        if sides > 65536:
+            return [self.randint(sides) for _ in range(count)]
+        limit = 65536 - 65536 % sides
+        out = []
+        while len(out) < count:
+            if self.position >= len(self.buffer):
+                self._refill()
+            chunk = self.buffer[self.position:self.position + (count - len(out))]
+            self.position += len(chunk)
+            out.extend([value % sides + 1 for value in chunk if value < limit])
+        return out
+
+    def random(self) -> float:
+        """Uniform float in [0, 1) with 32 bits of resolution"""
+        return (self.bits16() << 16 | self.bits16()) / 4294967296.0
+
+    def bulk(self, sides: int, count: int):
+        """Large batch of rolls for simulations: a numpy array if numpy is installed, else a list
+
+        Each call uses its own bulk stream, so results are reproducible for a given seed and backend.
+        """
+        seed = self.bulk_seed()
+        if np is not None:
+            generator = np.random.Generator(np.random.PCG64(seed))
+            return generator.integers(1, sides + 1, size=count, dtype=np.int32)
+        limit = 65536 - 65536 % sides
+        source = random.Random(seed)
+        out = []
+        while len(out) < count:
+            need = count - len(out)
+            values = array("H", source.randbytes((need + need // 8 + 16) * 2))
+            out.extend([value % sides + 1 for value in values if value < limit])
+        del out[count:]
+        return out
+
+    def to_state(self) -> list:
+        return [self.seed, self.block, self.position, self.bulks]
+
+    @classmethod
+    def from_state(cls, values: list) -> "DiceRoller":
+        return cls(*values)
+
+
+# The roller for the current session (set by the chat handlers; tools read it)
+_current = contextvars.ContextVar("dice_roller", default=None)
+_fallback = None
+
+
+def use(roller: DiceRoller):
+    _current.set(roller)
+
+
+def current() -> DiceRoller:
+    global _fallback
+    roller = _current.get()
+    if roller is None:
+        if _fallback is None:
+            _fallback = DiceRoller()
+        roller = _fallback
+    return roller
+
+
+# Dice expressions
+_TERM = re.compile(r"\s*([+-]?)\s*(?:(\d*)\s*d\s*(\d+|%)\s*(?:(kh|kl|dh|dl|k|d)\s*(\d+)|(adv(?:antage)?|dis(?:advantage)?))?|(\d+))\s*",
+                   re.IGNORECASE)
+
+
+class DiceTerm:
+    __slots__ = ("sign", "count", "sides", "keep", "keep_count")
+
+    def __init__(self, sign: int, count: int, sides: int, keep: Optional[str] = None, keep_count: int = 0):
+        self.sign = sign
+        self.count = count
+        self.sides = sides
+        self.keep = keep  # "h" (keep highest), "l" (keep lowest) or None
+        self.keep_count = keep_count
+
+    def kept(self, rolls: List[int]) -> List[int]:
+        if self.keep is None:
+            return rolls
+        ordered = sorted(rolls, reverse=self.keep == "h")
+        return ordered[:self.keep_count]
+
+    def __str__(self):
+        text = f"{self.count}d{self.sides}"
+        if self.keep:
+            text += f"k{self.keep}{self.keep_count}"
+        return text
+
+
+class Roll:
+    """The outcome of one expression: total plus each term's dice"""
+
+    __slots__ = ("expression", "total", "dice", "modifier")
+
+    def __init__(self, expression: "DiceExpression", total: int, dice: List[Tuple[DiceTerm, List[int]]], modifier: int):
+        self.expression = expression
+        self.total = total
+        self.dice = dice
+        self.modifier = modifier
+
+    def describe(self) -> str:
+        """Chat-ready text in the game's format"""
+        parts = []
+        for term, rolls in self.dice:
+            kept = term.kept(rolls)
+            if term.keep is None:
+                parts.append(" + ".join(map(str, rolls)))
+            else:
+                parts.append(f"[{', '.join(map(str, rolls))}] keep {', '.join(map(str, kept))}")
+        result = f"🎲 **Roll:** {self.expression.text}"
+        if self.modifier or not parts:
+            parts.append(str(self.modifier))
+        result += f"\n📊 **Results:** {' | '.join(parts)}"
+        result += f"\n🎯 **Total:** {self.total}"
+        return result
+
+
+class DiceExpression:
+    """Parsed expression such as "4d6kh3+2", "2d20kl1", "d20 adv" or "1d8+1d4-1" """
+
+    __slots__ = ("text", "terms", "modifier")
+
+    def __init__(self, text: str):
+        self.text = " ".join(text.split())
+        self.terms: List[DiceTerm] = []
+        self.modifier = 0
+        position = 0
+        source = text.strip()
+        if not source:
+            raise DiceError("Empty dice expression")
+        while position < len(source):
+            match = _TERM.match(source, position)
+            if not match or match.end() == position:
+                raise DiceError(f"Cannot parse dice expression '{text}' at '{source[position:]}'")
+            if position and not match.group(1):
+                raise DiceError(f"Missing + or - before '{source[position:].strip()}' in '{text}'")
+            position = match.end()
+            sign = -1 if match.group(1) == "-" else 1
+            if match.group(7) is not None:
+                self.modifier += sign * int(match.group(7))
+                continue
+            count = int(match.group(2) or 1)
+            sides = 100 if match.group(3) == "%" else int(match.group(3))
+            keep, keep_count = None, 0
+            if match.group(6):
+                # Advantage/disadvantage: roll twice, keep the better/worse
+                keep, keep_count = ("h" if match.group(6).lower().startswith("adv") else "l"), count
+                count *= 2
+            elif match.group(4):
+                kind, amount = match.group(4).lower(), int(match.group(5))
+                if kind in ("kh", "k"):
+                    keep, keep_count = "h", amount
+                elif kind == "kl":
+                    keep, keep_count = "l", amount
+                elif kind in ("dl", "d"):
+                    keep, keep_count = "h", count - amount
+                else:
+                    keep, keep_count = "l", count - amount
+                if not 0 < keep_count <= count:
+                    raise DiceError(f"Cannot keep {keep_count} of {count} dice in '{text}'")
+            if not 0 < count <= MAX_DICE:
+                raise DiceError(f"Dice count must be between 1 and {MAX_DICE} in '{text}'")
+            if not 1 < sides <= MAX_SIDES:
+                raise DiceError(f"Dice sides must be between 2 and {MAX_SIDES} in '{text}'")
+            self.terms.append(DiceTerm(sign, count, sides, keep, keep_count))
+
+    def roll(self, roller: Optional[DiceRoller] = None) -> Roll:
+        roller = roller or current()
+        total = self.modifier
+        dice = []
+        for term in self.terms:
+            rolls = roller.ints(term.sides, term.count)
+            total += term.sign * sum(term.kept(rolls))
+            dice.append((term, rolls))
+        return Roll(self, total, dice, self.modifier)
+
+    def roll_many(self, count: int, roller: Optional[DiceRoller] = None):
+        """Totals of `count` independent rolls, drawn in bulk"""
+        roller = roller or current()
+        totals = None
+        for term in self.terms:
+            values = roller.bulk(term.sides, count * term.count)
+            if np is not None:
+                grid = values.reshape(count, term.count)
+                if term.keep is not None:
+                    grid = np.sort(grid, axis=1)
+                    grid = grid[:, -term.keep_count:] if term.keep == "h" else grid[:, :term.keep_count]
+                sums = term.sign * grid.sum(axis=1)
+            elif term.count == 1:
+                sums = values if term.sign > 0 else [-value for value in values]
+            else:
+                n = term.count
+                sums = [term.sign * sum(term.kept(values[i:i + n])) for i in range(0, len(values), n)]
+            totals = sums if totals is None else (totals + sums if np is not None else list(map(int.__add__, totals, sums)))
+        if totals is None:
+            return np.full(count, self.modifier) if np is not None else [self.modifier] * count
+        if self.modifier:
+            totals = totals + self.modifier if np is not None else [total + self.modifier for total in totals]
+        return totals
+
+    def bounds(self) -> Tuple[int, int]:
+        low = high = self.modifier
+        for term in self.terms:
+            kept = term.keep_count if term.keep else term.count
+            low += term.sign * (kept if term.sign > 0 else kept * term.sides)
+            high += term.sign * (kept * term.sides if term.sign > 0 else kept)
+        return low, high
+
+
+_parsed: Dict[str, DiceExpression] = {}
+
+
+def parse(text: str) -> DiceExpression:
+    """Parse (and cache) a dice expression"""
+    expression = _parsed.get(text)
+    if expression is None:
+        expression = DiceExpression(text)
+        if len(_parsed) < 4096:
+            _parsed[text] = expression
+    return expression
+
+
+def roll(text: str, roller: Optional[DiceRoller] = None) -> Roll:
+    return parse(text).roll(roller)
+
+
+def d(sides: int, roller: Optional[DiceRoller] = None) -> int:
+    """One die, e.g. d(20)"""
+    return (roller or current()).randint(sides)
+
+
+# Weighted tables
+class AliasTable:
+    """Weighted choice in O(1) per draw (Vose's alias method), built once per table"""
+
+    __slots__ = ("items", "probability", "alias")
+
+    def __init__(self, items: Sequence[Any], weights: Optional[Sequence[float]] = None):
+        if not items:
+            raise ValueError("AliasTable needs at least one item")
+        n = len(items)
+        weights = list(weights) if weights is not None else [1.0] * n
+        total = float(sum(weights))
+        scaled = [weight * n / total for weight in weights]
+        self.items = list(items)
+        self.probability = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            low, high = small.pop(), large.pop()
+            self.probability[low] = scaled[low]
+            self.alias[low] = high
+            scaled[high] -= 1.0 - scaled[low]
+            (small if scaled[high] < 1.0 else large).append(high)
+
+    def sample(self, roller: Optional[DiceRoller] = None):
+        u = (roller or current()).random() * len(self.items)
+        index = int(u)
+        return self.items[index] if u - index < self.probability[index] else self.items[self.alias[index]]
+
+    def sample_many(self, count: int, roller: Optional[DiceRoller] = None) -> list:
+        """count draws; with numpy the draws are vectorized"""
+        roller = roller or current()
+        n = len(self.items)
+        seed = roller.bulk_seed()
+        if np is not None:
+            u = np.random.Generator(np.random.PCG64(seed)).random(count) * n
+            index = u.astype(np.int64)
+            keep = (u - index) < np.asarray(self.probability)[index]
+            chosen = np.where(keep, index, np.asarray(self.alias)[index])
+            return [self.items[i] for i in chosen]
+        words = array("I", random.Random(seed).randbytes(count * 4))
+        scale = n / 4294967296.0
+        probability, alias, items = self.probability, self.alias, self.items
+        out = []
+        for word in words:
+            u = word * scale
+            index = int(u)
+            out.append(items[index] if u - index < probability[index] else items[alias[index]])
+        return out
@@ -0,0 +1,486 @@
+"""
+Table-driven agent engine
+Each agent is a declarative AgentSpec; one turn loop serves all of them
+"""
+
+import asyncio
+import os
+import string
+import time
+import chainlit as cl
+from dataclasses import dataclass, field
+from typing import Dict, Any, Callable, Optional
+import rules
+import metrics
+import prompts
+import router
+import scheduler
+import warmstart
+import memory
+import speculation
+import supervisor
+import turnlog
+from response_cache import cache_from_env
+from conversation import ConversationStore
+from compaction import estimate_tokens
+
+# Imported on first use (or by the warm-up), as it is slow to import
+litellm = warmstart.lazy_module("litellm")
+
+# How mechanical turns (combat, items) use the model:
+#   "off"   - templated narration only, no model call
+#   "async" - templated narration shown instantly, model flavor sent afterwards
+#   "sync"  - wait for the model to narrate (original behavior)
+FLAVOR_MODE = os.getenv("GAME_LLM_FLAVOR", "async")
+
+# Shared response cache (configured with RESPONSE_CACHE* environment variables)
+response_cache = cache_from_env()
+
+# Speculative pre-generation of offered choices (GAME_SPECULATE=on)
+speculator = speculation.speculator_from_env()
+
+# Long-term memory of past turns, recalled into narration prompts (GAME_MEMORY=on)
+narrative_memory = memory.memory_from_env()
+
+# Streamed tokens are sent to the UI in batches: at most every STREAM_FLUSH_MS,
+# or sooner once STREAM_FLUSH_CHARS characters are buffered
+STREAM_FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_MS", "50")) / 1000
+STREAM_FLUSH_CHARS = int(os.getenv("STREAM_FLUSH_CHARS", "48"))
+
+
+class CompiledTemplate:
+    """A str.format template split once into literal and field parts"""
+
+    __slots__ = ("parts",)
+
+    def __init__(self, template: str):
+        self.parts = []
+        for literal, field_name, spec, conversion in string.Formatter().parse(template):
+            if literal:
+                self.parts.append((literal, None, None))
+            if field_name is not None:
+                self.parts.append(("", field_name, "{" + (f"!{conversion}" if conversion else "") + (f":{spec}" if spec else "") + "}"))
+
+    def render(self, fields: Dict[str, Any]) -> str:
+        out = []
+        for literal, name, fmt in self.parts:
+            if name is None:
+                out.append(literal)
+            elif fmt == "{}":
+                out.append(str(fields[name]))
+            else:
+                out.append(fmt.format(fields[name]))
+        return "".join(out)
+
+
+@dataclass(frozen=True)
+class AgentSpec:
+    """Declarative description of one game agent
+
+    instructions: static system prompt; template: the volatile per-turn message, sent last
+    tools(game_state) -> facts rolled for the turn (dice, events)
+    transition(game_state, facts) -> resolution dict with at least "next_agent"
+    format_result(game_state, facts, story, resolution) -> text shown to the player
+    mechanical: outcome is decided by the rules, so the story honors FLAVOR_MODE
+    quality: how capable a model the agent's normal turns need, 0..1 (used by the model router)
+    cache_fields: game_state/facts keys the narration depends on (for the response cache)
+    window: messages sent with a normal turn; history_depth: messages kept per session
+    window_step: the history window's first message only moves every window_step messages (stable prefix)
+    prompt_budget: token budget for the history sent with a `prompt:` message
+    stream_header(facts) -> text shown above the story while it streams
+    context(game_state) -> world context for the turn, sent after the instructions (None for none)
+    """
+    name: str
+    template: str
+    tools: Callable[[Dict[str, Any]], Dict[str, Any]]
+    transition: Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]
+    format_result: Callable[..., str]
+    instructions: str = ""
+    model: str = "gemini/gemini-1.5-flash"
+    temperature: float = 0.7
+    window: int = 5
+    history_depth: int = 20
+    window_step: int = 8
+    prompt_budget: int = 2000
+    mechanical: bool = False
+    quality: float = 0.5
+    cache_fields: tuple = ()
+    stream_header: Callable[[Dict[str, Any]], str] = None
+    context: Callable[[Dict[str, Any]], Optional[str]] = None
+    compiled: CompiledTemplate = field(init=False, repr=False, compare=False)
+    system: str = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "compiled", CompiledTemplate(prompts.canonical(self.template)))
+        object.__setattr__(self, "system", prompts.canonical(self.instructions))
+
+
+# Registry of agents by name
+AGENTS: Dict[str, AgentSpec] = {}
+
+
+def register(spec: AgentSpec) -> AgentSpec:
+    AGENTS[spec.name] = spec
+    return spec
+
+
+def new_conversation_history() -> ConversationStore:
+    return ConversationStore({name: spec.history_depth for name, spec in AGENTS.items()})
+
+
+def build_messages(spec: AgentSpec, history: ConversationStore, prompt: str, context: Optional[str] = None,
+                   recalled: Optional[str] = None) -> list:
+    """Instructions, context and a stable history window first; recalled memories and the turn prompt last"""
+    recent = history.stable_recent(spec.name, spec.window - 1, spec.window_step)
+    return prompts.assemble(spec.system, context, recent, prompt, recalled)
+
+
+class TokenStream:
+    """Coalesces streamed tokens into fewer, larger UI updates"""
+
+    def __init__(self, message, header: str = "", interval: float = None, max_chars: int = None, ready=None):
+        self.message = message
+        self.header = header
+        self.ready = ready  # the message's pending send, if it was started in the background
+        self.interval = STREAM_FLUSH_INTERVAL if interval is None else interval
+        self.max_chars = STREAM_FLUSH_CHARS if max_chars is None else max_chars
+        self.buffer = []
+        self.buffered = 0
+        self.last_flush = time.perf_counter()
+        self.started = False
+        self.flushes = 0
+
+    async def push(self, token: str):
+        self.buffer.append(token)
+        self.buffered += len(token)
+        # The first token goes out at once so time-to-first-token isn't delayed
+        if (not self.started or self.buffered >= self.max_chars
+                or time.perf_counter() - self.last_flush >= self.interval):
+            await self.flush()
+
+    async def flush(self):
+        if not self.buffer:
+            return
+        text = "".join(self.buffer)
+        self.buffer.clear()
+        self.buffered = 0
+        self.last_flush = time.perf_counter()
+        self.flushes += 1
+        if not self.started:
+            # Replace the "thinking" placeholder on the first flush
+            self.started = True
+            if self.ready is not None:
+                await self.ready
+            self.message.content = ""
+            await self.message.stream_token(self.header + text, is_sequence=True)
+        else:
+            await self.message.stream_token(text)
+
+
+def ttft_report() -> Dict[str, Dict[str, float]]:
+    """Average and p99 (bucket bound) time-to-first-token per agent, from the metrics registry"""
+    report = {}
+    for key, row in list(metrics.MODEL_TTFT_SECONDS.series.items()):
+        labels = dict(key)
+        report[labels["agent"]] = {
+            "calls": row[-1],
+            "ttft_avg": row[-2] / row[-1],
+            "ttft_p99": metrics.MODEL_TTFT_SECONDS.percentile(99, **labels),
+        }
+    return report
+
+
+def _record_model_call(spec: AgentSpec, messages: list, text: str, ttft: float, total: float):
+    metrics.TOKENS.inc(sum(estimate_tokens(m["content"]) for m in messages), agent=spec.name, direction="in")
+    metrics.TOKENS.inc(estimate_tokens(text), agent=spec.name, direction="out")
+    if metrics.sampled():
+        metrics.MODEL_TTFT_SECONDS.observe(ttft, agent=spec.name)
+        metrics.MODEL_SECONDS.observe(total, agent=spec.name)
+
+
+# Model helpers
+async def _first_within(chunks, timeout: Optional[float]):
+    """Yield from a stream, raising router.SLOBreach if the first chunk takes longer than timeout"""
+    iterator = chunks.__aiter__()
+    if timeout is not None:
+        try:
+            first = await asyncio.wait_for(iterator.__anext__(), timeout)
+        except StopAsyncIteration:
+            return
+        except asyncio.TimeoutError:
+            raise router.SLOBreach(f"no output within {timeout}s")
+        yield first
+    async for chunk in iterator:
+        yield chunk
+
+
+async def _complete_on(spec: AgentSpec, model: str, options: Dict[str, Any], messages: list,
+                       stream: Optional[TokenStream], priority: int, timeout: Optional[float] = None) -> str:
+    """One model call; timeout bounds the whole call, or the first chunk when streaming"""
+    options = {"api_key": os.getenv("GOOGLE_API_KEY"), **options}
+    prompts.observe(model, messages)
+    started = time.perf_counter()
+    if stream is None:
+        response = await asyncio.wait_for(scheduler.get_scheduler().call(
+            model,
+            litellm.acompletion,
+            model=model,
+            messages=messages,
+            temperature=spec.temperature,
+            priority=priority,
+            **options
+        ), timeout)
+        text = response.choices[0].message.content
+        total = time.perf_counter() - started
+        prompts.record_usage(model, getattr(response, "usage", None))
+        _record_model_call(spec, messages, text, total, total)
+        return text
+
+    ttft = None
+    parts = []
+    usage = None
+    response = scheduler.get_scheduler().stream(
+        model,
+        lambda: litellm.acompletion(
+            model=model,
+            messages=messages,
+            temperature=spec.temperature,
+            stream=True,
+            stream_options={"include_usage": True},
+            **options
+        ),
+        priority
+    )
+    async for chunk in _first_within(response, timeout):
+        usage = getattr(chunk, "usage", None) or usage
+        token = chunk.choices[0].delta.content if chunk.choices else None
+        if not token:
+            continue
+        if ttft is None:
+            ttft = time.perf_counter() - started
+        parts.append(token)
+        await stream.push(token)
+    await stream.flush()
+    total = time.perf_counter() - started
+    text = "".join(parts)
+    prompts.record_usage(model, usage)
+    _record_model_call(spec, messages, text, total if ttft is None else ttft, total)
+    return text
+
+
+async def complete(spec: AgentSpec, messages: list, stream: Optional[TokenStream] = None,
+                   priority: Optional[int] = None, kind: Optional[str] = None) -> str:
+    """Call the model through the shared scheduler (mechanical turns go first)
+
+    With MODEL_ROUTER=on the call goes to the cheapest tier good enough for its kind of call
+    (see router.py), falling back to the next tier on an error or SLO breach before any output.
+    """
+    if priority is None:
+        priority = scheduler.HIGH if spec.mechanical else scheduler.NORMAL
+    routing = router.get_router()
+    if not router.ENABLED or not routing.tiers:
+        return await _complete_on(spec, spec.model, {}, messages, stream, priority)
+
+    if kind is None:
+        kind = "recap" if spec.mechanical else "turn"
+    tiers = routing.route(spec.name, kind, len(messages[-1]["content"]), spec.quality)
+
+    async def attempt(tier: router.Tier, timeout: Optional[float]) -> str:
+        options = {"api_base": tier.api_base, "api_key": tier.api_key} if tier.api_base else {}
+        started = time.perf_counter()
+        try:
+            text = await _complete_on(spec, tier.model, options, messages, stream, priority, timeout)
+        except Exception:
+            routing.record(tier, time.perf_counter() - started, ok=False)
+            raise
+        routing.record(tier, time.perf_counter() - started,
+                       sum(estimate_tokens(m["content"]) for m in messages), estimate_tokens(text))
+        return text
+
+    return await routing.call(tiers, attempt, lambda: stream is None or not stream.started)
+
+
+def cache_scene(spec: AgentSpec, history: ConversationStore, context: Optional[str], recalled: Optional[str]) -> str:
+    """What a cached story must follow: the agent's last story, the world context and recalled memories"""
+    last = history.recent(spec.name, 1)
+    return "\0".join((last[0]["content"] if last else "", context or "", recalled or ""))
+
+
+async def tell_story(spec: AgentSpec, prompt: str, history: ConversationStore, cache_state: Optional[Dict] = None,
+                     stream: Optional[TokenStream] = None, context: Optional[str] = None,
+                     recalled: Optional[str] = None, player_action: str = "") -> str:
+    """Ask the model to narrate a turn and record it in the agent's history"""
+    story = None
+    cached = response_cache is not None and cache_state is not None
+    if cached:
+        scene = cache_scene(spec, history, context, recalled)
+        story = response_cache.get(spec.name, prompt, cache_state, player_action, scene)
+
+    if story is None:
+        started = time.perf_counter()
+        story = await complete(spec, build_messages(spec, history, prompt, context, recalled), stream)
+        if cached:
+            response_cache.put(spec.name, prompt, cache_state, story, time.perf_counter() - started,
+                               player_action, scene)
+
+    # Recorded only once the turn completes, so a cancelled turn leaves no trace
+    history.append(spec.name, "user", prompt)
+    history.append(spec.name, "assistant", story)
+    turnlog.note_output(story)
+    return story
+
+
+FLAVOR_INSTRUCTIONS = "Add one or two vivid sentences of flavor to the turn below. Do not change the outcome."
+
+def schedule_flavor(spec: AgentSpec, prompt: str, story: str):
+    """Send model-written flavor for an already resolved turn in the background"""
+    messages = prompts.assemble(spec.system, FLAVOR_INSTRUCTIONS, [],
+                                f"{prompt}\nThe outcome is already decided: {story}")
+    # Flavor is optional (the turn result has already been shown); the supervisor logs failures
+    tasks = supervisor.get(cl.user_session.get("id"))
+
+    async def flavor():
+        text = await complete(spec, messages, priority=scheduler.LOW, kind="flavor")
+        tasks.ui(cl.Message(content=f"🎨 {text}").send())
+
+    tasks.spawn(flavor(), "flavor")
+
+
+async def mechanical_story(spec: AgentSpec, prompt: str, history: ConversationStore, cache_state: Dict, resolution: Dict,
+                           stream: Optional[TokenStream] = None, context: Optional[str] = None,
+                           player_action: str = "") -> str:
+    """Narrate a turn whose outcome is already decided, honoring FLAVOR_MODE"""
+    if FLAVOR_MODE == "sync":
+        return await tell_story(spec, prompt, history, {**cache_state, "outcome": resolution["outcome"]}, stream,
+                                context, player_action=player_action)
+
+    story = rules.narrate(resolution["outcome"], **cache_state)
+    history.append(spec.name, "user", prompt)
+    history.append(spec.name, "assistant", story)
+    if FLAVOR_MODE == "async":
+        schedule_flavor(spec, prompt, story)
+    return story
+
+
+async def custom_prompt(spec: AgentSpec, text: str, history: ConversationStore, message=None, ready=None) -> tuple:
+    """Send a player's `prompt:` message straight to the model, with as much history as the budget allows"""
+    messages = history.within_budget(spec.name, spec.prompt_budget - estimate_tokens(text))
+    messages.append({"role": "user", "content": text})
+    stream = TokenStream(message, "🤖 **AI Response:** ", ready=ready) if message is not None else None
+    ai_response = await complete(spec, messages, stream, kind="custom")
+    turnlog.note_output(ai_response)
+    history.append(spec.name, "user", text)
+    history.append(spec.name, "assistant", ai_response)
+    return f"🤖 **AI Response:** {ai_response}", spec.name
+
+
+def speculate(spec: AgentSpec, session: str, story: str, game_state: Dict[str, Any], history: ConversationStore):
+    """Pre-generate the next turn for each choice offered in the story (tools are pre-rolled too)"""
+    choices = speculation.parse_choices(story)
+    if not choices:
+        return
+    recent = history.stable_recent(spec.name, spec.window - 1, spec.window_step)
+    context = spec.context(game_state) if spec.context else None
+
+    def make(choice: str):
+        facts = spec.tools(game_state)
+        prompt = spec.compiled.render({**game_state, **facts, "player_action": choice})
+        messages = prompts.assemble(spec.system, context, recent, prompt)
+        tokens = sum(estimate_tokens(m["content"]) for m in messages)
+        if not speculator.allow(tokens):
+            return None
+        task = asyncio.create_task(complete(spec, messages, priority=scheduler.LOW, kind="speculation"))
+        return speculation.Speculation(spec.name, choice, facts, prompt, task, tokens)
+
+    speculator.start(session, speculation.fingerprint(game_state, history), choices, make)
+
+
+async def serve_speculation(spec: AgentSpec, ahead: speculation.Speculation, session: str, game_state: Dict[str, Any],
+                            history: ConversationStore, stream: Optional[TokenStream] = None) -> tuple:
+    """Finish a turn from a speculation the player picked"""
+    story = await ahead.task
+    speculator.used(ahead)
+    turnlog.note_facts(ahead.facts)
+    turnlog.note_output(story)
+    if stream is not None:
+        await stream.push(story)
+        await stream.flush()
+    history.append(spec.name, "user", ahead.prompt)
+    history.append(spec.name, "assistant", story)
+    remember_turn(session, ahead.choice, story)
+    resolution = spec.transition(game_state, ahead.facts)
+    if resolution["next_agent"] == spec.name:
+        speculate(spec, session, story, game_state, history)
+    return spec.format_result(game_state, ahead.facts, story, resolution), resolution["next_agent"]
+
+
+def remember_turn(session: Optional[str], player_action: str, story: str):
+    """Index a played turn in the session's long-term memory, in the background"""
+    if narrative_memory is not None and session is not None:
+        supervisor.get(cl.user_session.get("id")).spawn(
+            narrative_memory.remember(session, f"Player: {player_action}\n{story}"), "memory")
+
+
+def cancel_speculation(session: str):
+    if speculator is not None:
+        speculator.discard(session)
+
+
+async def run_turn(agent_name: str, player_action: str, game_state: Dict[str, Any], history: ConversationStore,
+                   message=None, session: Optional[str] = None, ready=None) -> tuple:
+    """Play one turn with the given agent; returns (result text, next agent)
+
+    When a Chainlit message is given, model output is streamed into it as it arrives (after `ready`,
+    the message's pending send, if any).
+    With a session key and speculation enabled, picks of pre-generated choices are served at once.
+    """
+    spec = AGENTS.get(agent_name)
+    if spec is None:
+        return "💀 **Game Over!** Type `restart` to play again.", "game_over"
+
+    if speculator is not None and session is not None:
+        ahead = speculator.take(session, player_action, speculation.fingerprint(game_state, history))
+        if ahead is not None and ahead.agent == spec.name:
+            stream = None
+            if message is not None:
+                stream = TokenStream(message, spec.stream_header(ahead.facts) if spec.stream_header else "", ready=ready)
+            try:
+                return await serve_speculation(spec, ahead, session, game_state, history, stream)
+            except Exception as e:
+                # Fall back to a normal turn unless output has already been shown
+                if stream is not None and stream.started:
+                    raise
+                print(f"[WARN] Speculation failed, generating normally: {e}")
+
+    # Check if player wants to give custom prompt
+    if player_action[:7].lower() == "prompt:":
+        return await custom_prompt(spec, player_action[7:].strip(), history, message, ready)
+
+    facts = spec.tools(game_state)
+    turnlog.note_facts(facts)
+    with metrics.span("prompt_build", agent=spec.name):
+        prompt = spec.compiled.render({**game_state, **facts, "player_action": player_action})
+        cache_state = {key: facts[key] if key in facts else game_state[key] for key in spec.cache_fields}
+        context = spec.context(game_state) if spec.context else None
+    stream = None
+    if message is not None:
+        stream = TokenStream(message, spec.stream_header(facts) if spec.stream_header else "", ready=ready)
+
+    if spec.mechanical:
+        # Outcome is decided by the rules before any narration
+        resolution = spec.transition(game_state, facts)
+        story = await mechanical_story(spec, prompt, history, cache_state, resolution, stream, context, player_action)
+    else:
+        # Past turns like this one, beyond the history window
+        recalled = None
+        if narrative_memory is not None and session is not None:
+            query = " ".join([player_action, *(str(value) for value in cache_state.values())])
+            recalled = await narrative_memory.recall(session, query)
+        # State only changes once the model has answered
+        story = await tell_story(spec, prompt, history, cache_state, stream, context, recalled, player_action)
+        resolution = spec.transition(game_state, facts)
+        if speculator is not None and session is not None and resolution["next_agent"] == spec.name:
+            speculate(spec, session, story, game_state, history)
+
+    remember_turn(session, player_action, story)
+    return spec.format_result(game_state, facts, story, resolution), resolution["next_agent"]
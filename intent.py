@@ -0,0 +1,119 @@
+"""
+Local turn routing for main.py
+Picks the Narrator, Monster or Item agent for a player message from a weighted keyword lexicon
+(numbered picks are resolved to the offered choice first) and a rules table over the game state,
+so a turn can start at the right agent without a Game Master handoff; ambiguous input returns None
+"""
+
+import os
+import re
+from typing import Dict, Any, Callable, NamedTuple, Optional, Tuple
+from speculation import parse_choices, match_choice
+
+# A message is routed locally when its best agent scores at least MIN_SCORE and beats the
+# runner-up by MARGIN (share of the best score); otherwise the Game Master decides
+MIN_SCORE = float(os.getenv("INTENT_MIN_SCORE", "1.0"))
+MARGIN = float(os.getenv("INTENT_MARGIN", "0.34"))
+
+AGENTS = ("NarratorAgent", "MonsterAgent", "ItemAgent")
+
+# Words and phrases (matched on word boundaries) with their weight towards each agent
+LEXICON: Dict[str, Dict[str, float]] = {
+    "MonsterAgent": {
+        "attack": 2, "fight": 2, "strike": 2, "hit": 1.5, "slash": 2, "stab": 2, "swing": 1.5, "shoot": 2,
+        "kill": 2, "charge": 1, "punch": 2, "kick": 1.5, "parry": 2, "block": 1, "dodge": 2, "defend": 1.5,
+        "cast": 1, "fireball": 2, "spell": 1, "ambush": 1.5, "duel": 2, "battle": 2, "combat": 2,
+        "flee": 1.5, "retreat": 1.5, "run away": 1.5, "enemy": 1, "monster": 1, "wolf": 1, "bandit": 1,
+        "bandits": 1, "dragon": 1, "goblin": 1, "beast": 1, "with my sword": 1,
+    },
+    "ItemAgent": {
+        "take": 1.5, "pick up": 2, "grab": 1.5, "loot": 2, "collect": 1.5, "equip": 2, "wield": 1.5,
+        "wear": 1.5, "inventory": 2, "chest": 1.5, "treasure": 1.5, "reward": 1.5, "gold": 1, "coins": 1.5,
+        "potion": 1.5, "drink": 1.5, "buy": 2, "sell": 2, "trade": 1.5, "open the chest": 1, "search": 1,
+        "item": 1.5, "items": 1.5, "use": 1, "hoard": 1.5, "artifact": 1.5, "gem": 1, "pouch": 1,
+    },
+    "NarratorAgent": {
+        "start": 2, "begin": 2, "continue": 1.5, "look": 1.5, "look around": 1, "explore": 2, "go": 1,
+        "walk": 1.5, "travel": 1.5, "head": 1, "enter": 1.5, "leave": 1.5, "follow": 1.5, "north": 1.5,
+        "south": 1.5, "east": 1.5, "west": 1.5, "talk": 2, "ask": 1.5, "speak": 2, "greet": 1.5, "listen": 1.5,
+        "rest": 1.5, "sleep": 1.5, "camp": 1.5, "wait": 1, "investigate": 1.5, "path": 1, "road": 1,
+        "forest": 1, "village": 1, "town": 1, "help": 1, "story": 1,
+    },
+}
+
+# Rules over the game state, applied (in order) when the message itself is ambiguous:
+# (predicate, agent, reason)
+STATE_RULES: Tuple[Tuple[Callable[[Dict[str, Any]], bool], str, str], ...] = (
+    (lambda state: bool(state.get("in_combat")), "MonsterAgent", "in combat"),
+)
+
+_WORD = re.compile(r"[a-z']+")
+
+
+def _compile(lexicon: Dict[str, Dict[str, float]]):
+    words: Dict[str, Dict[str, float]] = {}
+    phrases = []
+    for agent, terms in lexicon.items():
+        for term, weight in terms.items():
+            if " " in term:
+                phrases.append((re.compile(r"\b" + re.escape(term) + r"\b"), agent, weight))
+            else:
+                words.setdefault(term, {})[agent] = weight
+    return words, phrases
+
+
+_WORDS, _PHRASES = _compile(LEXICON)
+
+
+class Intent(NamedTuple):
+    """Routing decision: agent is None when the input is ambiguous"""
+    agent: Optional[str]
+    method: str  # "classifier", "rules", "sticky" or "ambiguous"
+    scores: Dict[str, float]
+    text: str  # the text classified (the offered choice for a numbered pick)
+
+
+def score(text: str) -> Dict[str, float]:
+    """Lexicon score per agent"""
+    text = text.lower()
+    scores = dict.fromkeys(AGENTS, 0.0)
+    for word in _WORD.findall(text):
+        weights = _WORDS.get(word)
+        if weights:
+            for agent, weight in weights.items():
+                scores[agent] += weight
+    for pattern, agent, weight in _PHRASES:
+        if pattern.search(text):
+            scores[agent] += weight
+    return scores
+
+
+def decisive(scores: Dict[str, float]) -> Optional[str]:
+    """The best agent if it clears MIN_SCORE and MARGIN, else None"""
+    ranked = sorted(scores.items(), key=lambda item: -item[1])
+    (best, top), (_, second) = ranked[0], ranked[1]
+    if top >= MIN_SCORE and (top - second) / top >= MARGIN:
+        return best
+    return None
+
+
+def classify(message: str, game_state: Dict[str, Any], last_response: str = "",
+             current_agent: Optional[str] = None) -> Intent:
+    """Route one player message: keywords first, then the state rules, then (for a numbered pick)
+    the agent that offered the choice; None leaves the decision to the Game Master"""
+    text = message
+    choices = parse_choices(last_response) if last_response else []
+    picked = match_choice(message, choices) if choices else None
+    if picked is not None:
+        text = choices[picked]
+    scores = score(text)
+    agent = decisive(scores)
+    if agent is not None:
+        return Intent(agent, "classifier", scores, text)
+    for predicate, rule_agent, _ in STATE_RULES:
+        if predicate(game_state):
+            return Intent(rule_agent, "rules", scores, text)
+    if picked is not None and current_agent in AGENTS:
+        # Continuing the scene the current agent set up
+        return Intent(current_agent, "sticky", scores, text)
+    return Intent(None, "ambiguous", scores, text)
@@ -1,12 +1,24 @@
 import os
 from dotenv import load_dotenv
 import chainlit as cl
-from typing import List, Dict
-from agents import Agent, Runner, AsyncOpenAI, OpenAIChatCompletionsModel, handoff
-from agents.run import RunConfig, RunContextWrapper
-import json
-import random
-import asyncio
+from typing import Dict, Any, Optional
+import contextvars
+import threading
+from compaction import ChatHistory
+from state import GameState, coerce
+import dice
+import intent
+import session_store
+import metrics
+import router
+import rules
+import scheduler
+import supervisor
+import time
+import turnlog
+import warmstart
+import world
+from compaction import estimate_tokens
 
 # Load environment variables
 load_dotenv()
@@ -14,108 +26,167 @@ openrouter_api_key = os.getenv("OPENROUTER_API_KEY")
 if not openrouter_api_key:
     raise ValueError("OPENROUTER_API_KEY not found in .env file")
 
-# Game Tools
-async def roll_dice(sides: int = 6, count: int = 1, modifier: int = 0) -> str:
-    """Roll dice for game mechanics (combat, skills, loot)."""
-    if sides not in [4, 6, 8, 10, 12, 20, 100]:
-        sides = 6  # Default to d6
-    if count < 1 or count > 5:
-        count = 1  # Limit rolls for simplicity
-    rolls = [random.randint(1, sides) for _ in range(count)]
-    total = sum(rolls) + modifier
-    result = f"🎲 **Roll:** {count}d{sides}"
-    if modifier != 0:
-        result += f" {'+' if modifier > 0 else '-'} {abs(modifier)}"
-    result += f"\n📊 **Results:** {' + '.join(map(str, rolls))}"
-    result += f"\n🎯 **Total:** {total}"
-    return result
+# Prometheus-style metrics on METRICS_PORT (if set)
+metrics.serve_from_env()
+
+# Shared world (GAME_WORLD=on): location context for every agent and travel between locations
+shared_world = world.world_from_env()
+
+# How a turn picks its agent:
+#   "handoff" - start at the session's current agent; GameMasterAgent hands off with a model call (original behavior)
+#   "direct"  - a local intent classifier and game-state rules pick Narrator/Monster/Item directly;
+#               only ambiguous input goes through GameMasterAgent's handoff
+ORCHESTRATION = os.getenv("ORCHESTRATION", "handoff")
+
+# The Agents SDK (and model_pool, which builds on it) is imported by the warm-up or the first turn
+agents = warmstart.lazy_module("agents")
+model_pool = warmstart.lazy_module("model_pool")
+
+# Model tiers for MODEL_ROUTER=on (OpenRouter model names, prices in USD per million tokens)
+routing = router.get_router()
+local_tier = router.local_tier_from_env()
+if local_tier is not None:
+    routing.add_tier(local_tier)
+routing.add_tier(router.Tier("mistral-small", "mistralai/mistral-small-3.2-24b-instruct", 0.5, 0.05, 0.10, slo=6.0))
+routing.add_tier(router.Tier("gpt-4o-mini", "openai/gpt-4o-mini", 0.7, 0.15, 0.60, slo=8.0))
+
+# Story events, built once into alias tables per (type, difficulty)
+EVENTS = {
+    "encounter": {
+        "easy": ["A merchant offers to trade.", "A lost traveler needs help."],
+        "medium": ["Bandits demand a toll.", "A beast blocks your path."],
+        "hard": ["A dragon awakens.", "Assassins ambush you."]
+    },
+    "discovery": {
+        "easy": ["You find a pouch of coins.", "A spring offers healing water."],
+        "medium": ["You uncover a hidden chest.", "A magic weapon lies in ruins."],
+        "hard": ["You find a legendary artifact.", "A dragon's hoard awaits."]
+    },
+    "environmental": {
+        "easy": ["A gentle rain falls.", "You find a peaceful grove."],
+        "medium": ["Fog reduces visibility.", "A river blocks your path."],
+        "hard": ["A magical storm erupts.", "The ground shakes violently."]
+    }
+}
+EVENT_TYPES = dice.AliasTable(list(EVENTS))
+EVENT_TABLES = {(event_type, difficulty): dice.AliasTable(options)
+                for event_type, levels in EVENTS.items() for difficulty, options in levels.items()}
+# Encounters that start a fight, and who with
+FOES = {
+    "Bandits demand a toll.": "bandits",
+    "A beast blocks your path.": "beast",
+    "A dragon awakens.": "dragon",
+    "Assassins ambush you.": "assassins",
+}
 
+# Outcomes of the current turn's tools and handoffs (e.g. the enemy of a hostile event), read when
+# the turn ends and logged as the turn's facts
+_turn_facts: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("turn_facts", default=None)
+
+def note_fact(name: str, value: Any):
+    """Record an outcome for the current turn."""
+    facts = _turn_facts.get()
+    if facts is not None:
+        facts[name] = value
+
+# Game Tools (rolls come from the session's seeded dice roller)
+@metrics.timed_tool
+async def roll_dice(sides: int = 6, count: int = 1, modifier: int = 0, expression: str = "") -> str:
+    """Roll dice for game mechanics (combat, skills, loot).
+
+    Either give sides/count/modifier, or a dice expression such as "4d6kh3+2" (keep highest 3),
+    "2d20kl1" (keep lowest), "d20 advantage" or "1d8+1d4-1".
+    """
+    if not expression:
+        expression = f"{count}d{sides}" + (f"{modifier:+d}" if modifier else "")
+    try:
+        roll = dice.roll(expression)
+    except dice.DiceError as e:
+        return f"⚠️ **Invalid roll:** {e}"
+    return roll.describe()
+
+@metrics.timed_tool
 async def generate_event(event_type: str = "random", difficulty: str = "medium") -> str:
     """Generate random story events."""
-    events = {
-        "encounter": {
-            "easy": ["A merchant offers to trade.", "A lost traveler needs help."],
-            "medium": ["Bandits demand a toll.", "A beast blocks your path."],
-            "hard": ["A dragon awakens.", "Assassins ambush you."]
-        },
-        "discovery": {
-            "easy": ["You find a pouch of coins.", "A spring offers healing water."],
-            "medium": ["You uncover a hidden chest.", "A magic weapon lies in ruins."],
-            "hard": ["You find a legendary artifact.", "A dragon's hoard awaits."]
-        },
-        "environmental": {
-            "easy": ["A gentle rain falls.", "You find a peaceful grove."],
-            "medium": ["Fog reduces visibility.", "A river blocks your path."],
-            "hard": ["A magical storm erupts.", "The ground shakes violently."]
-        }
-    }
     if event_type == "random":
-        event_type = random.choice(list(events.keys()))
-    if event_type not in events:
+        event_type = EVENT_TYPES.sample()
+    if event_type not in EVENTS:
         event_type = "encounter"
-    if difficulty not in events[event_type]:
+    if difficulty not in EVENTS[event_type]:
         difficulty = "medium"
-    selected_event = random.choice(events[event_type][difficulty])
+    selected_event = EVENT_TABLES[event_type, difficulty].sample()
+    if selected_event in FOES:
+        note_fact("enemy", FOES[selected_event])
     result = f"🎭 **Event ({difficulty.title()}):** {selected_event}"
     return result
 
 # Game state management
-def get_initial_game_state():
+def get_initial_game_state() -> GameState:
     """Initialize game state."""
-    return {
-        "player": {
-            "name": "Adventurer",
-            "health": 50,
-            "gold": 20
-        },
+    return GameState.from_dict({
+        "name": "Adventurer",
+        "health": 50,
+        "gold": 20,
         "inventory": ["Sword", "Armor", "Potion"],
         "location": "Village",
         "quest": "Find the Lost Gem"
-    }
+    })
 
 # Handoff callback with debugging - CHANGED TO SYNC
-def on_handoff(agent: Agent, ctx: RunContextWrapper[None]):
+def on_handoff(agent: "agents.Agent", ctx: "agents.RunContextWrapper[None]"):
     print(f"[DEBUG] Handing off to {agent.name}")
+    metrics.HANDOFFS.inc(agent=agent.name)
+    if agent.name == "MonsterAgent":
+        # The Game Master decided a fight starts (against the event's foe, if one was rolled)
+        facts = _turn_facts.get()
+        if facts is not None:
+            facts.setdefault("enemy", "enemy")
     cl.user_session.set("agent", agent)
-    cl.user_session.set("config", cl.user_session.get(f"{agent.name}_config"))
-    # Schedule the async message sending
-    asyncio.create_task(cl.Message(content=f"🎮 **{agent.name}** takes over!").send())
+    cl.user_session.set("config", get_agent_graph()["configs"][agent.name])
+    # Send the notice in the background, after the session's earlier messages
+    supervisor.get(cl.user_session.get("id")).ui(cl.Message(content=f"🎮 **{agent.name}** takes over!").send())
     
     
-@cl.on_chat_start
-async def start():
-    # Setup client
-    client = AsyncOpenAI(
-        api_key=openrouter_api_key,
-        base_url="https://openrouter.ai/api/v1",
-    )
+# Shared agent graph, built once per process (by the warm-up thread or the first session)
+_agent_graph = None
+_agent_graph_lock = threading.Lock()
 
-    # Define separate models for each agent
-    narrator_model = OpenAIChatCompletionsModel(
-        model="openai/gpt-4o-mini",  # Creative model for storytelling
-        openai_client=client
-    )
-    monster_model = OpenAIChatCompletionsModel(
-        model="mistralai/mistral-small-3.2-24b-instruct",  # Precise model for combat
-        openai_client=client
-    )
-    item_model = OpenAIChatCompletionsModel(
-        model="mistralai/mistral-small-3.2-24b-instruct",  # Lightweight model for inventory
-        openai_client=client
-    )
-    gamemaster_model = OpenAIChatCompletionsModel(
-        model="openai/gpt-4o-mini",  # Balanced model for coordination
-        openai_client=client
-    )
+def get_agent_graph() -> Dict:
+    """Build the agents and run configs once and share them across sessions."""
+    global _agent_graph
+    if _agent_graph is not None:
+        return _agent_graph
+    with _agent_graph_lock:
+        if _agent_graph is None:
+            _agent_graph = _build_agent_graph()
+    return _agent_graph
+
+def _build_agent_graph() -> Dict:
+    client = model_pool.get_client()
+    routed = router.ENABLED and routing.tiers
+
+    # Define separate models for each agent (with MODEL_ROUTER=on, the router picks a tier per call
+    # from the quality each agent needs)
+    if routed:
+        narrator_model = model_pool.RoutedModel("NarratorAgent", 0.6)
+        monster_model = model_pool.RoutedModel("MonsterAgent", 0.4)
+        item_model = model_pool.RoutedModel("ItemAgent", 0.4)
+        gamemaster_model = model_pool.RoutedModel("GameMasterAgent", 0.6)
+    else:
+        narrator_model = model_pool.get_model("openai/gpt-4o-mini")  # Creative model for storytelling
+        monster_model = model_pool.get_model("mistralai/mistral-small-3.2-24b-instruct")  # Precise model for combat
+        item_model = model_pool.get_model("mistralai/mistral-small-3.2-24b-instruct")  # Lightweight model for inventory
+        gamemaster_model = model_pool.get_model("openai/gpt-4o-mini")  # Balanced model for coordination
 
     # Define configurations for each model
-    narrator_config = RunConfig(model=narrator_model, model_provider=client, tracing_disabled=True)
-    monster_config = RunConfig(model=monster_model, model_provider=client, tracing_disabled=True)
-    item_config = RunConfig(model=item_model, model_provider=client, tracing_disabled=True)
-    gamemaster_config = RunConfig(model=gamemaster_model, model_provider=client, tracing_disabled=True)
+    narrator_config = agents.RunConfig(model=narrator_model, model_provider=client, tracing_disabled=True)
+    monster_config = agents.RunConfig(model=monster_model, model_provider=client, tracing_disabled=True)
+    item_config = agents.RunConfig(model=item_model, model_provider=client, tracing_disabled=True)
+    gamemaster_config = agents.RunConfig(model=gamemaster_model, model_provider=client, tracing_disabled=True)
 
-    # Define agents
-    narrator_agent = Agent(
+    # Define agents (the tools are plain functions, so they are wrapped as function tools here,
+    # once the Agents SDK is imported)
+    narrator_agent = agents.Agent(
         name="NarratorAgent",
         instructions="""
         You narrate a fantasy adventure, creating vivid scenes and progressing the story based on player choices. Use `generate_event` for random events. Offer 2-3 clear choices. Example:
@@ -126,10 +197,10 @@ async def start():
         3. Rest for the night"
         """,
         model=narrator_model,
-        tools=[generate_event]
+        tools=[agents.function_tool(generate_event)]
     )
 
-    monster_agent = Agent(
+    monster_agent = agents.Agent(
         name="MonsterAgent",
         instructions="""
         You manage combat, using `roll_dice` for attacks and damage. Describe battles vividly and offer 2-3 choices. Example:
@@ -141,10 +212,10 @@ async def start():
         3. Try to flee"
         """,
         model=monster_model,
-        tools=[roll_dice]
+        tools=[agents.function_tool(roll_dice)]
     )
 
-    item_agent = Agent(
+    item_agent = agents.Agent(
         name="ItemAgent",
         instructions="""
         You manage inventory and rewards, using `roll_dice` for loot. Describe items and offer 2-3 choices. Example:
@@ -158,10 +229,10 @@ async def start():
         3. Continue"
         """,
         model=item_model,
-        tools=[roll_dice]
+        tools=[agents.function_tool(roll_dice)]
     )
 
-    gamemaster_agent = Agent(
+    gamemaster_agent = agents.Agent(
         name="GameMasterAgent",
         instructions="""
         You coordinate the adventure, starting with NarratorAgent, handing off to MonsterAgent for combat or ItemAgent for rewards. Welcome players and track game state. Example:
@@ -174,21 +245,92 @@ async def start():
         """,
         model=gamemaster_model,
         handoffs=[
-            handoff(narrator_agent, on_handoff=lambda ctx: on_handoff(narrator_agent, ctx)),
-            handoff(monster_agent, on_handoff=lambda ctx: on_handoff(monster_agent, ctx)),
-            handoff(item_agent, on_handoff=lambda ctx: on_handoff(item_agent, ctx))
+            agents.handoff(narrator_agent, on_handoff=lambda ctx: on_handoff(narrator_agent, ctx)),
+            agents.handoff(monster_agent, on_handoff=lambda ctx: on_handoff(monster_agent, ctx)),
+            agents.handoff(item_agent, on_handoff=lambda ctx: on_handoff(item_agent, ctx))
         ]
     )
 
-    # Initialize game state
-    game_state = get_initial_game_state()
-    cl.user_session.set("agent", gamemaster_agent)
-    cl.user_session.set("config", gamemaster_config)
-    cl.user_session.set("NarratorAgent_config", narrator_config)
-    cl.user_session.set("MonsterAgent_config", monster_config)
-    cl.user_session.set("ItemAgent_config", item_config)
-    cl.user_session.set("game_state", game_state)
-    cl.user_session.set("chat_history", [])
+    return {
+        "agents": {
+            "GameMasterAgent": gamemaster_agent,
+            "NarratorAgent": narrator_agent,
+            "MonsterAgent": monster_agent,
+            "ItemAgent": item_agent,
+        },
+        "configs": {
+            "GameMasterAgent": gamemaster_config,
+            "NarratorAgent": narrator_config,
+            "MonsterAgent": monster_config,
+            "ItemAgent": item_config,
+        },
+    }
+
+
+# Session records live in the shared session store; agents are referenced by name
+session_store.register_type("chat_history", ChatHistory)
+session_store.register_type("game_state", GameState)
+session_store.register_type("dice", dice.DiceRoller)
+
+def new_session_record(key: str) -> Dict:
+    """Fresh game state, history, dice roller and starting agent."""
+    return {
+        "agent": "GameMasterAgent",
+        "game_state": get_initial_game_state(),
+        "chat_history": ChatHistory(),
+        "dice": dice.DiceRoller.for_session(key),
+    }
+
+def update_combat(game_state: GameState, facts: Dict[str, Any], agent_name: str):
+    """Keep in_combat in step with what happened in the turn (ORCHESTRATION=direct).
+
+    A hostile event or a handoff to MonsterAgent starts a fight. A MonsterAgent turn in a fight is
+    one round: it ends the fight when the player's roll beats the enemy's. Which agent the router
+    picked does not start or end anything.
+    """
+    enemy = facts.get("enemy")
+    if enemy is not None:
+        game_state["in_combat"] = True
+        game_state["enemy"] = enemy
+    elif game_state["in_combat"] and agent_name == "MonsterAgent":
+        if "combat_rolls" not in facts:
+            facts["combat_rolls"] = [dice.d(rules.ROLL_SIDES), dice.d(rules.ROLL_SIDES)]
+        player_roll, enemy_roll = facts["combat_rolls"]
+        if player_roll > enemy_roll:
+            game_state["in_combat"] = False
+            game_state["enemy"] = None
+
+def route_turn(action: str, game_state: GameState, history: ChatHistory, current: str) -> str:
+    """Agent to start a turn at with ORCHESTRATION=direct (GameMasterAgent when ambiguous)."""
+    decision = intent.classify(action, game_state, history.last_response(), current)
+    agent_name = decision.agent or "GameMasterAgent"
+    metrics.TURN_ROUTES.inc(method=decision.method if decision.agent else "llm", agent=agent_name)
+    return agent_name
+
+# Turn log (TURN_LOG) for replay and regression runs
+turnlog.configure("main", orchestration=ORCHESTRATION, world=shared_world is not None)
+
+# Warm-up (WARM_START): import the Agents SDK and build the shared agent graph before the first turn
+warmstart.step("agent graph", get_agent_graph)
+warmstart.start()
+
+
+@cl.on_chat_start
+async def start():
+    get_agent_graph()
+
+    # Initialize game state (or resume a saved game); agents and configs are shared
+    store = session_store.get_store()
+    key = session_store.session_key(cl.user_session)
+    cl.user_session.set("session_key", key)
+    record, version = await store.load(key)
+    if record is None:
+        record = new_session_record(key)
+        await store.save(key, record, version)
+    game_state = coerce(record["game_state"])
+    if shared_world is not None:
+        await shared_world.restore(store)
+        shared_world.move_player(key, game_state["location"])
 
     # Welcome message
     await cl.Message(
@@ -204,9 +346,9 @@ async def start():
 - `generate_event`: For story events
 
 🏆 **Character:**
-- **Name:** {game_state['player']['name']}
-- **Health:** {game_state['player']['health']}
-- **Gold:** {game_state['player']['gold']}
+- **Name:** {game_state['name']}
+- **Health:** {game_state['health']}
+- **Gold:** {game_state['gold']}
 - **Location:** {game_state['location']}
 - **Quest:** {game_state['quest']}
 
@@ -217,34 +359,116 @@ async def start():
 @cl.on_message
 async def main(message: cl.Message):
     """Process player input."""
+    turn_started = time.perf_counter()
+    metrics.start_turn()
     msg = cl.Message(content="🎲 Processing your action...")
-    await msg.send()
+    # UI sends run in the background, in order, while the turn works; streaming waits for this one
+    tasks = supervisor.get(cl.user_session.get("id"))
+    sent = tasks.ui(msg.send())
+
+    store = session_store.get_store()
+    key = cl.user_session.get("session_key")
+    scheduler.use_session(key)
+    with metrics.span("session_load"):
+        record, version = await store.load(key)
+    if record is None:
+        record = new_session_record(key)
+
+    history: ChatHistory = record["chat_history"]
+    game_state = record["game_state"] = coerce(record["game_state"])
 
-    agent: Agent = cl.user_session.get("agent")
-    config: RunConfig = cl.user_session.get("config")
-    history: List[Dict] = cl.user_session.get("chat_history") or []
-    game_state: Dict = cl.user_session.get("game_state") or get_initial_game_state()
+    # Pick the starting agent locally when possible; on_handoff swaps the live agent in
+    # cl.user_session if a handoff happens during the run
+    agent_name = record["agent"]
+    if ORCHESTRATION == "direct":
+        agent_name = route_turn(message.content, game_state, history, agent_name)
+        if agent_name not in (record["agent"], "GameMasterAgent"):
+            tasks.ui(cl.Message(content=f"🎮 **{agent_name}** takes over!").send())
+    graph = get_agent_graph()
+    agent: "agents.Agent" = graph["agents"][agent_name]
+    config: "agents.RunConfig" = graph["configs"][agent_name]
+    cl.user_session.set("agent", agent)
+    cl.user_session.set("config", config)
+    roller = record.setdefault("dice", dice.DiceRoller.for_session(key))
+    dice.use(roller)
+
+    before = game_state.snapshot()
+    turn = turnlog.begin(key, message.content, agent_name, before, roller.to_state())
+    facts: Dict[str, Any] = {}
+    _turn_facts.set(facts)
 
-    history.append({"role": "user", "content": f"Action: {message.content}\nState: {json.dumps(game_state)}"})
+    # Travel to a neighboring location of the shared world ("I head into the forest")
+    context = None
+    if shared_world is not None:
+        destination = None if game_state.get("in_combat") else shared_world.graph.route(game_state["location"], message.content)
+        if destination is not None:
+            game_state["location"] = shared_world.graph.locations[destination].name
+        context = shared_world.context(game_state["location"])
 
+    # Compacted history plus a single current state snapshot (and the world around the player)
+    with metrics.span("prompt_build", agent=agent.name):
+        run_input = history.build_input(agent.name, message.content, game_state, context)
     try:
-        result = Runner.run_streamed(
+        model_started = time.perf_counter()
+        ttft = None
+        result = agents.Runner.run_streamed(
             starting_agent=agent,
-            input=history,
+            input=run_input,
             run_config=config
         )
         response_content = ""
         async for event in result.stream_events():
             if event.type == "raw_response_event" and hasattr(event.data, 'delta'):
+                if ttft is None:
+                    ttft = time.perf_counter() - model_started
+                    await sent
                 response_content += event.data.delta
                 await msg.stream_token(event.data.delta)
-        history.append({"role": "assistant", "content": response_content})
-        cl.user_session.set("chat_history", history)
-        cl.user_session.set("game_state", game_state)
+        model_time = time.perf_counter() - model_started
+        metrics.TOKENS.inc(sum(estimate_tokens(m["content"]) for m in run_input), agent=agent.name, direction="in")
+        metrics.TOKENS.inc(estimate_tokens(response_content), agent=agent.name, direction="out")
+        if metrics.sampled():
+            metrics.MODEL_TTFT_SECONDS.observe(model_time if ttft is None else ttft, agent=agent.name)
+            metrics.MODEL_SECONDS.observe(model_time, agent=agent.name)
+        history.add_turn(message.content, response_content)
+        turnlog.note_output(response_content)
+        record["agent"] = cl.user_session.get("agent").name
+        if ORCHESTRATION == "direct":
+            update_combat(game_state, facts, record["agent"])
+        turnlog.note_facts(facts)
+        with metrics.span("session_save"):
+            await store.save(key, record, version)
+        if shared_world is not None and game_state["location"] != before["location"]:
+            shared_world.move_player(key, game_state["location"])
+        metrics.TURNS.inc(agent=agent.name)
+        if metrics.sampled():
+            metrics.TURN_SECONDS.observe(time.perf_counter() - turn_started, agent=agent.name)
+        turnlog.end(turn, record["agent"], game_state.diff(before), time.perf_counter() - turn_started)
+    except session_store.VersionConflict:
+        msg.content = "⚠️ Your game was updated from another window. This turn was not saved; please try again."
+        tasks.ui(msg.update())
+    except scheduler.Overloaded:
+        msg.content = "⏳ The storytellers are busy right now. Please try your action again in a moment."
+        tasks.ui(msg.update())
     except Exception as e:
         print(f"[ERROR] Failed to process: {str(e)}")
         # Fallback to GameMasterAgent
         cl.user_session.set("agent", cl.user_session.get("agent"))  # Reset to current agent
-        cl.user_session.set("config", cl.user_session.get("GameMasterAgent_config", config))
-        msg.content = f"❌ Something went wrong! Let's try again. Type your action or 'start' to continue."
-        await msg.update()
\ No newline at end of file
+        cl.user_session.set("config", config)
+        # Keep any handoff that happened before the failure, but none of the turn's state changes
+        # (e.g. travel to another location)
+        record["agent"] = cl.user_session.get("agent").name
+        record["game_state"] = before
+        try:
+            await store.save(key, record, version)
+        except session_store.VersionConflict:
+            pass
+        msg.content = "❌ Something went wrong! Let's try again. Type your action or 'start' to continue."
+        tasks.ui(msg.update())
+
+@cl.on_chat_end
+async def end():
+    """Flush the session's pending UI sends, cancel what is left and leave the shared world."""
+    if shared_world is not None:
+        shared_world.leave(cl.user_session.get("session_key"))
+    await supervisor.close(cl.user_session.get("id"))
@@ -0,0 +1,333 @@
+"""
+Long-term narrative memory for app.py
+Every played turn is embedded with a signed hashing vectorizer (no model, stable across processes)
+and appended to a per-session index on disk: a raw float32 matrix that is memory-mapped for search,
+plus the texts. Each narrator turn retrieves the top-k past turns most similar to the current one
+into the prompt within a token budget. Indexing and search run in a thread pool, off the event loop;
+numpy is used for scoring when installed, otherwise a stdlib fallback scores column by column
+"""
+
+import asyncio
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import operator
+import os
+import re
+import shutil
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from typing import Dict, Iterable, List, Optional, Tuple
+import metrics
+from compaction import estimate_tokens
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; search falls back to stdlib column scoring
+    np = None
+
+DEFAULT_DIR = ".memory"
+DEFAULT_DIM = 256           # hashed features per vector
+DEFAULT_TOP_K = 3
+DEFAULT_TOKENS = 200        # prompt budget for recalled memories
+DEFAULT_MIN_SCORE = 0.2     # cosine similarity below this is not recalled
+DEFAULT_SKIP_RECENT = 4     # the newest turns are still in the history window
+DEFAULT_OPEN_SESSIONS = 256
+DEFAULT_THREADS = 2
+ENTRY_CHARS = 400           # longest stored memory
+
+STOPWORDS = frozenset(
+    "a an the and or but if then so of to in on at by for with from into onto up down out over under "
+    "is are was were be been being am i you he she it we they me my your his her its our their this that "
+    "these those there here as not no do does did have has had will would can could should just very".split())
+_TOKEN = re.compile(r"[a-z0-9']+")
+
+SECONDS = metrics.histogram("game_memory_seconds", "Narrative memory index and search time, by op",
+                            buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5))
+RECALLED = metrics.counter("game_memory_recalled_total", "Memories placed in prompts, and their tokens (kind=memories/tokens)")
+
+# Feature -> (bucket, sign), per dimension; cleared when it grows past _FEATURE_CACHE
+_features: Dict[Tuple[str, int], Tuple[int, float]] = {}
+_FEATURE_CACHE = 200000
+
+
+def _feature(token: str, dim: int) -> Tuple[int, float]:
+    key = (token, dim)
+    hit = _features.get(key)
+    if hit is None:
+        if len(_features) >= _FEATURE_CACHE:
+            _features.clear()
+        h = zlib.crc32(token.encode())
+        hit = _features[key] = (h % dim, 1.0 if h & 0x80000000 else -1.0)
+    return hit
+
+
+def vectorize(text: str, dim: int = DEFAULT_DIM) -> Dict[int, float]:
+    """Sparse L2-normalized hashed vector of a text's words and word pairs (bucket -> weight)"""
+    words = [word for word in _TOKEN.findall(text.lower()) if word not in STOPWORDS]
+    counts: Dict[str, int] = {}
+    for word in words:
+        counts[word] = counts.get(word, 0) + 1
+    for first, second in zip(words, words[1:]):
+        pair = first + " " + second
+        counts[pair] = counts.get(pair, 0) + 1
+    vector: Dict[int, float] = {}
+    for token, count in counts.items():
+        bucket, sign = _feature(token, dim)
+        vector[bucket] = vector.get(bucket, 0.0) + sign * (1.0 + math.log(count))
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    if norm:
+        for bucket in vector:
+            vector[bucket] /= norm
+    return vector
+
+
+def _dense(vector: Dict[int, float], dim: int) -> array:
+    row = array("f", bytes(4 * dim))
+    for bucket, weight in vector.items():
+        row[bucket] = weight
+    return row
+
+
+class MemoryIndex:
+    """One session's memories: texts, where each ends and a float32 matrix of vectors, appended in step"""
+
+    def __init__(self, directory: str, dim: int = DEFAULT_DIM):
+        self.directory = directory
+        self.dim = dim
+        self.lock = threading.Lock()
+        self.closed = True
+        self._open()
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        meta_path = os.path.join(self.directory, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                if json.load(f).get("dim") != self.dim:
+                    print(f"[WARN] Memory index {self.directory} has another dimension; starting it over")
+                    self._clear_files()
+        with open(meta_path, "w") as f:
+            json.dump({"version": 1, "dim": self.dim}, f)
+        self.texts = open(os.path.join(self.directory, "texts.bin"), "ab+")
+        self.vectors = open(os.path.join(self.directory, "vectors.f32"), "ab+")
+        self.ends_file = open(os.path.join(self.directory, "ends.u64"), "ab+")
+        self.ends = array("Q")
+        self.ends_file.seek(0)
+        data = self.ends_file.read()
+        self.ends.frombytes(data[:len(data) // 8 * 8])
+        # Text ends are written last, so they say how many complete entries there are
+        rows = os.path.getsize(self.vectors.name) // (4 * self.dim)
+        count = min(len(self.ends), rows)
+        del self.ends[count:]
+        self.texts_end = self.ends[-1] if count else 0
+        self.ends_file.truncate(8 * count)
+        self.vectors.truncate(4 * self.dim * count)
+        self.texts.truncate(self.texts_end)
+        self.matrix = None
+        self.mapped = 0
+        self.closed = False
+
+    def _clear_files(self):
+        for name in ("texts.bin", "vectors.f32", "ends.u64"):
+            path = os.path.join(self.directory, name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+    def add(self, texts: Iterable[str]):
+        """Append memories (blocking; run it in a thread)"""
+        texts = list(texts)
+        with self.lock:
+            if self.closed:
+                self._open()
+            encoded = [text[:ENTRY_CHARS].encode() for text in texts]
+            rows = array("f")
+            ends = array("Q")
+            position = self.texts_end
+            for text, data in zip(texts, encoded):
+                rows.extend(_dense(vectorize(text, self.dim), self.dim))
+                position += len(data)
+                ends.append(position)
+            self.texts.write(b"".join(encoded))
+            self.texts.flush()
+            self.vectors.write(rows.tobytes())
+            self.vectors.flush()
+            self.ends_file.write(ends.tobytes())
+            self.ends_file.flush()
+            self.texts_end = position
+            self.ends.extend(ends)
+
+    def _mapped(self, count: int):
+        """The first `count` rows, memory-mapped (remapped when the file has grown)"""
+        if self.matrix is None or self.mapped < count:
+            size = 4 * self.dim * count
+            if np is not None:
+                self.matrix = np.memmap(self.vectors.name, dtype=np.float32, mode="r", shape=(count, self.dim))
+            else:
+                with open(self.vectors.name, "rb") as f:
+                    self.matrix = memoryview(mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)).cast("f")
+            self.mapped = count
+        return self.matrix
+
+    def search(self, query: Dict[int, float], k: int, limit: Optional[int] = None) -> List[Tuple[float, int]]:
+        """(score, index) of the k memories most similar to a query vector, among the first `limit`"""
+        with self.lock:
+            if self.closed:
+                self._open()
+            count = len(self.ends) if limit is None else min(limit, len(self.ends))
+            if count <= 0 or not query or k <= 0:
+                return []
+            matrix = self._mapped(count)
+        if np is not None:
+            scores = matrix[:count] @ _np_dense(query, self.dim)
+            k = min(k, count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            return sorted(((float(scores[i]), int(i)) for i in top), reverse=True)
+        # Only the query's non-zero columns contribute to the dot products
+        scores = [0.0] * count
+        dim = self.dim
+        for bucket, weight in query.items():
+            column = matrix[bucket:count * dim:dim]
+            scores = list(map(operator.add, scores, map(operator.mul, column, repeat(weight))))
+        top = heapq.nlargest(k, range(count), key=scores.__getitem__)
+        return [(scores[i], i) for i in top]
+
+    def read(self, indices: Iterable[int]) -> List[str]:
+        """Texts of the given memories"""
+        with self.lock:
+            if self.closed:
+                self._open()
+            texts = []
+            for i in indices:
+                start = self.ends[i - 1] if i else 0
+                texts.append(os.pread(self.texts.fileno(), self.ends[i] - start, start).decode(errors="replace"))
+            return texts
+
+    def close(self):
+        with self.lock:
+            if not self.closed:
+                self.matrix = None
+                for f in (self.texts, self.vectors, self.ends_file):
+                    f.close()
+                self.closed = True
+
+
+def _np_dense(query: Dict[int, float], dim: int):
+    vector = np.zeros(dim, dtype=np.float32)
+    for bucket, weight in query.items():
+        vector[bucket] = weight
+    return vector
+
+
+class NarrativeMemory:
+    """Per-session memory indexes under one directory; opened on demand and closed least recently used first"""
+
+    def __init__(self, directory: str = DEFAULT_DIR, dim: int = DEFAULT_DIM, top_k: int = DEFAULT_TOP_K,
+                 max_tokens: int = DEFAULT_TOKENS, min_score: float = DEFAULT_MIN_SCORE,
+                 skip_recent: int = DEFAULT_SKIP_RECENT, open_sessions: int = DEFAULT_OPEN_SESSIONS,
+                 threads: int = DEFAULT_THREADS):
+        self.directory = directory
+        self.dim = dim
+        self.top_k = top_k
+        self.max_tokens = max_tokens
+        self.min_score = min_score
+        self.skip_recent = skip_recent
+        self.open_sessions = open_sessions
+        self.indexes: "OrderedDict[str, MemoryIndex]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix="memory")
+
+    def path(self, session: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(session.encode()).hexdigest()[:20])
+
+    def index(self, session: str) -> MemoryIndex:
+        with self.lock:
+            index = self.indexes.get(session)
+            if index is not None:
+                self.indexes.move_to_end(session)
+                return index
+            index = self.indexes[session] = MemoryIndex(self.path(session), self.dim)
+            while len(self.indexes) > self.open_sessions:
+                _, evicted = self.indexes.popitem(last=False)
+                evicted.close()  # reopened if still in use
+            return index
+
+    def add(self, session: str, texts: List[str]):
+        started = time.perf_counter()
+        self.index(session).add(texts)
+        SECONDS.observe(time.perf_counter() - started, op="add")
+
+    def search(self, session: str, query: str, k: Optional[int] = None) -> List[Tuple[float, str]]:
+        """(score, text) of the most similar memories that are older than the history window"""
+        started = time.perf_counter()
+        index = self.index(session)
+        limit = len(index) - self.skip_recent
+        hits = [(score, i) for score, i in index.search(vectorize(query, self.dim), k or self.top_k, limit)
+                if score >= self.min_score]
+        found = list(zip((score for score, _ in hits), index.read(i for _, i in hits)))
+        SECONDS.observe(time.perf_counter() - started, op="search")
+        return found
+
+    async def remember(self, session: str, text: str):
+        """Index a turn in the thread pool"""
+        await asyncio.get_running_loop().run_in_executor(self.pool, self.add, session, [text])
+
+    async def recall(self, session: str, query: str) -> Optional[str]:
+        """Prompt text with the memories most relevant to `query` that fit the token budget, or None"""
+        hits = await asyncio.get_running_loop().run_in_executor(self.pool, self.search, session, query)
+        lines = []
+        used = 0
+        for score, text in hits:
+            line = "- " + " ".join(text.split())
+            used += estimate_tokens(line)
+            if used > self.max_tokens:
+                break
+            lines.append(line)
+        if not lines:
+            return None
+        RECALLED.inc(len(lines), kind="memories")
+        RECALLED.inc(sum(estimate_tokens(line) for line in lines), kind="tokens")
+        return "Earlier in this adventure (for continuity):\n" + "\n".join(lines)
+
+    def _forget(self, session: str):
+        with self.lock:
+            index = self.indexes.pop(session, None)
+        if index is not None:
+            index.close()
+        shutil.rmtree(self.path(session), ignore_errors=True)
+
+    async def forget(self, session: str):
+        """Delete a session's memories (e.g. when the game restarts)"""
+        await asyncio.get_running_loop().run_in_executor(self.pool, self._forget, session)
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        with self.lock:
+            for index in self.indexes.values():
+                index.close()
+            self.indexes.clear()
+
+
+def memory_from_env() -> Optional[NarrativeMemory]:
+    if os.getenv("GAME_MEMORY", "off") != "on":
+        return None
+    return NarrativeMemory(
+        directory=os.getenv("MEMORY_DIR", DEFAULT_DIR),
+        dim=int(os.getenv("MEMORY_DIM", DEFAULT_DIM)),
+        top_k=int(os.getenv("MEMORY_TOP_K", DEFAULT_TOP_K)),
+        max_tokens=int(os.getenv("MEMORY_TOKENS", DEFAULT_TOKENS)),
+        min_score=float(os.getenv("MEMORY_MIN_SCORE", DEFAULT_MIN_SCORE)),
+        skip_recent=int(os.getenv("MEMORY_SKIP_RECENT", DEFAULT_SKIP_RECENT)),
+        open_sessions=int(os.getenv("MEMORY_OPEN_SESSIONS", DEFAULT_OPEN_SESSIONS)),
+        threads=int(os.getenv("MEMORY_THREADS", DEFAULT_THREADS)),
+    )
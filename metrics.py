@@ -0,0 +1,255 @@
+"""
+Low-overhead turn instrumentation
+In-process histograms and counters, exported in Prometheus text format over a local HTTP endpoint
+"""
+
+import contextvars
+import functools
+import inspect
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Tuple
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Fraction of turns whose spans are recorded (counters are always recorded)
+SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", "1.0"))
+
+_sampled = contextvars.ContextVar("metrics_sampled", default=True)
+_lock = threading.Lock()
+REGISTRY: Dict[str, object] = {}
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple:
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _label_text(key: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    __slots__ = ("name", "help", "buckets", "series")
+
+    def __init__(self, name: str, help: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.series: Dict[Tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        row = self.series.get(key)
+        if row is None:
+            with _lock:
+                row = self.series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                row[i] += 1
+                break
+        row[-2] += value
+        row[-1] += 1
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, row in list(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, row):
+                cumulative += count
+                le = _label_text(key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _label_text(key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {row[-1]}")
+            lines.append(f"{self.name}_sum{_label_text(key)} {row[-2]}")
+            lines.append(f"{self.name}_count{_label_text(key)} {row[-1]}")
+        return "\n".join(lines)
+
+    def percentile(self, pct: float, **labels) -> float:
+        """Upper bucket bound containing the given percentile (for reports)"""
+        row = self.series.get(_label_key(labels))
+        if not row or not row[-1]:
+            return 0.0
+        target = row[-1] * pct / 100
+        cumulative = 0
+        for bound, count in zip(self.buckets, row):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+
+class Counter:
+    __slots__ = ("name", "help", "series")
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.series: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        self.series[key] = self.series.get(key, 0) + amount
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in list(self.series.items()):
+            lines.append(f"{self.name}{_label_text(key)} {value}")
+        return "\n".join(lines)
+
+
+class Gauge(Counter):
+    __slots__ = ()
+
+    def set(self, value: float, **labels):
+        self.series[_label_key(labels)] = value
+
+    def render(self) -> str:
+        return super().render().replace(" counter", " gauge", 1)
+
+
+def histogram(name: str, help: str, buckets=DEFAULT_BUCKETS) -> Histogram:
+    with _lock:
+        return REGISTRY.setdefault(name, Histogram(name, help, buckets))
+
+
+def counter(name: str, help: str) -> Counter:
+    with _lock:
+        return REGISTRY.setdefault(name, Counter(name, help))
+
+
+def gauge(name: str, help: str) -> Gauge:
+    with _lock:
+        return REGISTRY.setdefault(name, Gauge(name, help))
+
+
+def render() -> str:
+    with _lock:
+        metrics = list(REGISTRY.values())
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+# Turn-level metrics shared by both entry points
+TURN_SECONDS = histogram("game_turn_seconds", "End-to-end turn time")
+SPAN_SECONDS = histogram("game_span_seconds", "Time spent in each stage of a turn")
+MODEL_TTFT_SECONDS = histogram("game_model_ttft_seconds", "Model time to first token")
+MODEL_SECONDS = histogram("game_model_seconds", "Model call total time")
+TOKENS = counter("game_tokens_total", "Model tokens by direction (in/out)")
+HANDOFFS = counter("game_handoffs_total", "Agent handoffs")
+TURN_ROUTES = counter("game_turn_routes_total", "Turns routed without a handoff, by method (classifier/rules/sticky/llm)")
+TURNS = counter("game_turns_total", "Turns handled")
+
+
+def start_turn() -> bool:
+    """Decide whether this turn's spans are recorded; call at the start of each turn"""
+    sampled = SAMPLE_RATE >= 1.0 or random.random() < SAMPLE_RATE
+    _sampled.set(sampled)
+    return sampled
+
+
+def sampled() -> bool:
+    return _sampled.get()
+
+
+class span:
+    """Time a block into a histogram when the current turn is sampled
+
+        with metrics.span("prompt_build", agent="NarratorAgent"):
+            ...
+    """
+
+    __slots__ = ("labels", "started")
+
+    def __init__(self, stage: str, **labels):
+        labels["stage"] = stage
+        self.labels = labels
+        self.started = None
+
+    def __enter__(self):
+        if _sampled.get():
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.started is not None:
+            SPAN_SECONDS.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+def timed_tool(func):
+    """Record a tool function's execution time as a `tool` span"""
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span("tool", tool=func.__name__):
+                return await func(*args, **kwargs)
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span("tool", tool=func.__name__):
+                return func(*args, **kwargs)
+    return wrapper
+
+
+# Extra endpoints on the metrics server: path -> handler() returning (status, JSON body)
+ROUTES: Dict[str, Callable[[], Tuple[int, bytes]]] = {}
+
+
+def add_route(path: str, handler: Callable[[], Tuple[int, bytes]]):
+    """Serve a JSON endpoint (e.g. a readiness probe) next to /metrics"""
+    ROUTES[path] = handler
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path in ROUTES:
+            status, body = ROUTES[path]()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if path not in ("/metrics", ""):
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+
+
+def serve(port: int, host: str = "127.0.0.1"):
+    """Serve /metrics (and any added routes) from a background thread"""
+    global _server
+    if _server is not None:
+        return _server
+    try:
+        _server = ThreadingHTTPServer((host, port), _Handler)
+    except OSError as e:
+        print(f"[WARN] Metrics endpoint not started on port {port}: {e}")
+        return None
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    return _server
+
+
+def serve_from_env():
+    """Start the endpoint when METRICS_PORT is set"""
+    port = os.getenv("METRICS_PORT")
+    if port:
+        serve(int(port), os.getenv("METRICS_HOST", "127.0.0.1"))
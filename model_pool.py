@@ -0,0 +1,173 @@
+"""
+Process-wide model client pool
+One AsyncOpenAI client per endpoint and one model object per model name, shared by every chat session
+Model calls go through the shared scheduler, which owns rate limiting and retries,
+and are measured for prompt-prefix reuse and provider-reported cached tokens;
+routed models pick a model tier per call (see router.py)
+"""
+
+import asyncio
+import os
+import time
+import httpx
+from typing import Dict, Optional, Tuple
+from agents import AsyncOpenAI, Model, OpenAIChatCompletionsModel
+import prompts
+import router
+import scheduler
+
+# Connection pool defaults (override with environment variables, read on first use
+# so values from .env are picked up)
+DEFAULT_POOL_SETTINGS = {
+    "MODEL_POOL_MAX_CONNECTIONS": "100",
+    "MODEL_POOL_MAX_KEEPALIVE": "20",
+    "MODEL_POOL_KEEPALIVE_EXPIRY": "30",
+    "MODEL_POOL_TIMEOUT": "60",
+    "OPENROUTER_BASE_URL": "https://openrouter.ai/api/v1",
+}
+
+_clients: Dict[str, AsyncOpenAI] = {}
+_models: Dict[Tuple[Optional[str], str], Model] = {}
+_END = object()
+
+
+def _prompt_messages(args: tuple, kwargs: dict) -> list:
+    """The system instructions and input of a Model call, as a message list"""
+    instructions = kwargs["system_instructions"] if "system_instructions" in kwargs else (args[0] if args else None)
+    items = kwargs["input"] if "input" in kwargs else (args[1] if len(args) > 1 else "")
+    messages = [{"role": "system", "content": instructions}] if instructions else []
+    if isinstance(items, str):
+        messages.append({"role": "user", "content": items})
+    else:
+        messages.extend(items)
+    return messages
+
+
+class ScheduledModel(Model):
+    """Wraps a model so the Runner's calls wait for a scheduler slot"""
+
+    def __init__(self, model: Model, lane: str):
+        self.model = model
+        self.lane = lane
+
+    async def get_response(self, *args, **kwargs):
+        prompts.observe(self.lane, _prompt_messages(args, kwargs))
+        response = await scheduler.get_scheduler().call(self.lane, self.model.get_response, *args, **kwargs)
+        prompts.record_usage(self.lane, getattr(response, "usage", None))
+        return response
+
+    async def stream_response(self, *args, **kwargs):
+        prompts.observe(self.lane, _prompt_messages(args, kwargs))
+        events = scheduler.get_scheduler().stream(self.lane, lambda: self.model.stream_response(*args, **kwargs))
+        async for event in events:
+            if getattr(event, "type", None) == "response.completed":
+                prompts.record_usage(self.lane, getattr(event.response, "usage", None))
+            yield event
+
+
+def get_client(base_url: Optional[str] = None, api_key: Optional[str] = None) -> AsyncOpenAI:
+    """Return the shared AsyncOpenAI client for an endpoint (OpenRouter by default), creating it on first use"""
+    settings = {key: os.getenv(key, default) for key, default in DEFAULT_POOL_SETTINGS.items()}
+    base_url = base_url or settings["OPENROUTER_BASE_URL"]
+    client = _clients.get(base_url)
+    if client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=int(settings["MODEL_POOL_MAX_CONNECTIONS"]),
+                max_keepalive_connections=int(settings["MODEL_POOL_MAX_KEEPALIVE"]),
+                keepalive_expiry=float(settings["MODEL_POOL_KEEPALIVE_EXPIRY"]),
+            ),
+            timeout=float(settings["MODEL_POOL_TIMEOUT"]),
+        )
+        client = _clients[base_url] = AsyncOpenAI(
+            api_key=api_key or os.getenv("OPENROUTER_API_KEY"),
+            base_url=base_url,
+            http_client=http_client,
+            max_retries=0,  # Retries are handled by the scheduler
+        )
+    return client
+
+
+def get_model(name: str, base_url: Optional[str] = None, api_key: Optional[str] = None) -> Model:
+    """Return the shared (scheduled) model object for a model name (on OpenRouter unless base_url is given)"""
+    model = _models.get((base_url, name))
+    if model is None:
+        lane = f"openrouter/{name}" if base_url is None else name
+        model = ScheduledModel(OpenAIChatCompletionsModel(model=name, openai_client=get_client(base_url, api_key)), lane)
+        _models[base_url, name] = model
+    return model
+
+
+class RoutedModel(Model):
+    """An agent's model when MODEL_ROUTER=on: each call goes to the router's tier for the agent and
+    the current kind of call, falling back to the next tier on an error or SLO breach (for streams,
+    only until the first event arrives)"""
+
+    def __init__(self, agent: str, quality: float):
+        self.agent = agent
+        self.quality = quality
+
+    def _route(self, args: tuple, kwargs: dict) -> list:
+        last = _prompt_messages(args, kwargs)[-1:]
+        content = last[0].get("content") if last and isinstance(last[0], dict) else None
+        prompt_chars = len(content) if isinstance(content, str) else 0
+        return router.get_router().route(self.agent, router.current_kind(), prompt_chars, self.quality)
+
+    async def get_response(self, *args, **kwargs):
+        routing = router.get_router()
+
+        async def attempt(tier: router.Tier, timeout: Optional[float]):
+            started = time.perf_counter()
+            try:
+                model = get_model(tier.model, tier.api_base, tier.api_key)
+                response = await asyncio.wait_for(model.get_response(*args, **kwargs), timeout)
+            except Exception:
+                routing.record(tier, time.perf_counter() - started, ok=False)
+                raise
+            usage = getattr(response, "usage", None)
+            routing.record(tier, time.perf_counter() - started,
+                           getattr(usage, "input_tokens", 0), getattr(usage, "output_tokens", 0))
+            return response
+
+        return await routing.call(self._route(args, kwargs), attempt)
+
+    async def stream_response(self, *args, **kwargs):
+        routing = router.get_router()
+
+        async def attempt(tier: router.Tier, timeout: Optional[float]):
+            started = time.perf_counter()
+            events = get_model(tier.model, tier.api_base, tier.api_key).stream_response(*args, **kwargs)
+            try:
+                first = await asyncio.wait_for(anext(events, _END), timeout)
+            except asyncio.TimeoutError:
+                routing.record(tier, time.perf_counter() - started, ok=False)
+                raise router.SLOBreach(f"no output within {timeout}s")
+            except Exception:
+                routing.record(tier, time.perf_counter() - started, ok=False)
+                raise
+            return tier, started, first, events
+
+        tier, started, first, events = await routing.call(self._route(args, kwargs), attempt)
+        if first is _END:
+            routing.record(tier, time.perf_counter() - started)
+            return
+        usage = None
+        try:
+            yield first
+            async for event in events:
+                if getattr(event, "type", None) == "response.completed":
+                    usage = getattr(event.response, "usage", None)
+                yield event
+        except Exception:
+            routing.record(tier, time.perf_counter() - started, ok=False)
+            raise
+        routing.record(tier, time.perf_counter() - started,
+                       getattr(usage, "input_tokens", 0), getattr(usage, "output_tokens", 0))
+
+
+async def close():
+    """Close pooled connections (call on worker shutdown)"""
+    for client in _clients.values():
+        await client.close()
+    _clients.clear()
+    _models.clear()
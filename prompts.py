@@ -0,0 +1,156 @@
+"""
+Prompt assembly for prefix caching
+Every prompt is laid out as static instructions, then stable world context, then history, then the
+volatile turn state last, so consecutive calls share a byte-identical prefix that provider prompt
+caches (and a self-hosted model's KV cache) can reuse; calls are measured against earlier prefixes
+"""
+
+import json
+import os
+import textwrap
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, List, Optional
+import metrics
+from compaction import estimate_tokens
+
+# Distinct message prefixes remembered per model when measuring reuse
+PREFIX_MEMORY = int(os.getenv("PROMPT_PREFIX_MEMORY", "100000"))
+
+PROMPT_TOKENS = metrics.counter("game_prompt_tokens_total", "Prompt tokens sent, in an already-sent prefix, "
+                                "and reported cached by the provider (kind=total/prefix/cached)")
+PREFIX_SHARE = metrics.histogram("game_prompt_prefix_share", "Share of each prompt repeating an earlier prefix",
+                                 buckets=(0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 1.0))
+
+
+def canonical(text: str) -> str:
+    """Instruction text with source indentation and trailing spaces removed (stable bytes)"""
+    return "\n".join(line.rstrip() for line in textwrap.dedent(text).strip().splitlines())
+
+
+def assemble(instructions: str, context: Optional[str], history: Iterable[Dict[str, str]],
+             turn: str, memory: Optional[str] = None) -> List[Dict[str, str]]:
+    """Messages in cache-friendly order: instructions, world context, history, then recalled memories
+    (which change every turn) and the turn"""
+    messages = []
+    if instructions:
+        messages.append({"role": "system", "content": instructions})
+    if context:
+        messages.append({"role": "system", "content": context})
+    messages.extend(history)
+    if memory:
+        messages.append({"role": "system", "content": memory})
+    messages.append({"role": "user", "content": turn})
+    return messages
+
+
+def _content(message) -> str:
+    if isinstance(message, dict):
+        content = message.get("content")
+        if isinstance(content, str) and len(message) == 2 and "role" in message:
+            return content
+        return json.dumps(message, sort_keys=True, default=str)
+    return str(message)
+
+
+class PrefixTracker:
+    """Remembers message prefixes sent to one model and measures how much of a prompt repeats one"""
+
+    def __init__(self, capacity: int = PREFIX_MEMORY):
+        self.capacity = capacity
+        self.seen = OrderedDict()  # cumulative prefix hash -> None, least recent first
+
+    def observe(self, messages: List[Any]) -> tuple:
+        """(prefix tokens already sent, total tokens) for this prompt; the prompt is then remembered"""
+        seen = self.seen
+        prefix = 0
+        total = 0
+        matching = True
+        key = 0
+        for message in messages:
+            content = _content(message)
+            role = message.get("role") if isinstance(message, dict) else None
+            key = hash((key, role, content))
+            total += estimate_tokens(content)
+            if matching and key in seen:
+                seen.move_to_end(key)
+                prefix = total
+            else:
+                matching = False
+                seen[key] = None
+        while len(seen) > self.capacity:
+            seen.popitem(last=False)
+        return prefix, total
+
+
+_trackers: Dict[str, PrefixTracker] = {}
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def observe(model: str, messages: List[Any]) -> int:
+    """Record a prompt about to be sent to a model; returns its cache-friendly prefix in tokens"""
+    tracker = _trackers.get(model)
+    if tracker is None:
+        tracker = _trackers[model] = PrefixTracker()
+    prefix, total = tracker.observe(messages)
+    stats = _stats.setdefault(model, {"calls": 0, "prompt_tokens": 0, "prefix_tokens": 0,
+                                      "reported_prompt_tokens": 0, "cached_tokens": 0})
+    stats["calls"] += 1
+    stats["prompt_tokens"] += total
+    stats["prefix_tokens"] += prefix
+    PROMPT_TOKENS.inc(total, model=model, kind="total")
+    PROMPT_TOKENS.inc(prefix, model=model, kind="prefix")
+    if total and metrics.sampled():
+        PREFIX_SHARE.observe(prefix / total, model=model)
+    return prefix
+
+
+def _field(value, name: str):
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        return value.get(name)
+    return getattr(value, name, None)
+
+
+def cached_tokens(usage) -> tuple:
+    """(prompt tokens, cached prompt tokens) from a provider usage object or dict, when reported
+
+    Understands chat-completions usage (prompt_tokens_details.cached_tokens), Responses/Agents
+    usage (input_tokens_details.cached_tokens) and Anthropic-style cache_read_input_tokens.
+    """
+    prompt = _field(usage, "prompt_tokens") or _field(usage, "input_tokens") or 0
+    cached = (_field(_field(usage, "prompt_tokens_details"), "cached_tokens")
+              or _field(_field(usage, "input_tokens_details"), "cached_tokens")
+              or _field(usage, "cache_read_input_tokens") or 0)
+    return prompt, cached
+
+
+def record_usage(model: str, usage):
+    """Record the provider-reported cached tokens for one call (usage may be None)"""
+    if usage is None:
+        return
+    prompt, cached = cached_tokens(usage)
+    stats = _stats.get(model)
+    if stats is not None:
+        stats["reported_prompt_tokens"] += prompt
+        stats["cached_tokens"] += cached
+    if cached:
+        PROMPT_TOKENS.inc(cached, model=model, kind="cached")
+
+
+def report() -> Dict[str, Dict[str, Any]]:
+    """Per model: calls, estimated prompt and reusable-prefix tokens, and provider-reported cache hits"""
+    result = {}
+    for model, stats in _stats.items():
+        result[model] = {
+            **stats,
+            "prefix_share": stats["prefix_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0,
+            "cached_share": (stats["cached_tokens"] / stats["reported_prompt_tokens"]
+                             if stats["reported_prompt_tokens"] else 0.0),
+        }
+    return result
+
+
+def reset():
+    _trackers.clear()
+    _stats.clear()
@@ -0,0 +1,286 @@
+"""
+Response cache for model completions
+Exact and near-match lookups keyed on agent, normalized prompt and quantized game state, plus the
+numbers in the player's action and the scene the story follows (last story, injected context)
+"""
+
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+# Numeric state fields are bucketed so nearby values share a cache entry
+STATE_BUCKETS = {"health": 20}
+
+# Cache hits recorded before the SQLite backend writes their access times
+TOUCH_BATCH = 64
+
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase, collapse whitespace and mask numbers (rolls and state values are keyed separately)"""
+    return _SPACES.sub(" ", _DIGITS.sub("#", prompt.lower())).strip()
+
+
+def action_numbers(action: str) -> str:
+    """The numbers in a player's action ("2", "take path 2"); each picks a different outcome, so they are never masked"""
+    return " ".join(_DIGITS.findall(action))
+
+
+def quantize_state(state: Dict[str, Any]) -> str:
+    """Stable string form of the state fields that matter for the response"""
+    parts = []
+    for key in sorted(state):
+        value = state[key]
+        if isinstance(value, bool) or value is None:
+            pass
+        elif isinstance(value, int):
+            bucket = STATE_BUCKETS.get(key)
+            if bucket:
+                value = value // bucket * bucket
+        elif not isinstance(value, str) and hasattr(value, "__iter__"):
+            value = sorted(str(v).lower() for v in value)
+        parts.append(f"{key}={value}")
+    return "|".join(parts)
+
+
+def trigrams(text: str) -> frozenset:
+    return frozenset(text[i:i + 3] for i in range(len(text) - 2))
+
+
+def similarity(a: frozenset, b: frozenset) -> float:
+    """Jaccard similarity of two trigram sets"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class MemoryBackend:
+    """In-process LRU store"""
+
+    def __init__(self):
+        self.entries = OrderedDict()  # key -> entry dict
+        self.buckets: Dict[str, Dict[str, Dict]] = {}  # bucket -> key -> entry
+
+    def get(self, key: str) -> Optional[Dict]:
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: Dict):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        self.buckets.setdefault(entry["bucket"], {})[key] = entry
+
+    def delete(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            members = self.buckets[entry["bucket"]]
+            del members[key]
+            if not members:
+                del self.buckets[entry["bucket"]]
+
+    def oldest(self) -> Optional[str]:
+        return next(iter(self.entries), None)
+
+    def bucket(self, bucket: str) -> List[Dict]:
+        return list(self.buckets.get(bucket, {}).values())
+
+    def values(self) -> List[Dict]:
+        return list(self.entries.values())
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SqliteBackend:
+    """On-disk store that survives restarts (LRU order kept in an access column)
+
+    Hits only note their access time; the times are written with the next put or
+    once TOUCH_BATCH have piled up, so a hit does not commit.
+    """
+
+    def __init__(self, path: str):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                bucket TEXT,
+                entry TEXT,
+                accessed REAL
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_bucket ON responses (bucket)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self.db.commit()
+        self.touched: Dict[str, float] = {}  # key -> access time not yet written
+
+    def _write_touched(self):
+        if self.touched:
+            self.db.executemany("UPDATE responses SET accessed = ? WHERE key = ?",
+                                [(accessed, key) for key, accessed in self.touched.items()])
+            self.touched = {}
+
+    def get(self, key: str) -> Optional[Dict]:
+        row = self.db.execute("SELECT entry FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.touched[key] = time.time()
+        if len(self.touched) >= TOUCH_BATCH:
+            self._write_touched()
+            self.db.commit()
+        return json.loads(row[0])
+
+    def put(self, key: str, entry: Dict):
+        self.touched.pop(key, None)
+        self._write_touched()
+        self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                        (key, entry["bucket"], json.dumps(entry), time.time()))
+        self.db.commit()
+
+    def delete(self, key: str):
+        self.touched.pop(key, None)
+        self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self.db.commit()
+
+    def oldest(self) -> Optional[str]:
+        if self.touched:
+            self._write_touched()
+            self.db.commit()
+        row = self.db.execute("SELECT key FROM responses ORDER BY accessed LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def bucket(self, bucket: str) -> List[Dict]:
+        rows = self.db.execute("SELECT entry FROM responses WHERE bucket = ?", (bucket,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def values(self) -> List[Dict]:
+        return [json.loads(row[0]) for row in self.db.execute("SELECT entry FROM responses").fetchall()]
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+class ResponseCache:
+    """Cache of model responses with LRU/TTL eviction and a byte cap
+
+    variety: chance (0-1) of skipping a hit to collect another variant, so repeated
+    situations don't always get the same story. Up to max_variants are kept per key.
+    """
+
+    def __init__(self, backend=None, max_bytes: int = 16 * 1024 * 1024, ttl: float = 24 * 3600,
+                 similarity_threshold: float = 0.0, variety: float = 0.2, max_variants: int = 4):
+        self.backend = backend if backend is not None else MemoryBackend()  # an empty backend is falsy
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.variety = variety
+        self.max_variants = max_variants
+        self.size = sum(entry["size"] for entry in self.backend.values())
+        self.stats = {"hits": 0, "similar_hits": 0, "misses": 0, "skipped_for_variety": 0,
+                      "evictions": 0, "latency_saved": 0.0, "miss_latency": 0.0}
+
+    @staticmethod
+    def _keys(agent: str, prompt: str, state: Dict[str, Any], action: str, scene: str) -> tuple:
+        # Near matches are only looked for within a bucket, so the action's numbers and the scene go in it
+        bucket = hashlib.blake2b(f"{agent}\0{quantize_state(state)}\0{action_numbers(action)}\0{scene}".encode(),
+                                 digest_size=12).hexdigest()
+        text = normalize_prompt(prompt)
+        key = hashlib.blake2b(f"{bucket}\0{text}".encode(), digest_size=16).hexdigest()
+        return bucket, key, text
+
+    def _expired(self, entry: Dict) -> bool:
+        return self.ttl and time.time() - entry["created"] > self.ttl
+
+    def _average_miss_latency(self) -> float:
+        misses = self.stats["misses"]
+        return self.stats["miss_latency"] / misses if misses else 0.0
+
+    def get(self, agent: str, prompt: str, state: Dict[str, Any], action: str = "", scene: str = "") -> Optional[str]:
+        """Return a cached response or None
+
+        action is the player's input; scene is what the response must follow (e.g. the last story and
+        the context injected into the prompt). Both are part of the key.
+        """
+        bucket, key, text = self._keys(agent, prompt, state, action, scene)
+        entry = self.backend.get(key)
+        if entry is not None and self._expired(entry):
+            self._remove(key, entry)
+            entry = None
+
+        if entry is None and self.similarity_threshold:
+            grams = trigrams(text)
+            best = 0.0
+            for candidate in self.backend.bucket(bucket):
+                score = similarity(grams, trigrams(candidate["text"]))
+                if score >= self.similarity_threshold and score > best and not self._expired(candidate):
+                    best, entry = score, candidate
+            if entry is not None:
+                self.stats["similar_hits"] += 1
+
+        if entry is None:
+            return None
+        if len(entry["variants"]) < self.max_variants and random.random() < self.variety:
+            self.stats["skipped_for_variety"] += 1
+            return None
+
+        self.stats["hits"] += 1
+        self.stats["latency_saved"] += self._average_miss_latency()
+        return random.choice(entry["variants"])
+
+    def put(self, agent: str, prompt: str, state: Dict[str, Any], response: str, latency: float = 0.0,
+            action: str = "", scene: str = ""):
+        """Store a fresh response (as a new variant if the key already exists)"""
+        self.stats["misses"] += 1
+        self.stats["miss_latency"] += latency
+        bucket, key, text = self._keys(agent, prompt, state, action, scene)
+
+        entry = self.backend.get(key)
+        if entry is None or self._expired(entry):
+            if entry is not None:
+                self._remove(key, entry)
+            entry = {"bucket": bucket, "text": text, "variants": [], "size": 0, "created": time.time()}
+        old_size = entry["size"]
+        if response not in entry["variants"]:
+            entry["variants"] = (entry["variants"] + [response])[-self.max_variants:]
+        entry["size"] = len(text.encode()) + sum(len(v.encode()) for v in entry["variants"])
+        self.backend.put(key, entry)
+        self.size += entry["size"] - old_size
+
+        while self.size > self.max_bytes and len(self.backend):
+            oldest = self.backend.oldest()
+            self._remove(oldest, self.backend.get(oldest))
+            self.stats["evictions"] += 1
+
+    def _remove(self, key: str, entry: Optional[Dict]):
+        if entry is not None:
+            self.size -= entry["size"]
+        self.backend.delete(key)
+
+    def report(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "entries": len(self.backend), "bytes": self.size,
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0}
+
+
+def cache_from_env() -> Optional[ResponseCache]:
+    """Build the cache configured by RESPONSE_CACHE* environment variables"""
+    mode = os.getenv("RESPONSE_CACHE", "memory")
+    if mode == "off":
+        return None
+    backend = SqliteBackend(os.getenv("RESPONSE_CACHE_PATH", ".response_cache.db")) if mode == "disk" else None
+    return ResponseCache(
+        backend=backend,
+        max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+        ttl=float(os.getenv("RESPONSE_CACHE_TTL", str(24 * 3600))),
+        similarity_threshold=float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0")),
+        variety=float(os.getenv("RESPONSE_CACHE_VARIETY", "0.2")),
+    )
@@ -0,0 +1,205 @@
+"""
+Model routing tiers
+Each call is scored for the quality it needs (agent baseline, kind of turn, prompt size) and sent
+to the cheapest healthy tier that meets it; tiers that breach their latency SLO or fail are
+skipped for a cooldown and calls fall back to the next tier
+"""
+
+import asyncio
+import contextvars
+import os
+import time
+from collections import deque
+from typing import Dict, Any, Awaitable, Callable, List, Optional
+import metrics
+
+# MODEL_ROUTER=on routes calls through the registered tiers; otherwise each agent keeps its own model
+ENABLED = os.getenv("MODEL_ROUTER", "off") == "on"
+# A tier with this many SLO breaches or errors within the window is skipped for the cooldown
+BREACH_LIMIT = int(os.getenv("ROUTER_BREACH_LIMIT", "3"))
+BREACH_WINDOW = float(os.getenv("ROUTER_BREACH_WINDOW", "60"))
+COOLDOWN = float(os.getenv("ROUTER_COOLDOWN", "30"))
+
+# Required quality adjustments by kind of call
+#   recap       - mechanical turn narration whose outcome the rules already decided
+#   flavor      - optional background flavor text
+#   speculation - pre-generated continuation of an offered choice
+#   turn        - a normal story turn
+#   custom      - a player's freeform `prompt:` request
+KIND_QUALITY = {"recap": -0.3, "flavor": -0.3, "speculation": 0.0, "turn": 0.0, "custom": 0.3}
+# Long freeform prompts need up to this much more quality (reached at LONG_PROMPT_CHARS)
+LONG_PROMPT_BONUS = 0.2
+LONG_PROMPT_CHARS = 2000
+
+ROUTED = metrics.counter("game_router_calls_total", "Routed model calls by tier and outcome")
+TIER_SECONDS = metrics.histogram("game_router_tier_seconds", "Model call time by tier")
+TIER_COST = metrics.counter("game_router_cost_usd_total", "Estimated model cost by tier (USD)")
+
+# Kind of the current call when it can't be passed explicitly (main.py's Runner)
+_kind = contextvars.ContextVar("router_kind", default="turn")
+
+
+class SLOBreach(Exception):
+    """A tier did not answer (or start streaming) within its latency SLO"""
+
+
+class Tier:
+    """One model endpoint: quality in 0..1, price per million tokens, latency SLO in seconds"""
+
+    __slots__ = ("name", "model", "api_base", "api_key", "quality", "cost_in", "cost_out", "slo",
+                 "breaches", "degraded_until", "calls", "errors", "seconds", "cost")
+
+    def __init__(self, name: str, model: str, quality: float, cost_in: float = 0.0, cost_out: float = 0.0,
+                 slo: float = 10.0, api_base: Optional[str] = None, api_key: Optional[str] = None):
+        self.name = name
+        self.model = model
+        self.api_base = api_base
+        self.api_key = api_key
+        self.quality = quality
+        self.cost_in = cost_in
+        self.cost_out = cost_out
+        self.slo = slo
+        self.breaches = deque()
+        self.degraded_until = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.cost = 0.0
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.degraded_until
+
+
+class Router:
+    """Cheapest-sufficient-tier routing with SLO-driven fallback"""
+
+    def __init__(self):
+        self.tiers: List[Tier] = []  # cheapest first
+        self.agent_quality: Dict[str, float] = {}
+
+    def add_tier(self, tier: Tier) -> Tier:
+        self.tiers = sorted([t for t in self.tiers if t.name != tier.name] + [tier],
+                            key=lambda t: (t.cost_in + t.cost_out, -t.quality))
+        return tier
+
+    def set_quality(self, agent: str, quality: float):
+        """Baseline quality an agent's normal turns need"""
+        self.agent_quality[agent] = quality
+
+    def required_quality(self, agent: str, kind: str, prompt_chars: int = 0, base: Optional[float] = None) -> float:
+        quality = (self.agent_quality.get(agent, 0.5) if base is None else base) + KIND_QUALITY.get(kind, 0.0)
+        if kind == "custom":
+            quality += LONG_PROMPT_BONUS * min(1.0, prompt_chars / LONG_PROMPT_CHARS)
+        return min(1.0, max(0.0, quality))
+
+    def route(self, agent: str, kind: str = "turn", prompt_chars: int = 0, base: Optional[float] = None) -> List[Tier]:
+        """Tiers to try in order: healthy tiers good enough (cheapest first), then degraded ones,
+        then weaker tiers as a last resort"""
+        required = self.required_quality(agent, kind, prompt_chars, base)
+        now = time.monotonic()
+        good, degraded, weaker = [], [], []
+        for tier in self.tiers:
+            if tier.quality < required:
+                weaker.append(tier)
+            elif tier.healthy(now):
+                good.append(tier)
+            else:
+                degraded.append(tier)
+        weaker.reverse()  # strongest of the weaker tiers first
+        return good + degraded + weaker
+
+    def record(self, tier: Tier, seconds: float, tokens_in: int = 0, tokens_out: int = 0, ok: bool = True):
+        """Account one call; a failure or SLO breach counts towards degrading the tier"""
+        tier.calls += 1
+        tier.seconds += seconds
+        cost = (tokens_in * tier.cost_in + tokens_out * tier.cost_out) / 1e6
+        tier.cost += cost
+        if cost:
+            TIER_COST.inc(cost, tier=tier.name)
+        if metrics.sampled():
+            TIER_SECONDS.observe(seconds, tier=tier.name)
+        breached = not ok or seconds > tier.slo
+        ROUTED.inc(tier=tier.name, outcome="ok" if not breached else ("slo_breach" if ok else "error"))
+        if not ok:
+            tier.errors += 1
+        if breached:
+            now = time.monotonic()
+            tier.breaches.append(now)
+            while tier.breaches and now - tier.breaches[0] > BREACH_WINDOW:
+                tier.breaches.popleft()
+            if len(tier.breaches) >= BREACH_LIMIT:
+                tier.degraded_until = now + COOLDOWN
+                tier.breaches.clear()
+                print(f"[WARN] Model tier {tier.name} degraded for {COOLDOWN:.0f}s (SLO {tier.slo}s breached)")
+
+    async def call(self, tiers: List[Tier], attempt: Callable[[Tier, Optional[float]], Awaitable[Any]],
+                   retryable: Callable[[], bool] = lambda: True) -> Any:
+        """Run attempt(tier, timeout) on each tier in turn until one succeeds
+
+        timeout is the tier's SLO (None for the last tier, which gets as long as it needs);
+        attempts should raise SLOBreach (or asyncio.TimeoutError) when it is exceeded.
+        retryable() returning False (e.g. output already shown) stops the fallback.
+        """
+        for index, tier in enumerate(tiers):
+            last = index == len(tiers) - 1
+            try:
+                return await attempt(tier, None if last else tier.slo)
+            except asyncio.CancelledError:
+                raise
+            except (SLOBreach, asyncio.TimeoutError) as e:
+                reason = "slo"
+                error = e
+            except Exception as e:
+                reason = "error"
+                error = e
+            if last or not retryable():
+                raise error
+            ROUTED.inc(tier=tier.name, outcome=f"fallback_{reason}")
+            print(f"[WARN] Model tier {tier.name} failed ({reason}: {error!r}); falling back to {tiers[index + 1].name}")
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        return {
+            tier.name: {
+                "model": tier.model,
+                "calls": tier.calls,
+                "errors": tier.errors,
+                "avg_seconds": tier.seconds / tier.calls if tier.calls else 0.0,
+                "p95_seconds": TIER_SECONDS.percentile(95, tier=tier.name),
+                "cost_usd": tier.cost,
+                "healthy": tier.healthy(now),
+            }
+            for tier in self.tiers
+        }
+
+
+def use_kind(kind: str):
+    """Set the kind of model call for the current turn (read by routed models)"""
+    _kind.set(kind)
+
+
+def current_kind() -> str:
+    return _kind.get()
+
+
+_router: Optional[Router] = None
+
+
+def get_router() -> Router:
+    """The process-wide router"""
+    global _router
+    if _router is None:
+        _router = Router()
+    return _router
+
+
+def local_tier_from_env(prefix: str = "", quality: float = 0.3, slo: float = 2.0) -> Optional[Tier]:
+    """Tier for a local OpenAI-compatible model server, if LOCAL_MODEL_URL is set
+
+    LOCAL_MODEL_NAME names the model (prefix e.g. "openai/" for LiteLLM), LOCAL_MODEL_KEY its API key.
+    """
+    url = os.getenv("LOCAL_MODEL_URL")
+    if not url:
+        return None
+    return Tier("local", prefix + os.getenv("LOCAL_MODEL_NAME", "local"), quality, 0.0, 0.0,
+                float(os.getenv("LOCAL_MODEL_SLO", slo)), api_base=url, api_key=os.getenv("LOCAL_MODEL_KEY", "local"))
@@ -0,0 +1,114 @@
+"""
+Deterministic game rules for app.py
+Pure mechanics resolved locally, with a templated narration pool so no model call is needed
+"""
+
+from typing import Dict, Any, Optional
+import dice
+import state
+
+MAX_HEALTH = 100
+ROLL_SIDES = 20       # combat and item rolls are one die of this size
+COMBAT_DAMAGE = 20
+ITEM_HEAL = 30
+ITEM_HEAL_ROLL = 15   # item_roll above this heals
+GREAT_ITEM_ROLL = 10  # item_roll above this is a great item
+
+# Narrator events, built once into an alias table
+EVENTS = [
+    {"type": "monster", "name": "goblin", "description": "A goblin attacks!"},
+    {"type": "monster", "name": "orc", "description": "An orc warrior appears!"},
+    {"type": "treasure", "item": "magic ring", "description": "You find a treasure chest!"},
+    {"type": "treasure", "item": "healing potion", "description": "You discover a hidden cache!"},
+    {"type": "story", "description": "You meet a wise old wizard"},
+    {"type": "story", "description": "You come across a mysterious merchant"}
+]
+EVENT_TABLE = dice.AliasTable(EVENTS)
+
+# Templated narration pool, picked with the session's dice for variety (so replays tell the same story)
+NARRATION = {
+    "combat_win": [
+        "You sidestep the {enemy}'s clumsy swing and strike true. It crumples to the ground!",
+        "Your blade flashes and the {enemy} staggers back, then flees into the shadows.",
+        "With a fierce cry you drive the {enemy} back until it falls, defeated.",
+        "The {enemy} lunges, but you are faster. One clean blow ends the fight.",
+    ],
+    "combat_hit": [
+        "The {enemy} slips past your guard and lands a painful blow.",
+        "You swing wide and the {enemy} punishes the mistake with a vicious strike.",
+        "The {enemy} roars and slams into you, knocking the wind from your lungs.",
+        "Steel rings on steel, but the {enemy} finds an opening and wounds you.",
+    ],
+    "item_great": [
+        "Your fingers close around something remarkable, humming with old magic.",
+        "Beneath the dust lies a finely made treasure, far better than you hoped.",
+        "It gleams in the light, clearly the work of a master craftsman.",
+    ],
+    "item_plain": [
+        "It is worn and simple, but it might still come in handy.",
+        "You turn the find over in your hands. Ordinary, yet useful enough.",
+        "Not much to look at, but you tuck it away all the same.",
+    ],
+}
+
+
+def narrate(key: str, roller: Optional[dice.DiceRoller] = None, **fields) -> str:
+    """Pick a narration line from the pool with the session's dice and fill in its fields"""
+    lines = NARRATION[key]
+    return lines[dice.d(len(lines), roller) - 1].format(**fields)
+
+
+def apply_event(game_state: Dict[str, Any], event: Dict[str, Any]) -> str:
+    """Apply a narrator event to the game state and return the next agent"""
+    if event["type"] == "monster":
+        game_state["in_combat"] = True
+        game_state["enemy"] = event["name"]
+        return "MonsterAgent"
+    elif event["type"] == "treasure":
+        state.add_item(game_state, event["item"])
+        return "ItemAgent"
+    return "NarratorAgent"
+
+
+def resolve_combat(game_state: Dict[str, Any], player_roll: int, enemy_roll: int) -> Dict[str, Any]:
+    """Resolve one round of combat from two d20 rolls"""
+    if player_roll > enemy_roll:
+        game_state["in_combat"] = False
+        game_state["enemy"] = None
+        return {"outcome": "combat_win", "next_agent": "NarratorAgent"}
+
+    game_state["health"] -= COMBAT_DAMAGE
+    if game_state["health"] <= 0:
+        return {"outcome": "combat_hit", "next_agent": "game_over"}
+    return {"outcome": "combat_hit", "next_agent": "MonsterAgent"}
+
+
+def resolve_item(game_state: Dict[str, Any], item_roll: int) -> Dict[str, Any]:
+    """Resolve an item discovery roll"""
+    healed = item_roll > ITEM_HEAL_ROLL
+    if healed:
+        game_state["health"] = min(MAX_HEALTH, game_state["health"] + ITEM_HEAL)
+    outcome = "item_great" if item_roll > GREAT_ITEM_ROLL else "item_plain"
+    return {"outcome": outcome, "healed": healed, "next_agent": "NarratorAgent"}
+
+
+def combat_result_text(game_state: Dict[str, Any], player_roll: int, enemy_roll: int,
+                       story: str, resolution: Dict[str, Any]) -> str:
+    """Format a combat turn the way the game displays it"""
+    result = f"🎲 **Your roll:** {player_roll} | **Enemy roll:** {enemy_roll}\n\n⚔️ **Combat:** {story}"
+    if resolution["outcome"] == "combat_win":
+        result += "\n\n✅ **You won the fight!**"
+    else:
+        result += f"\n\n❤️ **You took damage! Health: {game_state['health']}**"
+        if resolution["next_agent"] == "game_over":
+            result += "\n\n💀 **Game Over!**"
+    return result
+
+
+def item_result_text(game_state: Dict[str, Any], item_roll: int, story: str,
+                     resolution: Dict[str, Any]) -> str:
+    """Format an item turn the way the game displays it"""
+    result = f"🎲 **Item roll:** {item_roll}\n\n🎒 **Item Discovery:** {story}"
+    if resolution["healed"]:
+        result += f"\n\n✨ **You feel better! Health: {game_state['health']}**"
+    return result
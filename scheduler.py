@@ -0,0 +1,348 @@
+"""
+Fair scheduler for outbound model calls
+Token-bucket rate limits and concurrency caps per lane (provider or model), round-robin
+queues per session, priorities for short turns and jittered retry on 429/5xx
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import inspect
+import os
+import random
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Optional, Tuple
+import metrics
+
+# Priorities (lower runs first)
+HIGH = 0    # short mechanical turns
+NORMAL = 1  # narration
+LOW = 2     # background flavor
+PRIORITIES = (HIGH, NORMAL, LOW)
+
+# Defaults (override with environment variables, read on first use)
+DEFAULT_SETTINGS = {
+    "MODEL_RATE": "0",                 # requests per second per lane, 0 = unlimited
+    "MODEL_BURST": "10",               # bucket size
+    "MODEL_CONCURRENCY": "32",         # in-flight calls per lane
+    "MODEL_RATE_LIMITS": "",           # per-lane overrides: "gemini=5:10:16,openrouter=2" (rate:burst:concurrency)
+    "MODEL_QUEUE_LIMIT": "1000",       # waiting calls per lane
+    "MODEL_SESSION_QUEUE_LIMIT": "8",  # waiting calls per session
+    "MODEL_MAX_RETRIES": "3",
+    "MODEL_RETRY_BASE": "0.5",         # seconds, doubled per attempt
+    "MODEL_RETRY_CAP": "8",
+}
+
+RETRYABLE_ERRORS = ("RateLimitError", "APIConnectionError", "APITimeoutError", "Timeout",
+                    "ServiceUnavailableError", "InternalServerError", "BadGatewayError")
+
+QUEUE_DEPTH = metrics.gauge("game_model_queue_depth", "Model calls waiting for a slot")
+IN_FLIGHT = metrics.gauge("game_model_in_flight", "Model calls in progress")
+QUEUE_WAIT_SECONDS = metrics.histogram("game_model_queue_wait_seconds", "Time model calls wait for a slot")
+RETRIES = metrics.counter("game_model_retries_total", "Model call retries by status")
+REJECTED = metrics.counter("game_model_rejected_total", "Model calls rejected by the scheduler")
+
+_session = contextvars.ContextVar("scheduler_session", default=None)
+
+
+class Overloaded(Exception):
+    """The model is rate limited or the queue is full; the turn should be retried later"""
+
+
+def use_session(key: Optional[str]):
+    """Attribute model calls made from the current task (and tasks it spawns) to a session"""
+    _session.set(key)
+
+
+def status_of(error: Exception) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def retryable(error: Exception) -> bool:
+    status = status_of(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (ConnectionError, asyncio.TimeoutError)) or type(error).__name__ in RETRYABLE_ERRORS
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds from a Retry-After header, if the error carries one"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or getattr(error, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take one token; returns 0 on success, else seconds until one is available"""
+        if not self.rate:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def refund(self):
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + 1)
+
+    def pause(self, seconds: float):
+        """Drain the bucket after the provider pushed back, so waiting calls back off too"""
+        if self.rate:
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class Lane:
+    """Calls sharing one rate limit"""
+
+    __slots__ = ("name", "bucket", "concurrency", "active", "queues", "waiting", "per_session", "timer")
+
+    def __init__(self, name: str, rate: float, burst: float, concurrency: int):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = concurrency
+        self.active = 0
+        # One round-robin ring of per-session queues for each priority
+        self.queues = [OrderedDict() for _ in PRIORITIES]
+        self.waiting = 0
+        self.per_session: Dict[Optional[str], int] = {}
+        self.timer = None
+
+
+class Scheduler:
+    def __init__(self, rate: float = 0.0, burst: float = 10, concurrency: int = 32,
+                 limits: Optional[Dict[str, Tuple[float, float, int]]] = None, queue_limit: int = 1000,
+                 session_queue_limit: int = 8, max_retries: int = 3, retry_base: float = 0.5, retry_cap: float = 8.0):
+        self.default = (rate, burst, concurrency)
+        self.limits = limits or {}
+        self.queue_limit = queue_limit
+        self.session_queue_limit = session_queue_limit
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_cap = retry_cap
+        self.lanes: Dict[str, Lane] = {}
+
+    def lane(self, key: str) -> Lane:
+        """Lane for a model name: the most specific configured prefix, else its provider"""
+        lane = self.lanes.get(key)
+        if lane is None:
+            parts = key.split("/")
+            name = next(("/".join(parts[:i]) for i in range(len(parts), 0, -1)
+                         if "/".join(parts[:i]) in self.limits), parts[0])
+            lane = self.lanes.get(name)
+            if lane is None:
+                lane = self.lanes[name] = Lane(name, *self.limits.get(name, self.default))
+            self.lanes[key] = lane
+        return lane
+
+    async def acquire(self, key: str, priority: int = NORMAL, session: Optional[str] = None) -> Lane:
+        """Wait for a slot on the model's lane"""
+        lane = self.lane(key)
+        if session is None:
+            session = _session.get()
+
+        if not lane.waiting and lane.active < lane.concurrency and lane.bucket.take() == 0:
+            lane.active += 1
+            IN_FLIGHT.set(lane.active, lane=lane.name)
+            return lane
+
+        if lane.waiting >= self.queue_limit:
+            REJECTED.inc(lane=lane.name, reason="queue_full")
+            raise Overloaded(f"{lane.name} queue is full")
+        if session is not None and lane.per_session.get(session, 0) >= self.session_queue_limit:
+            REJECTED.inc(lane=lane.name, reason="session_limit")
+            raise Overloaded("Too many pending model calls for this session")
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue = lane.queues[priority].get(session)
+        if queue is None:
+            queue = lane.queues[priority][session] = deque()
+        queue.append(waiter)
+        lane.waiting += 1
+        lane.per_session[session] = lane.per_session.get(session, 0) + 1
+        QUEUE_DEPTH.set(lane.waiting, lane=lane.name)
+
+        started = time.perf_counter()
+        self._dispatch(lane)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(lane)  # Granted a slot just as we were cancelled
+            else:
+                self._forget(lane, priority, session, waiter)
+            raise
+        if metrics.sampled():
+            waited = time.perf_counter() - started
+            QUEUE_WAIT_SECONDS.observe(waited, lane=lane.name)
+            metrics.SPAN_SECONDS.observe(waited, stage="queue_wait")
+        return lane
+
+    def release(self, lane: Lane):
+        lane.active -= 1
+        IN_FLIGHT.set(lane.active, lane=lane.name)
+        self._dispatch(lane)
+
+    @contextlib.asynccontextmanager
+    async def slot(self, key: str, priority: int = NORMAL, session: Optional[str] = None):
+        lane = await self.acquire(key, priority, session)
+        try:
+            yield lane
+        finally:
+            self.release(lane)
+
+    async def call(self, key: str, func, *args, priority: int = NORMAL, **kwargs):
+        """Run `await func(*args, **kwargs)` in a slot, retrying 429/5xx with jittered backoff"""
+        for attempt in range(self.max_retries + 1):
+            async with self.slot(key, priority) as lane:
+                try:
+                    return await func(*args, **kwargs)
+                except Exception as e:
+                    delay = self._retry_delay(lane, e, attempt)
+            await asyncio.sleep(delay)
+
+    async def stream(self, key: str, open_stream, priority: int = NORMAL):
+        """Iterate a streamed response in a slot
+
+        open_stream() returns an async iterator (or an awaitable of one). Failures before
+        the first item are retried; once items have been yielded, errors propagate.
+        """
+        for attempt in range(self.max_retries + 1):
+            async with self.slot(key, priority) as lane:
+                try:
+                    source = open_stream()
+                    if inspect.isawaitable(source):
+                        source = await source
+                    iterator = source.__aiter__()
+                    first = await iterator.__anext__()
+                except StopAsyncIteration:
+                    return
+                except Exception as e:
+                    delay = self._retry_delay(lane, e, attempt)
+                else:
+                    yield first
+                    async for item in iterator:
+                        yield item
+                    return
+            await asyncio.sleep(delay)
+
+    def _retry_delay(self, lane: Lane, error: Exception, attempt: int) -> float:
+        """Backoff before the next attempt, or re-raise when the error is final"""
+        status = status_of(error)
+        if not retryable(error) or attempt >= self.max_retries:
+            if status == 429:
+                raise Overloaded(f"{lane.name} is rate limited") from error
+            raise error
+        delay = retry_after(error) or random.uniform(0, min(self.retry_cap, self.retry_base * 2 ** attempt))
+        if status == 429:
+            lane.bucket.pause(delay)
+        RETRIES.inc(lane=lane.name, status=str(status or type(error).__name__))
+        return delay
+
+    def _dispatch(self, lane: Lane):
+        """Hand free slots to waiters: highest priority first, round-robin across sessions"""
+        while lane.waiting and lane.active < lane.concurrency:
+            wait = lane.bucket.take()
+            if wait:
+                if lane.timer is None:
+                    lane.timer = asyncio.get_running_loop().call_later(wait, self._wake, lane)
+                return
+            waiter = self._next_waiter(lane)
+            if waiter is None:
+                lane.bucket.refund()
+                return
+            lane.active += 1
+            waiter.set_result(None)
+        IN_FLIGHT.set(lane.active, lane=lane.name)
+
+    def _wake(self, lane: Lane):
+        lane.timer = None
+        self._dispatch(lane)
+
+    def _next_waiter(self, lane: Lane):
+        for ring in lane.queues:
+            while ring:
+                session, queue = next(iter(ring.items()))
+                waiter = queue.popleft()
+                if queue:
+                    ring.move_to_end(session)
+                else:
+                    del ring[session]
+                self._count_out(lane, session)
+                if not waiter.done():
+                    return waiter
+        return None
+
+    def _forget(self, lane: Lane, priority: int, session: Optional[str], waiter):
+        queue = lane.queues[priority].get(session)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del lane.queues[priority][session]
+            self._count_out(lane, session)
+
+    def _count_out(self, lane: Lane, session: Optional[str]):
+        lane.waiting -= 1
+        remaining = lane.per_session.get(session, 1) - 1
+        if remaining:
+            lane.per_session[session] = remaining
+        else:
+            lane.per_session.pop(session, None)
+        QUEUE_DEPTH.set(lane.waiting, lane=lane.name)
+
+    def stats(self) -> Dict[str, Dict]:
+        return {name: {"waiting": lane.waiting, "active": lane.active, "tokens": round(lane.bucket.tokens, 2)}
+                for name, lane in self.lanes.items() if name == lane.name}
+
+
+def parse_limits(text: str) -> Dict[str, Tuple[float, float, int]]:
+    """Parse "lane=rate:burst:concurrency,..."; missing parts use the defaults"""
+    limits = {}
+    rate, burst, concurrency = (os.getenv(key, DEFAULT_SETTINGS[key])
+                                for key in ("MODEL_RATE", "MODEL_BURST", "MODEL_CONCURRENCY"))
+    for entry in filter(None, (part.strip() for part in text.split(","))):
+        name, _, values = entry.partition("=")
+        parts = values.split(":") + [None, None]
+        limits[name.strip()] = (float(parts[0] or rate), float(parts[1] or burst), int(parts[2] or concurrency))
+    return limits
+
+
+_scheduler = None
+
+
+def get_scheduler() -> Scheduler:
+    """Process-wide scheduler configured with MODEL_* environment variables"""
+    global _scheduler
+    if _scheduler is None:
+        settings = {key: os.getenv(key, default) for key, default in DEFAULT_SETTINGS.items()}
+        _scheduler = Scheduler(
+            rate=float(settings["MODEL_RATE"]),
+            burst=float(settings["MODEL_BURST"]),
+            concurrency=int(settings["MODEL_CONCURRENCY"]),
+            limits=parse_limits(settings["MODEL_RATE_LIMITS"]),
+            queue_limit=int(settings["MODEL_QUEUE_LIMIT"]),
+            session_queue_limit=int(settings["MODEL_SESSION_QUEUE_LIMIT"]),
+            max_retries=int(settings["MODEL_MAX_RETRIES"]),
+            retry_base=float(settings["MODEL_RETRY_BASE"]),
+            retry_cap=float(settings["MODEL_RETRY_CAP"]),
+        )
+    return _scheduler
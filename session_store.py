@@ -0,0 +1,480 @@
+"""
+Externalized session state
+One SessionStore API over in-memory, SQLite (WAL) and Redis backends, so any worker can serve a player
+"""
+
+import asyncio
+import contextlib
+import os
+import sqlite3
+import struct
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlparse
+
+
+class VersionConflict(Exception):
+    """Another worker saved this session since it was loaded"""
+
+
+# Compact binary codec (msgpack wire format, plus one ext type for registered classes)
+_TYPES: Dict[str, type] = {}
+_TAGS: Dict[type, str] = {}
+_EXT_OBJECT = 1
+
+
+def register_type(tag: str, cls: type):
+    """Allow instances of cls (with to_state()/from_state()) inside session records"""
+    _TYPES[tag] = cls
+    _TAGS[cls] = tag
+
+
+def _pack(obj, out: bytearray):
+    if obj is None:
+        out.append(0xc0)
+    elif obj is True:
+        out.append(0xc3)
+    elif obj is False:
+        out.append(0xc2)
+    elif isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            out.append(obj)
+        elif -32 <= obj < 0:
+            out.append(obj & 0xff)
+        elif -(1 << 31) <= obj < (1 << 31):
+            out += struct.pack(">Bi", 0xd2, obj)
+        else:
+            out += struct.pack(">Bq", 0xd3, obj)
+    elif isinstance(obj, float):
+        out += struct.pack(">Bd", 0xcb, obj)
+    elif isinstance(obj, str):
+        data = obj.encode()
+        n = len(data)
+        if n < 32:
+            out.append(0xa0 | n)
+        elif n < 0x100:
+            out += struct.pack(">BB", 0xd9, n)
+        elif n < 0x10000:
+            out += struct.pack(">BH", 0xda, n)
+        else:
+            out += struct.pack(">BI", 0xdb, n)
+        out += data
+    elif isinstance(obj, (bytes, bytearray)):
+        n = len(obj)
+        if n < 0x100:
+            out += struct.pack(">BB", 0xc4, n)
+        elif n < 0x10000:
+            out += struct.pack(">BH", 0xc5, n)
+        else:
+            out += struct.pack(">BI", 0xc6, n)
+        out += obj
+    elif isinstance(obj, (list, tuple)):
+        n = len(obj)
+        if n < 16:
+            out.append(0x90 | n)
+        elif n < 0x10000:
+            out += struct.pack(">BH", 0xdc, n)
+        else:
+            out += struct.pack(">BI", 0xdd, n)
+        for item in obj:
+            _pack(item, out)
+    elif isinstance(obj, dict):
+        n = len(obj)
+        if n < 16:
+            out.append(0x80 | n)
+        elif n < 0x10000:
+            out += struct.pack(">BH", 0xde, n)
+        else:
+            out += struct.pack(">BI", 0xdf, n)
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    elif type(obj) in _TAGS:
+        payload = bytearray()
+        _pack([_TAGS[type(obj)], obj.to_state()], payload)
+        out += struct.pack(">BIb", 0xc9, len(payload), _EXT_OBJECT)
+        out += payload
+    else:
+        raise TypeError(f"Cannot serialize {type(obj).__name__}")
+
+
+def _unpack(data: bytes, pos: int) -> Tuple[Any, int]:
+    code = data[pos]
+    pos += 1
+    if code < 0x80:
+        return code, pos
+    if code >= 0xe0:
+        return code - 0x100, pos
+    if 0xa0 <= code <= 0xbf:
+        n = code & 0x1f
+        return data[pos:pos + n].decode(), pos + n
+    if 0x90 <= code <= 0x9f:
+        return _unpack_array(data, pos, code & 0x0f)
+    if 0x80 <= code <= 0x8f:
+        return _unpack_map(data, pos, code & 0x0f)
+    if code == 0xc0:
+        return None, pos
+    if code == 0xc2:
+        return False, pos
+    if code == 0xc3:
+        return True, pos
+    if code == 0xd2:
+        return struct.unpack_from(">i", data, pos)[0], pos + 4
+    if code == 0xd3:
+        return struct.unpack_from(">q", data, pos)[0], pos + 8
+    if code == 0xcb:
+        return struct.unpack_from(">d", data, pos)[0], pos + 8
+    if code in (0xd9, 0xda, 0xdb, 0xc4, 0xc5, 0xc6):
+        size_format = {0xd9: ">B", 0xda: ">H", 0xdb: ">I", 0xc4: ">B", 0xc5: ">H", 0xc6: ">I"}[code]
+        n = struct.unpack_from(size_format, data, pos)[0]
+        pos += struct.calcsize(size_format)
+        raw = bytes(data[pos:pos + n])
+        return (raw if code in (0xc4, 0xc5, 0xc6) else raw.decode()), pos + n
+    if code in (0xdc, 0xdd):
+        size_format = ">H" if code == 0xdc else ">I"
+        n = struct.unpack_from(size_format, data, pos)[0]
+        return _unpack_array(data, pos + struct.calcsize(size_format), n)
+    if code in (0xde, 0xdf):
+        size_format = ">H" if code == 0xde else ">I"
+        n = struct.unpack_from(size_format, data, pos)[0]
+        return _unpack_map(data, pos + struct.calcsize(size_format), n)
+    if code == 0xc9:
+        n, ext_type = struct.unpack_from(">Ib", data, pos)
+        pos += 5
+        (tag, state), _ = _unpack(data, pos)
+        return _TYPES[tag].from_state(state), pos + n
+    raise ValueError(f"Unknown type code 0x{code:02x}")
+
+
+def _unpack_array(data: bytes, pos: int, n: int):
+    items = []
+    for _ in range(n):
+        item, pos = _unpack(data, pos)
+        items.append(item)
+    return items, pos
+
+
+def _unpack_map(data: bytes, pos: int, n: int):
+    result = {}
+    for _ in range(n):
+        key, pos = _unpack(data, pos)
+        result[key], pos = _unpack(data, pos)
+    return result, pos
+
+
+def encode(obj) -> bytes:
+    out = bytearray()
+    _pack(obj, out)
+    return bytes(out)
+
+
+def decode(data: bytes):
+    return _unpack(data, 0)[0]
+
+
+def copy_record(record):
+    """A deep copy through the codec, so a turn never changes a record it has not saved"""
+    return decode(encode(record))
+
+
+# Backends: load(key) -> (data, version); save_many([(key, data, expected_version, new_version)]) -> conflicting keys
+class MemoryBackend:
+    """Single-process store; keeps live objects, but load() returns a private copy like the other backends"""
+
+    serializes = False
+
+    def __init__(self):
+        self.records: Dict[str, Tuple[Any, int]] = {}
+
+    async def load(self, key: str):
+        data, version = self.records.get(key, (None, 0))
+        return (None if data is None else copy_record(data)), version
+
+    async def save_many(self, writes: List[tuple]) -> List[str]:
+        conflicts = []
+        for key, data, expected, version in writes:
+            if self.records.get(key, (None, 0))[1] != expected:
+                conflicts.append(key)
+            else:
+                self.records[key] = (data, version)
+        return conflicts
+
+    async def close(self):
+        pass
+
+
+class SqliteBackend:
+    """Shared on-disk store; WAL mode lets several worker processes read while one writes"""
+
+    serializes = True
+
+    def __init__(self, path: str):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS sessions (key TEXT PRIMARY KEY, version INTEGER, data BLOB)")
+
+    def _load(self, key: str):
+        with self.lock:
+            row = self.db.execute("SELECT data, version FROM sessions WHERE key = ?", (key,)).fetchone()
+        return (row[0], row[1]) if row else (None, 0)
+
+    def _save_many(self, writes: List[tuple]) -> List[str]:
+        conflicts = []
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                for key, data, expected, version in writes:
+                    if expected == 0:
+                        cursor = self.db.execute("INSERT OR IGNORE INTO sessions VALUES (?, ?, ?)", (key, version, data))
+                    else:
+                        cursor = self.db.execute(
+                            "UPDATE sessions SET data = ?, version = ? WHERE key = ? AND version = ?",
+                            (data, version, key, expected))
+                    if cursor.rowcount == 0:
+                        conflicts.append(key)
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return conflicts
+
+    async def load(self, key: str):
+        return await asyncio.to_thread(self._load, key)
+
+    async def save_many(self, writes: List[tuple]) -> List[str]:
+        return await asyncio.to_thread(self._save_many, writes)
+
+    async def close(self):
+        self.db.close()
+
+
+class RedisBackend:
+    """Redis (RESP2) store; versions are checked with WATCH/MULTI/EXEC"""
+
+    serializes = True
+
+    def __init__(self, url: str = "redis://127.0.0.1:6379/0", pool_size: int = 8, prefix: str = "session:"):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self.pool: asyncio.Queue = asyncio.Queue()
+        self.pool_size = pool_size
+        self.opened = 0
+
+    async def _connection(self):
+        if self.pool.empty() and self.opened < self.pool_size:
+            return await self._open()
+        connection = await self.pool.get()
+        return connection if connection is not None else await self._open()
+
+    async def _open(self):
+        self.opened += 1  # taken before connecting so concurrent callers stay within pool_size
+        try:
+            connection = await asyncio.open_connection(self.host, self.port)
+        except BaseException:
+            self._release_slot()
+            raise
+        if self.db:
+            try:
+                await self._command(connection, "SELECT", self.db)
+            except BaseException:
+                self._discard(connection)
+                raise
+        return connection
+
+    def _release_slot(self):
+        """Give back a connection slot; a caller waiting on the pool opens a fresh connection with it"""
+        self.opened -= 1
+        self.pool.put_nowait(None)
+
+    def _discard(self, connection):
+        """Close a connection that may hold a half-read reply or an open transaction"""
+        connection[1].close()
+        self._release_slot()
+
+    @contextlib.asynccontextmanager
+    async def _connected(self):
+        connection = await self._connection()
+        try:
+            yield connection
+        except BaseException:
+            self._discard(connection)
+            raise
+        self.pool.put_nowait(connection)
+
+    @staticmethod
+    async def _command(connection, *args):
+        reader, writer = connection
+        out = bytearray(b"*%d\r\n" % len(args))
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            out += b"$%d\r\n%s\r\n" % (len(data), data)
+        writer.write(out)
+        await writer.drain()
+        return await RedisBackend._reply(reader)
+
+    @staticmethod
+    async def _reply(reader):
+        line = await reader.readline()
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RuntimeError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            if n < 0:
+                return None
+            data = await reader.readexactly(n + 2)
+            return data[:-2]
+        if kind == b"*":
+            n = int(rest)
+            if n < 0:
+                return None
+            return [await RedisBackend._reply(reader) for _ in range(n)]
+        raise RuntimeError(f"Bad RESP reply: {line!r}")
+
+    async def load(self, key: str):
+        async with self._connected() as connection:
+            raw = await self._command(connection, "GET", self.prefix + key)
+        if raw is None:
+            return None, 0
+        version = struct.unpack_from(">Q", raw)[0]
+        return raw[8:], version
+
+    async def save_many(self, writes: List[tuple]) -> List[str]:
+        conflicts = []
+        async with self._connected() as connection:
+            for key, data, expected, version in writes:
+                name = self.prefix + key
+                await self._command(connection, "WATCH", name)
+                raw = await self._command(connection, "GET", name)
+                current = struct.unpack_from(">Q", raw)[0] if raw else 0
+                if current != expected:
+                    await self._command(connection, "UNWATCH")
+                    conflicts.append(key)
+                    continue
+                await self._command(connection, "MULTI")
+                await self._command(connection, "SET", name, struct.pack(">Q", version) + data)
+                if await self._command(connection, "EXEC") is None:
+                    conflicts.append(key)
+        return conflicts
+
+    async def close(self):
+        while not self.pool.empty():
+            connection = self.pool.get_nowait()
+            if connection is not None:
+                connection[1].close()
+
+
+class SessionStore:
+    """Versioned session records with optional write-behind batching
+
+    load() returns (record, version). save() must be given the version that was
+    loaded; with write-behind, a save that races an unflushed one raises at once,
+    while conflicts with other workers surface when the batch is flushed and the
+    losing write is dropped (and counted).
+    """
+
+    def __init__(self, backend=None, write_behind: float = 0.0, batch_size: int = 64):
+        self.backend = backend or MemoryBackend()
+        self.write_behind = write_behind
+        self.batch_size = batch_size
+        self.pending: Dict[str, list] = {}  # key -> [record, base_version, new_version]
+        self.flush_task: Optional[asyncio.Task] = None
+        self.stats = {"loads": 0, "saves": 0, "flushes": 0, "conflicts": 0}
+
+    async def load(self, key: str):
+        self.stats["loads"] += 1
+        pending = self.pending.get(key)
+        if pending is not None:
+            return copy_record(pending[0]), pending[2]
+        data, version = await self.backend.load(key)
+        if data is not None and self.backend.serializes:
+            data = decode(data)
+        return data, version
+
+    async def save(self, key: str, record: Dict[str, Any], version: int) -> int:
+        """Save a record loaded at `version`; returns the new version"""
+        self.stats["saves"] += 1
+        if not self.write_behind:
+            if await self._write([(key, record, version, version + 1)]):
+                raise VersionConflict(key)
+            return version + 1
+
+        pending = self.pending.get(key)
+        if pending is not None:
+            if pending[2] != version:
+                self.stats["conflicts"] += 1
+                raise VersionConflict(key)
+            # Coalesce with the unflushed write
+            pending[0] = record
+            pending[2] = version + 1
+        else:
+            self.pending[key] = [record, version, version + 1]
+        if len(self.pending) >= self.batch_size:
+            await self.flush()
+        elif self.flush_task is None:
+            self.flush_task = asyncio.create_task(self._flush_later())
+        return version + 1
+
+    async def _write(self, writes: List[tuple]):
+        if self.backend.serializes:
+            writes = [(key, encode(record), expected, version) for key, record, expected, version in writes]
+        conflicts = await self.backend.save_many(writes)
+        self.stats["conflicts"] += len(conflicts)
+        return conflicts
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.write_behind)
+        self.flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        self.stats["flushes"] += 1
+        conflicts = await self._write([(key, record, base, new) for key, (record, base, new) in batch.items()])
+        for key in conflicts:
+            print(f"[WARN] Session {key} was changed by another worker; dropped a write-behind save")
+
+    async def close(self):
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+        await self.flush()
+        await self.backend.close()
+
+
+_store: Optional[SessionStore] = None
+
+
+def get_store() -> SessionStore:
+    """Process-wide store configured with SESSION_STORE* environment variables"""
+    global _store
+    if _store is None:
+        kind = os.getenv("SESSION_STORE", "memory")
+        if kind == "sqlite":
+            backend = SqliteBackend(os.getenv("SESSION_STORE_PATH", ".sessions.db"))
+        elif kind == "redis":
+            backend = RedisBackend(os.getenv("SESSION_STORE_URL", "redis://127.0.0.1:6379/0"))
+        else:
+            backend = MemoryBackend()
+        write_behind = float(os.getenv("SESSION_WRITE_BEHIND_MS", "0")) / 1000
+        _store = SessionStore(backend, write_behind=write_behind)
+    return _store
+
+
+def session_key(user_session) -> str:
+    """Stable key for a player: the authenticated user if any, else the Chainlit session id"""
+    user = user_session.get("user")
+    if user is not None and getattr(user, "identifier", None):
+        return f"user:{user.identifier}"
+    return f"chat:{user_session.get('id')}"
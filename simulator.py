@@ -0,0 +1,246 @@
+"""
+Monte Carlo balance simulator
+Plays app.py's rule loop (narrator events -> combat -> loot) for many players with no model calls,
+using the same rules.py functions and event table the live game runs
+
+Usage: python simulator.py [--players N] [--set NAME=VALUE ...] [--sweep NAME=V1,V2,... ...] [--output FILE]
+"""
+
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import dice
+import rules
+
+AGENTS = ("NarratorAgent", "MonsterAgent", "ItemAgent")
+EVENT_TYPES = sorted({event["type"] for event in rules.EVENTS})
+# Sweepable parameters: rules.py constants, the starting health and per-event-type weights
+RULE_PARAMETERS = ("MAX_HEALTH", "ROLL_SIDES", "COMBAT_DAMAGE", "ITEM_HEAL", "ITEM_HEAL_ROLL", "GREAT_ITEM_ROLL")
+PARAMETERS = RULE_PARAMETERS + ("START_HEALTH",) + tuple(f"WEIGHT_{kind.upper()}" for kind in EVENT_TYPES)
+DEFAULT_START_HEALTH = 100  # app.py DEFAULT_GAME_STATE
+CHUNK = 20000  # players per worker task; chunks are seeded by index so results don't depend on --workers
+BATCH = 4096   # dice drawn per refill
+
+
+def _draws(draw) -> Iterator:
+    while True:
+        batch = draw()
+        yield from (batch.tolist() if hasattr(batch, "tolist") else batch)
+
+
+def _event_table(params: Dict[str, Any]) -> dice.AliasTable:
+    weights = {kind: params.get(f"WEIGHT_{kind.upper()}", 1) for kind in EVENT_TYPES}
+    if all(weight == 1 for weight in weights.values()):
+        return rules.EVENT_TABLE
+    return dice.AliasTable(rules.EVENTS, [weights[event["type"]] for event in rules.EVENTS])
+
+
+def simulate_chunk(params: Dict[str, Any], players: int, max_turns: int, seed: int) -> Dict[str, Any]:
+    """Play `players` games of at most `max_turns` turns; counts only, so chunks merge by addition"""
+    saved = {name: getattr(rules, name) for name in RULE_PARAMETERS if name in params}
+    for name in saved:
+        setattr(rules, name, params[name])
+    try:
+        roller = dice.DiceRoller(seed)
+        table = _event_table(params)
+        events = _draws(lambda: table.sample_many(BATCH, roller))
+        rolls = _draws(lambda: roller.bulk(rules.ROLL_SIDES, BATCH))
+        start_health = params.get("START_HEALTH", DEFAULT_START_HEALTH)
+        apply_event, resolve_combat, resolve_item = rules.apply_event, rules.resolve_combat, rules.resolve_item
+
+        deaths = [0] * (max_turns + 1)  # deaths[t]: players who died on turn t
+        transitions: Dict[Tuple[str, str], int] = {}
+        for _ in range(players):
+            game_state = {"health": start_health, "inventory": [], "location": "village",
+                          "in_combat": False, "enemy": None}
+            agent = "NarratorAgent"
+            for turn in range(1, max_turns + 1):
+                if agent == "NarratorAgent":
+                    next_agent = apply_event(game_state, next(events))
+                elif agent == "MonsterAgent":
+                    next_agent = resolve_combat(game_state, next(rolls), next(rolls))["next_agent"]
+                else:
+                    next_agent = resolve_item(game_state, next(rolls))["next_agent"]
+                edge = (agent, next_agent)
+                transitions[edge] = transitions.get(edge, 0) + 1
+                if next_agent == "game_over":
+                    deaths[turn] += 1
+                    break
+                agent = next_agent
+    finally:
+        for name, value in saved.items():
+            setattr(rules, name, value)
+    return {"players": players, "deaths": deaths, "transitions": transitions}
+
+
+class Outcome:
+    """Merged results for one parameter set"""
+
+    def __init__(self, params: Dict[str, Any], max_turns: int):
+        self.params = params
+        self.max_turns = max_turns
+        self.players = 0
+        self.deaths = [0] * (max_turns + 1)
+        self.transitions: Dict[Tuple[str, str], int] = {}
+
+    def add(self, chunk: Dict[str, Any]):
+        self.players += chunk["players"]
+        self.deaths = [a + b for a, b in zip(self.deaths, chunk["deaths"])]
+        for edge, count in chunk["transitions"].items():
+            self.transitions[edge] = self.transitions.get(edge, 0) + count
+
+    def survival(self) -> List[float]:
+        """Share of players still alive after each turn (index 0 = start)"""
+        alive, curve = self.players, []
+        for died in self.deaths:
+            alive -= died
+            curve.append(alive / self.players)
+        return curve
+
+    def death_rate(self) -> float:
+        return sum(self.deaths) / self.players
+
+    def turns_to_death(self) -> Dict[str, float]:
+        """Distribution of the turn players died on (players alive at max_turns excluded)"""
+        died = sum(self.deaths)
+        if not died:
+            return {"mean": 0.0, "p10": 0, "median": 0, "p90": 0}
+
+        def quantile(q: float) -> int:
+            target, seen = q * died, 0
+            for turn, count in enumerate(self.deaths):
+                seen += count
+                if seen >= target:
+                    return turn
+            return self.max_turns
+        mean = sum(turn * count for turn, count in enumerate(self.deaths)) / died
+        return {"mean": mean, "p10": quantile(0.1), "median": quantile(0.5), "p90": quantile(0.9)}
+
+    def session_length(self) -> float:
+        """Mean turns played, survivors counted at max_turns"""
+        total = sum(turn * count for turn, count in enumerate(self.deaths))
+        total += (self.players - sum(self.deaths)) * self.max_turns
+        return total / self.players
+
+    def transition_frequencies(self) -> Dict[str, Dict[str, float]]:
+        """P(next agent | agent)"""
+        frequencies: Dict[str, Dict[str, float]] = {}
+        for agent in AGENTS:
+            outgoing = {to: count for (source, to), count in self.transitions.items() if source == agent}
+            total = sum(outgoing.values())
+            if total:
+                frequencies[agent] = {to: count / total for to, count in sorted(outgoing.items())}
+        return frequencies
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "params": self.params,
+            "players": self.players,
+            "max_turns": self.max_turns,
+            "death_rate": self.death_rate(),
+            "session_length": self.session_length(),
+            "turns_to_death": self.turns_to_death(),
+            "turns_to_death_histogram": self.deaths,
+            "survival": self.survival(),
+            "transitions": self.transition_frequencies(),
+        }
+
+
+def _run_chunk(job: tuple) -> tuple:
+    index, params, players, max_turns, seed = job
+    return index, simulate_chunk(params, players, max_turns, seed)
+
+
+def sweep(grid: Dict[str, List[Any]], players: int, max_turns: int = 200, seed: int = 0,
+          workers: Optional[int] = None, fixed: Optional[Dict[str, Any]] = None) -> List[Outcome]:
+    """Simulate every combination of the grid's values (plus fixed overrides)"""
+    fixed = fixed or {}
+    for name in list(grid) + list(fixed):
+        if name not in PARAMETERS:
+            raise ValueError(f"Unknown parameter {name}; choose from {', '.join(PARAMETERS)}")
+    names = list(grid)
+    points = [{**fixed, **dict(zip(names, values))} for values in itertools.product(*grid.values())] or [dict(fixed)]
+    outcomes = [Outcome(params, max_turns) for params in points]
+    jobs = []
+    for index, params in enumerate(points):
+        for chunk, start in enumerate(range(0, players, CHUNK)):
+            jobs.append((index, params, min(CHUNK, players - start), max_turns, dice.derive_seed(seed, chunk)))
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) == 1:
+        for index, chunk in map(_run_chunk, jobs):
+            outcomes[index].add(chunk)
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            for index, chunk in pool.map(_run_chunk, jobs, chunksize=max(1, len(jobs) // (workers * 4))):
+                outcomes[index].add(chunk)
+    return outcomes
+
+
+def simulate(players: int, max_turns: int = 200, seed: int = 0, workers: Optional[int] = None,
+             **params) -> Outcome:
+    """One parameter set, e.g. simulate(100000, COMBAT_DAMAGE=15)"""
+    return sweep({}, players, max_turns, seed, workers, params)[0]
+
+
+def _parse_value(text: str):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def report(outcome: Outcome, checkpoints=(5, 10, 20, 50, 100)) -> str:
+    deaths = outcome.turns_to_death()
+    survival = outcome.survival()
+    lines = [
+        f"players {outcome.players:,}, max turns {outcome.max_turns}",
+        f"death rate {outcome.death_rate():.1%}, mean session {outcome.session_length():.1f} turns",
+        f"turns to death: mean {deaths['mean']:.1f}, p10 {deaths['p10']}, median {deaths['median']}, p90 {deaths['p90']}",
+        "survival: " + ", ".join(f"t{turn} {survival[turn]:.1%}" for turn in checkpoints if turn <= outcome.max_turns),
+        "transitions:",
+    ]
+    for agent, targets in outcome.transition_frequencies().items():
+        lines.append(f"  {agent:<14} " + ", ".join(f"{to} {share:.1%}" for to, share in targets.items()))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--players", type=int, default=100000)
+    parser.add_argument("--max-turns", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE", help="fixed override")
+    parser.add_argument("--sweep", action="append", default=[], metavar="NAME=V1,V2", help="values to sweep")
+    parser.add_argument("--output", help="write full results (curves, histograms) as JSON")
+    args = parser.parse_args()
+
+    fixed = {name: _parse_value(value) for name, value in (item.split("=", 1) for item in args.set)}
+    grid = {name: [_parse_value(value) for value in values.split(",")]
+            for name, values in (item.split("=", 1) for item in args.sweep)}
+    started = time.perf_counter()
+    outcomes = sweep(grid, args.players, args.max_turns, args.seed, args.workers, fixed)
+    elapsed = time.perf_counter() - started
+
+    if len(outcomes) == 1:
+        print(report(outcomes[0]))
+    else:
+        names = list(grid)
+        print("  ".join(f"{name:>16}" for name in names) + f"  {'death rate':>10}  {'mean turns':>10}  {'median death':>12}")
+        for outcome in outcomes:
+            print("  ".join(f"{outcome.params[name]:>16}" for name in names)
+                  + f"  {outcome.death_rate():>10.1%}  {outcome.session_length():>10.1f}"
+                  + f"  {outcome.turns_to_death()['median']:>12}")
+    simulated = args.players * len(outcomes)
+    print(f"\n{simulated:,} players in {elapsed:.1f}s ({simulated / elapsed:,.0f} players/s)")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump([outcome.to_dict() for outcome in outcomes], f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
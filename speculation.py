@@ -0,0 +1,173 @@
+"""
+Speculative pre-generation of the next turn
+While the player reads, the numbered choices the narrator offered are generated in the background;
+picking one of them is answered from the finished (or in-flight) speculation
+"""
+
+import asyncio
+import os
+import re
+import time
+from typing import Dict, Any, Callable, List, Optional
+import metrics
+from compaction import estimate_tokens
+
+# GAME_SPECULATE=on enables speculation; SPECULATE_TOKEN_BUDGET caps speculative tokens per minute
+DEFAULT_MAX_CHOICES = 3
+DEFAULT_TOKEN_BUDGET = 20000
+BUDGET_WINDOW = 60.0
+
+SPECULATIONS = metrics.counter("game_speculations_total", "Speculative turns by outcome")
+SPECULATION_TOKENS = metrics.counter("game_speculation_tokens_total", "Speculative tokens used or wasted")
+
+# "1. Follow the left path", "2) Rest", "**3.** Investigate"
+_CHOICE_LINE = re.compile(r"^\s*(?:\*\*)?(\d)[.)](?:\*\*)?\s+(.+?)\s*$", re.MULTILINE)
+# "2", "2.", "option 2", "I choose 2"
+_CHOICE_PICK = re.compile(r"^(?:i\s+(?:choose|pick)\s+|option\s+|choice\s+|#)?(\d)[.)]?$")
+
+
+def parse_choices(story: str) -> List[str]:
+    """Numbered choices offered at the end of a story, in order"""
+    choices = {}
+    for number, text in _CHOICE_LINE.findall(story):
+        choices.setdefault(int(number), text.strip("* "))
+    return [choices[n] for n in sorted(choices)]
+
+
+def match_choice(player_action: str, choices: List[str]) -> Optional[int]:
+    """Index of the offered choice the player picked, if any"""
+    action = player_action.strip().lower()
+    picked = _CHOICE_PICK.match(action)
+    if picked:
+        index = int(picked.group(1)) - 1
+        return index if 0 <= index < len(choices) else None
+    action = action.rstrip(".!")
+    for index, choice in enumerate(choices):
+        if choice.lower().rstrip(".!") == action:
+            return index
+    return None
+
+
+def fingerprint(game_state: Dict[str, Any], history) -> int:
+    """Identifies the state a speculation was made from (the agent pointer is ignored)"""
+    return hash((repr(sorted((key, value) for key, value in game_state.items() if key != "current_agent")),
+                 history.message_count()))
+
+
+class Speculation:
+    """One pre-generated continuation"""
+
+    __slots__ = ("agent", "choice", "facts", "prompt", "task", "tokens_in")
+
+    def __init__(self, agent: str, choice: str, facts: Dict[str, Any], prompt: str, task: asyncio.Task,
+                 tokens_in: int):
+        self.agent = agent
+        self.choice = choice
+        self.facts = facts
+        self.prompt = prompt
+        self.task = task
+        self.tokens_in = tokens_in
+
+    def tokens(self) -> int:
+        """Input tokens plus output tokens if the story has finished"""
+        if self.task.done() and not self.task.cancelled() and self.task.exception() is None:
+            return self.tokens_in + estimate_tokens(self.task.result())
+        return self.tokens_in
+
+
+class Speculator:
+    """Per-session speculative turns with a process-wide token budget"""
+
+    def __init__(self, max_choices: int = DEFAULT_MAX_CHOICES, token_budget: int = DEFAULT_TOKEN_BUDGET):
+        self.max_choices = max_choices
+        self.token_budget = token_budget
+        self.window_started = time.monotonic()
+        self.window_spent = 0
+        self.pending: Dict[str, tuple] = {}  # session -> (fingerprint, choices, speculations)
+        self.stats = {"offered": 0, "hits": 0, "late_hits": 0, "misses": 0, "stale": 0, "skipped_for_budget": 0,
+                      "tokens_used": 0, "tokens_wasted": 0}
+
+    def allow(self, tokens: int) -> bool:
+        """Charge a speculation against the budget; False when it would exceed it"""
+        now = time.monotonic()
+        if now - self.window_started >= BUDGET_WINDOW:
+            self.window_started = now
+            self.window_spent = 0
+        if self.window_spent + tokens > self.token_budget:
+            self.stats["skipped_for_budget"] += 1
+            return False
+        self.window_spent += tokens
+        return True
+
+    def start(self, session: str, state: int, choices: List[str],
+              make: Callable[[str], Optional[Speculation]]):
+        """Speculate on each choice; make(choice) builds one speculation or returns None to stop"""
+        self.discard(session)
+        speculations = []
+        for choice in choices[:self.max_choices]:
+            speculation = make(choice)
+            if speculation is None:
+                break
+            speculations.append(speculation)
+        if speculations:
+            self.pending[session] = (state, choices, speculations)
+            self.stats["offered"] += len(speculations)
+
+    def take(self, session: str, player_action: str, state: int) -> Optional[Speculation]:
+        """Claim the speculation matching the player's pick; all others are cancelled"""
+        entry = self.pending.pop(session, None)
+        if entry is None:
+            return None
+        speculated_state, choices, speculations = entry
+        index = match_choice(player_action, choices)
+        taken = None
+        if index is None or index >= len(speculations):
+            self.stats["misses"] += 1
+            SPECULATIONS.inc(outcome="miss")
+        elif speculated_state != state:
+            self.stats["stale"] += 1
+            SPECULATIONS.inc(outcome="stale")
+        else:
+            taken = speculations[index]
+        self._waste(speculation for speculation in speculations if speculation is not taken)
+        if taken is not None:
+            outcome = "hits" if taken.task.done() else "late_hits"
+            self.stats[outcome] += 1
+            SPECULATIONS.inc(outcome=outcome[:-1])
+        return taken
+
+    def used(self, speculation: Speculation):
+        tokens = speculation.tokens()
+        self.stats["tokens_used"] += tokens
+        SPECULATION_TOKENS.inc(tokens, kind="used")
+
+    def discard(self, session: str):
+        """Cancel a session's speculations (state changed, e.g. restart)"""
+        entry = self.pending.pop(session, None)
+        if entry is not None:
+            self._waste(entry[2])
+
+    def _waste(self, speculations):
+        for speculation in speculations:
+            tokens = speculation.tokens()
+            speculation.task.cancel()
+            self.stats["tokens_wasted"] += tokens
+            SPECULATION_TOKENS.inc(tokens, kind="wasted")
+
+    def report(self) -> Dict[str, Any]:
+        picks = self.stats["hits"] + self.stats["late_hits"] + self.stats["misses"] + self.stats["stale"]
+        spent = self.stats["tokens_used"] + self.stats["tokens_wasted"]
+        return {
+            **self.stats,
+            "hit_rate": (self.stats["hits"] + self.stats["late_hits"]) / picks if picks else 0.0,
+            "waste_ratio": self.stats["tokens_wasted"] / spent if spent else 0.0,
+        }
+
+
+def speculator_from_env() -> Optional[Speculator]:
+    if os.getenv("GAME_SPECULATE", "off") != "on":
+        return None
+    return Speculator(
+        max_choices=int(os.getenv("SPECULATE_MAX_CHOICES", DEFAULT_MAX_CHOICES)),
+        token_budget=int(os.getenv("SPECULATE_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET)),
+    )
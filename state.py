@@ -0,0 +1,293 @@
+"""
+Typed game state
+Slotted player/inventory/combat records with interned item ids, copy-on-write snapshots
+and field-level deltas; reads and writes keep the dict-style access the game already uses
+"""
+
+import json
+from array import array
+from json.encoder import encode_basestring_ascii
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Item names are interned once per process; inventories store their ids
+_ITEM_NAMES: List[str] = []
+_ITEM_IDS: Dict[str, int] = {}
+
+
+def item_id(name: str) -> int:
+    index = _ITEM_IDS.get(name)
+    if index is None:
+        index = _ITEM_IDS[name] = len(_ITEM_NAMES)
+        _ITEM_NAMES.append(name)
+    return index
+
+
+def item_name(index: int) -> str:
+    return _ITEM_NAMES[index]
+
+
+@dataclass(slots=True)
+class Player:
+    name: str = "Adventurer"
+    health: int = 100
+    gold: int = 0
+    location: str = "village"
+
+
+@dataclass(slots=True)
+class Combat:
+    in_combat: bool = False
+    enemy: Optional[str] = None
+
+
+@dataclass(slots=True)
+class Inventory:
+    """Item ids in pickup order; behaves like a list of item names"""
+    ids: array = field(default_factory=lambda: array("H"))
+
+    @classmethod
+    def of(cls, names: Iterable[str]) -> "Inventory":
+        return cls(array("H", (item_id(name) for name in names)))
+
+    def append(self, name: str):
+        self.ids.append(item_id(name))
+
+    def remove(self, name: str):
+        self.ids.remove(item_id(name))
+
+    def names(self) -> List[str]:
+        return [_ITEM_NAMES[index] for index in self.ids]
+
+    def copy(self) -> "Inventory":
+        return Inventory(array("H", self.ids))
+
+    def __iter__(self) -> Iterator[str]:
+        return (_ITEM_NAMES[index] for index in self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, name):
+        index = _ITEM_IDS.get(name)
+        return index is not None and index in self.ids
+
+    def __getitem__(self, position: int) -> str:
+        return _ITEM_NAMES[self.ids[position]]
+
+    def __repr__(self):
+        return repr(self.names())
+
+
+# Flat field names and the part that holds each one
+FIELDS = ("name", "health", "gold", "location", "inventory", "in_combat", "enemy", "quest", "current_agent")
+_PART = {"name": "player", "health": "player", "gold": "player", "location": "player",
+         "inventory": "inventory", "in_combat": "combat", "enemy": "combat",
+         "quest": None, "current_agent": None}
+_PART_BITS = {"player": 1, "inventory": 2, "combat": 4}
+_ALL_PARTS = 7
+_KEY_JSON = {key: encode_basestring_ascii(key) + ": " for key in FIELDS}
+
+
+def _json_value(value) -> str:
+    """json.dumps for the value types game state holds, without its per-call overhead"""
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if value is None:
+        return "null"
+    if isinstance(value, str):
+        return encode_basestring_ascii(value)
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        return "[" + ", ".join(map(encode_basestring_ascii, value)) + "]"
+    return json.dumps(value)
+
+
+class GameState:
+    """One session's game state
+
+    state["health"] -= 20, state["inventory"] and {**state} work as with a dict; the inventory
+    read that way may be shared with a snapshot, so items change through add_item()/remove_item().
+    snapshot() is O(1): parts are shared until either side writes to them.
+    """
+
+    __slots__ = ("player", "inventory", "combat", "quest", "current_agent", "_shared", "_fragments")
+
+    def __init__(self, player: Player = None, inventory: Inventory = None, combat: Combat = None,
+                 quest: Optional[str] = None, current_agent: Optional[str] = None):
+        self.player = player if player is not None else Player()
+        self.inventory = inventory if inventory is not None else Inventory()
+        self.combat = combat if combat is not None else Combat()
+        self.quest = quest
+        self.current_agent = current_agent
+        self._shared = 0       # bitmask of parts shared with a snapshot
+        self._fragments = None  # field -> cached JSON fragment
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, Any]) -> "GameState":
+        """Build from a flat dict (or the older nested {"player": {...}} form)"""
+        values = {**values, **values.get("player", {})}
+        return cls(
+            Player(**{key: values[key] for key in ("name", "health", "gold", "location") if key in values}),
+            Inventory.of(values.get("inventory", ())),
+            Combat(values.get("in_combat", False), values.get("enemy")),
+            values.get("quest"),
+            values.get("current_agent"),
+        )
+
+    # Dict-style access
+    def keys(self):
+        return FIELDS
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def __contains__(self, key):
+        return key in _PART
+
+    def __getitem__(self, key: str):
+        part = _PART.get(key, KeyError)
+        if part is None:
+            return getattr(self, key)
+        if part is KeyError:
+            raise KeyError(key)
+        if part == "inventory":
+            return self.inventory
+        return getattr(getattr(self, part), key)
+
+    def __setitem__(self, key: str, value):
+        part = _PART.get(key, KeyError)
+        if part is KeyError:
+            raise KeyError(key)
+        if part is None:
+            setattr(self, key, value)
+        elif part == "inventory":
+            self.inventory = value if isinstance(value, Inventory) else Inventory.of(value)
+            self._shared &= ~_PART_BITS["inventory"]
+        else:
+            setattr(self._own(part), key, value)
+        if self._fragments:
+            self._fragments.pop(key, None)
+
+    def add_item(self, name: str):
+        self._own("inventory").append(name)
+
+    def remove_item(self, name: str):
+        self._own("inventory").remove(name)
+
+    def get(self, key: str, default=None):
+        return self[key] if key in _PART else default
+
+    def items(self):
+        return [(key, self[key]) for key in FIELDS]
+
+    def to_dict(self) -> Dict[str, Any]:
+        values = {key: getattr(self.player, key) for key in ("name", "health", "gold", "location")}
+        values["inventory"] = self.inventory.names()
+        values["in_combat"] = self.combat.in_combat
+        values["enemy"] = self.combat.enemy
+        values["quest"] = self.quest
+        values["current_agent"] = self.current_agent
+        return values
+
+    # Copy-on-write snapshots
+    def _own(self, part: str):
+        """Return a part this state may modify, copying it first if a snapshot shares it"""
+        value = getattr(self, part)
+        bit = _PART_BITS[part]
+        if self._shared & bit:
+            value = value.copy() if part == "inventory" else replace(value)
+            setattr(self, part, value)
+            self._shared &= ~bit
+        if part == "inventory" and self._fragments:
+            self._fragments.pop("inventory", None)
+        return value
+
+    def snapshot(self) -> "GameState":
+        """Cheap frozen copy, e.g. of the state at the start of a turn"""
+        self._shared = _ALL_PARTS
+        copy = GameState(self.player, self.inventory, self.combat, self.quest, self.current_agent)
+        copy._shared = _ALL_PARTS
+        return copy
+
+    # Deltas
+    def diff(self, before: "GameState") -> Dict[str, Any]:
+        """Fields that differ from an earlier snapshot (parts still shared are skipped)"""
+        changes = {}
+        if self.player is not before.player:
+            for key in ("name", "health", "gold", "location"):
+                value = getattr(self.player, key)
+                if value != getattr(before.player, key):
+                    changes[key] = value
+        if self.inventory is not before.inventory and self.inventory.ids != before.inventory.ids:
+            changes["inventory"] = self.inventory.names()
+        if self.combat is not before.combat:
+            for key in ("in_combat", "enemy"):
+                value = getattr(self.combat, key)
+                if value != getattr(before.combat, key):
+                    changes[key] = value
+        for key in ("quest", "current_agent"):
+            value = getattr(self, key)
+            if value != getattr(before, key):
+                changes[key] = value
+        return changes
+
+    def apply(self, changes: Dict[str, Any]):
+        for key, value in changes.items():
+            self[key] = value
+
+    # Encoding
+    def to_json(self, skip_empty: bool = True, fields: Iterable[str] = FIELDS) -> str:
+        """JSON for prompts (optionally a subset of fields); only fields changed since the last call are re-encoded"""
+        if self._fragments is None:
+            self._fragments = {}
+        fragments = self._fragments
+        parts = []
+        for key in fields:
+            fragment = fragments.get(key)
+            if fragment is None:
+                value = self.inventory.names() if key == "inventory" else self[key]
+                empty = value is None or value is False or value == ""
+                fragment = fragments[key] = "" if skip_empty and empty else _KEY_JSON[key] + _json_value(value)
+            if fragment:
+                parts.append(fragment)
+        return "{" + ", ".join(parts) + "}"
+
+    def to_state(self) -> list:
+        """Compact positional form for session persistence (item names, not process-local ids)"""
+        player, combat = self.player, self.combat
+        return [player.name, player.health, player.gold, player.location, self.inventory.names(),
+                combat.in_combat, combat.enemy, self.quest, self.current_agent]
+
+    @classmethod
+    def from_state(cls, values: list) -> "GameState":
+        name, health, gold, location, inventory, in_combat, enemy, quest, current_agent = values
+        return cls(Player(name, health, gold, location), Inventory.of(inventory), Combat(in_combat, enemy),
+                   quest, current_agent)
+
+    def __eq__(self, other):
+        if not isinstance(other, GameState):
+            return NotImplemented
+        return not self.diff(other)
+
+    def __repr__(self):
+        return f"GameState({self.to_dict()!r})"
+
+
+def add_item(game_state, name: str):
+    """Add an item to a GameState (copying a shared inventory first) or to a plain state dict"""
+    if isinstance(game_state, GameState):
+        game_state.add_item(name)
+    else:
+        game_state["inventory"].append(name)
+
+
+def coerce(value) -> GameState:
+    """GameState for a stored value (records saved before typed state held plain dicts)"""
+    return value if isinstance(value, GameState) else GameState.from_dict(value)
@@ -0,0 +1,122 @@
+"""
+Per-session background task supervisor
+UI sends and post-turn work (flavor text, handoff notices) run as supervised tasks instead of on
+the turn's critical path: references are kept, failures are logged and counted, background work is
+bounded per session, UI operations keep their order (in their own lane, which background work
+cannot hold up), and session end flushes or cancels them
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, Any, Coroutine, Optional, Set
+import metrics
+
+# Background tasks running at once per chat session (more wait their turn; UI sends are not counted)
+LIMIT = int(os.getenv("TASK_LIMIT", "4"))
+# Seconds session end waits for pending tasks before cancelling them
+FLUSH_TIMEOUT = float(os.getenv("TASK_FLUSH_TIMEOUT", "5"))
+
+PENDING = metrics.gauge("game_background_tasks", "Background tasks pending, by kind")
+TASKS = metrics.counter("game_background_tasks_total", "Background tasks finished, by kind and outcome")
+TASK_SECONDS = metrics.histogram("game_background_task_seconds",
+                                 "Run time of background tasks (for UI sends, time kept off the turn's critical path)")
+
+_pending: Dict[str, int] = {}
+
+
+class Supervisor:
+    """Background tasks of one chat session"""
+
+    def __init__(self, session: Optional[str], limit: int = LIMIT):
+        self.session = session
+        self.semaphore = asyncio.Semaphore(limit)
+        self.tasks: Set[asyncio.Task] = set()
+        self.ui_tail: Optional[asyncio.Task] = None
+
+    def spawn(self, coro: Coroutine, kind: str = "task", bounded: bool = True) -> asyncio.Task:
+        """Run coro in the background; await the returned task to use its result"""
+        task = asyncio.create_task(self._run(coro, bounded))
+        self.tasks.add(task)
+        _pending[kind] = _pending.get(kind, 0) + 1
+        PENDING.set(_pending[kind], kind=kind)
+        started = time.perf_counter()
+        task.add_done_callback(lambda done: self._done(done, kind, started))
+        return task
+
+    def ui(self, coro: Coroutine) -> asyncio.Task:
+        """Send or update a message after the session's earlier UI operations, without waiting for it"""
+        previous = self.ui_tail
+
+        async def ordered():
+            if previous is not None and not previous.done():
+                await asyncio.wait((previous,))  # ordering only; its failure is reported on its own
+            return await coro
+
+        # Outside the semaphore: the player's messages never wait behind flavor text or indexing
+        self.ui_tail = self.spawn(ordered(), "ui", bounded=False)
+        return self.ui_tail
+
+    async def _run(self, coro: Coroutine, bounded: bool):
+        try:
+            if not bounded:
+                return await coro
+            async with self.semaphore:
+                return await coro
+        finally:
+            coro.close()  # a no-op once it has run; stops one cancelled before it started
+
+    def _done(self, task: asyncio.Task, kind: str, started: float):
+        self.tasks.discard(task)
+        _pending[kind] -= 1
+        PENDING.set(_pending[kind], kind=kind)
+        if task.cancelled():
+            outcome = "cancelled"
+        elif task.exception() is not None:
+            outcome = "error"
+            print(f"[WARN] Background {kind} task failed: {task.exception()!r}")
+        else:
+            outcome = "ok"
+            TASK_SECONDS.observe(time.perf_counter() - started, kind=kind)
+        TASKS.inc(kind=kind, outcome=outcome)
+
+    async def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait for pending tasks (including ones they start); False if the timeout ran out first"""
+        while self.tasks:
+            done, pending = await asyncio.wait(set(self.tasks), timeout=timeout)
+            if pending:
+                return False
+        return True
+
+    def cancel(self):
+        for task in list(self.tasks):
+            task.cancel()
+
+    async def close(self, timeout: float = FLUSH_TIMEOUT):
+        """Let pending work finish for up to `timeout` seconds, then cancel the rest"""
+        if not await self.flush(timeout):
+            self.cancel()
+            if self.tasks:
+                await asyncio.wait(set(self.tasks), timeout=1.0)
+
+
+_supervisors: Dict[Optional[str], Supervisor] = {}
+
+
+def get(session: Optional[str]) -> Supervisor:
+    """The supervisor for a chat session (created on first use, dropped by close() at session end)"""
+    supervisor = _supervisors.get(session)
+    if supervisor is None:
+        supervisor = _supervisors[session] = Supervisor(session)
+    return supervisor
+
+
+async def close(session: Optional[str], timeout: float = FLUSH_TIMEOUT):
+    """Flush, then cancel, a session's background work (call on session end)"""
+    supervisor = _supervisors.pop(session, None)
+    if supervisor is not None:
+        await supervisor.close(timeout)
+
+
+def report() -> Dict[str, Any]:
+    return {"sessions": len(_supervisors), "pending": dict(_pending)}
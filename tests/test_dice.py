@@ -0,0 +1,48 @@
+"""
+Tests: a session roller's persisted state reproduces its rolls
+
+Usage: python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dice
+
+
+class RollerStateTest(unittest.TestCase):
+    def test_state_round_trip_after_bulk_draws(self):
+        roller = dice.DiceRoller(seed=11)
+        table = dice.AliasTable(["a", "b", "c"], [3, 2, 1])
+        roller.ints(20, 10)
+        roller.bulk(20, 100)
+        roller.ints(6, 5)
+        table.sample_many(50, roller)
+
+        restored = dice.DiceRoller.from_state(roller.to_state())
+        self.assertEqual([restored.randint(20) for _ in range(3000)], [roller.randint(20) for _ in range(3000)])
+        self.assertEqual(list(restored.bulk(6, 20)), list(roller.bulk(6, 20)))
+        self.assertEqual(restored.to_state(), roller.to_state())
+
+    def test_bulk_draws_leave_single_rolls_alone(self):
+        plain = dice.DiceRoller(seed=11)
+        mixed = dice.DiceRoller(seed=11)
+        expected = [plain.randint(20) for _ in range(20)]
+        rolls = [mixed.randint(20) for _ in range(10)]
+        mixed.bulk(20, 100)
+        dice.AliasTable(["a", "b"]).sample_many(10, mixed)
+        rolls += [mixed.randint(20) for _ in range(10)]
+        self.assertEqual(rolls, expected)
+
+    def test_three_value_state_still_loads(self):
+        roller = dice.DiceRoller(seed=5)
+        roller.ints(20, 7)
+        restored = dice.DiceRoller.from_state(roller.to_state()[:3])
+        self.assertEqual(restored.randint(20), roller.randint(20))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+"""
+Tests: local turn routing for main.py and the combat state it reads
+
+Usage: python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+os.environ.update({"METRICS_PORT": "", "WARM_START": "off", "SESSION_STORE": "memory", "TURN_LOG": "",
+                   "MODEL_ROUTER": "off", "GAME_WORLD": "off"})
+os.environ.setdefault("OPENROUTER_API_KEY", "test")
+
+import fake_chainlit
+fake_chainlit.install()
+
+import dice
+import intent
+import main
+from compaction import ChatHistory
+
+
+class CombatRoutingTest(unittest.TestCase):
+    def setUp(self):
+        self.state = main.get_initial_game_state()
+        self.history = ChatHistory()
+        dice.use(dice.DiceRoller.for_session("test-combat"))
+
+    def route(self, action: str, current: str) -> str:
+        return main.route_turn(action, self.state, self.history, current)
+
+    def test_picking_monster_agent_does_not_start_combat(self):
+        self.assertEqual(self.route("I attack the wolf", "NarratorAgent"), "MonsterAgent")
+        main.update_combat(self.state, {}, "MonsterAgent")
+        self.assertFalse(self.state["in_combat"])
+        self.assertEqual(self.route("hmm", "MonsterAgent"), "GameMasterAgent")
+
+    def test_combat_ends(self):
+        main.update_combat(self.state, {"enemy": "bandits"}, "NarratorAgent")
+        self.assertTrue(self.state["in_combat"])
+        self.assertEqual(self.route("hmm", "NarratorAgent"), "MonsterAgent")
+
+        main.update_combat(self.state, {"combat_rolls": [3, 15]}, "MonsterAgent")  # the enemy wins the round
+        self.assertEqual(self.route("hmm", "MonsterAgent"), "MonsterAgent")
+
+        main.update_combat(self.state, {"combat_rolls": [15, 3]}, "MonsterAgent")
+        self.assertFalse(self.state["in_combat"])
+        self.assertIsNone(self.state["enemy"])
+        self.assertEqual(self.route("hmm", "MonsterAgent"), "GameMasterAgent")
+
+    def test_combat_ends_with_session_dice(self):
+        main.update_combat(self.state, {"enemy": "beast"}, "GameMasterAgent")
+        for _ in range(200):
+            facts = {}
+            main.update_combat(self.state, facts, "MonsterAgent")
+            self.assertEqual(len(facts["combat_rolls"]), 2)
+            if not self.state["in_combat"]:
+                break
+        self.assertFalse(self.state["in_combat"])
+        self.assertEqual(intent.classify("hmm", self.state).method, "ambiguous")
+
+
+if __name__ == "__main__":
+    unittest.main()
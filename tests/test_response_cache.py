@@ -0,0 +1,83 @@
+"""
+Tests: response cache keys
+
+Usage: python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import response_cache
+from response_cache import ResponseCache
+
+STATE = {"location": "forest", "health": 100, "inventory": ["sword", "potion"]}
+TEMPLATE = "Location: forest. Health: 100. Event: A fork in the road. Player action: {action}"
+SCENE = "The road forks.\n1. Take path 1 into the hills\n2. Take path 2 along the river"
+
+
+class NumberedChoiceTest(unittest.TestCase):
+    def cache(self, similarity: float = 0.0) -> ResponseCache:
+        return ResponseCache(similarity_threshold=similarity, variety=0.0)
+
+    def store(self, cache: ResponseCache, action: str, story: str, scene: str = SCENE):
+        cache.put("NarratorAgent", TEMPLATE.format(action=action), STATE, story, action=action, scene=scene)
+
+    def lookup(self, cache: ResponseCache, action: str, scene: str = SCENE):
+        return cache.get("NarratorAgent", TEMPLATE.format(action=action), STATE, action=action, scene=scene)
+
+    def test_distinct_numbered_choices_miss(self):
+        for similarity in (0.0, 0.5):
+            cache = self.cache(similarity)
+            self.store(cache, "1", "You climb into the hills.")
+            self.store(cache, "take path 1", "You climb into the hills.")
+            self.assertIsNone(self.lookup(cache, "2"))
+            self.assertIsNone(self.lookup(cache, "take path 2"))
+            self.assertEqual(self.lookup(cache, "1"), "You climb into the hills.")
+
+    def test_same_action_in_another_scene_misses(self):
+        cache = self.cache(0.5)
+        self.store(cache, "I look around", "Hills rise to the north.")
+        self.assertIsNone(self.lookup(cache, "I look around", scene="You stand in a flooded cave."))
+        self.assertEqual(self.lookup(cache, "I look around"), "Hills rise to the north.")
+
+    def test_rewording_still_near_matches(self):
+        cache = self.cache(0.5)
+        self.store(cache, "I look around", "Hills rise to the north.")
+        self.assertEqual(self.lookup(cache, "I look around carefully"), "Hills rise to the north.")
+
+
+class BackendTest(unittest.TestCase):
+    def test_memory_buckets_follow_puts_and_evictions(self):
+        cache = ResponseCache(max_bytes=300, similarity_threshold=0.5, variety=0.0)
+        for n in range(20):
+            cache.put("NarratorAgent", f"I look around the room {n}", {"location": f"room {n % 4}"}, "x" * 40)
+        backend = cache.backend
+        self.assertEqual(sum(len(members) for members in backend.buckets.values()), len(backend))
+        for bucket, members in backend.buckets.items():
+            self.assertEqual({key for key in members}, {key for key, entry in backend.entries.items()
+                                                        if entry["bucket"] == bucket})
+
+    def test_sqlite_hits_do_not_commit(self):
+        directory = tempfile.mkdtemp()
+        backend = response_cache.SqliteBackend(os.path.join(directory, "cache.db"))
+        self.addCleanup(backend.db.close)
+        cache = ResponseCache(backend, max_bytes=150, variety=0.0)
+        self.assertIs(cache.backend, backend)
+        cache.put("NarratorAgent", "I rest", STATE, "a" * 60)
+        cache.put("NarratorAgent", "I wait", STATE, "b" * 60)
+        accessed = backend.db.execute("SELECT key, accessed FROM responses").fetchall()
+        self.assertEqual(cache.get("NarratorAgent", "I rest", STATE), "a" * 60)
+        self.assertFalse(backend.db.in_transaction)
+        self.assertEqual(backend.db.execute("SELECT key, accessed FROM responses").fetchall(), accessed)
+
+        cache.put("NarratorAgent", "I sing", STATE, "c" * 60)  # evicts the least recently used: "I wait"
+        self.assertIsNone(cache.get("NarratorAgent", "I wait", STATE))
+        self.assertEqual(cache.get("NarratorAgent", "I rest", STATE), "a" * 60)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+"""
+Tests: session records are private to the turn that loaded them
+
+Usage: python -m unittest discover tests
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+os.environ.update({"METRICS_PORT": "", "WARM_START": "off", "SESSION_STORE": "memory", "TURN_LOG": "",
+                   "RESPONSE_CACHE": "off", "GAME_SPECULATE": "off", "MODEL_ROUTER": "off", "GAME_WORLD": "off",
+                   "GAME_MEMORY": "off"})
+
+import fake_chainlit
+fake_chainlit.install()
+
+import app
+import engine
+import session_store
+import supervisor
+
+STORY = "You find a key."
+TREASURE = {"type": "treasure", "item": "silver key", "description": "A glint in the grass."}
+
+
+class MemoryBackendTest(unittest.IsolatedAsyncioTestCase):
+    async def test_load_returns_a_copy(self):
+        store = session_store.SessionStore(session_store.MemoryBackend())
+        version = await store.save("k", app.new_session_record("k"), 0)
+        loaded, _ = await store.load("k")
+        loaded["game_state"]["inventory"].append("stolen")
+        again, loaded_version = await store.load("k")
+        self.assertEqual(loaded_version, version)
+        self.assertNotIn("stolen", again["game_state"]["inventory"])
+
+
+class WriteBehindTest(unittest.IsolatedAsyncioTestCase):
+    async def test_stale_save_conflicts_with_pending_write(self):
+        store = session_store.SessionStore(session_store.MemoryBackend(), write_behind=60)
+        await store.save("k", {"turn": 0}, 0)
+        await store.flush()
+        first, version = await store.load("k")
+        second, second_version = await store.load("k")
+        first["turn"] = 1
+        await store.save("k", first, version)
+        second["turn"] = 2
+        with self.assertRaises(session_store.VersionConflict):
+            await store.save("k", second, second_version)
+        self.assertEqual(store.stats["conflicts"], 1)
+        await store.close()
+        saved, saved_version = await store.backend.load("k")
+        self.assertEqual(saved, {"turn": 1})
+        self.assertEqual(saved_version, version + 1)
+
+
+class RedisPoolTest(unittest.IsolatedAsyncioTestCase):
+    async def test_failed_connect_gives_back_its_slot(self):
+        backend = session_store.RedisBackend("redis://127.0.0.1:1/0", pool_size=1)
+        for _ in range(3):
+            with self.assertRaises(OSError):
+                await asyncio.wait_for(backend.load("k"), timeout=1.0)
+        self.assertEqual(backend.opened, 0)
+
+    async def test_connection_broken_mid_reply_is_not_reused(self):
+        async def half_reply(reader, writer):
+            await reader.readline()
+            writer.write(b"$10\r\nabc")
+            await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(half_reply, "127.0.0.1", 0)
+        self.addAsyncCleanup(server.wait_closed)
+        self.addCleanup(server.close)
+        port = server.sockets[0].getsockname()[1]
+        backend = session_store.RedisBackend(f"redis://127.0.0.1:{port}/0", pool_size=1)
+        with self.assertRaises(asyncio.IncompleteReadError):
+            await backend.load("k")
+        self.assertEqual(backend.opened, 0)
+        self.assertIsNone(backend.pool.get_nowait())
+
+
+class ConcurrentTurnsTest(unittest.IsolatedAsyncioTestCase):
+    async def test_failed_turn_keeps_the_other_turns_commit(self):
+        """Two windows of one player: turn A fails while turn B commits in between"""
+        release_a = asyncio.Event()
+
+        async def chunks():
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=STORY))])
+
+        async def stub_acompletion(messages=(), stream=False, **kwargs):
+            if "slow and doomed" in messages[-1]["content"]:
+                await release_a.wait()
+                raise RuntimeError("model unavailable")
+            if stream:
+                return chunks()
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=STORY))])
+
+        engine.litellm.acompletion = stub_acompletion
+        generate_event = app.generate_event
+        app.generate_event = lambda: dict(TREASURE)
+        self.addCleanup(setattr, app, "generate_event", generate_event)
+
+        async def window(session_id: str, action: str, started: asyncio.Event = None):
+            fake_chainlit.use_session(session_id)
+            fake_chainlit.UserSession().set("user", SimpleNamespace(identifier="same-player"))
+            await app.start()
+            if started is not None:
+                started.set()
+            await app.main(fake_chainlit.Message(content=action))
+            await supervisor.close(session_id)
+
+        a_started = asyncio.Event()
+        turn_a = asyncio.create_task(window("window-a", "I wait, slow and doomed", a_started))
+        await a_started.wait()
+        await asyncio.sleep(0.01)  # A has loaded its record and is waiting on the model
+        await asyncio.create_task(window("window-b", "I search the grass"))
+
+        store = session_store.get_store()
+        committed, version = await store.load("user:same-player")
+        self.assertEqual(committed["game_state"]["current_agent"], "ItemAgent")
+        self.assertIn("silver key", committed["game_state"]["inventory"])
+
+        release_a.set()
+        await turn_a
+        after, after_version = await store.load("user:same-player")
+        self.assertEqual(after_version, version)
+        self.assertEqual(after["game_state"]["current_agent"], "ItemAgent")
+        self.assertIn("silver key", after["game_state"]["inventory"])
+
+
+if __name__ == "__main__":
+    unittest.main()
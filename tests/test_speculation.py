@@ -0,0 +1,63 @@
+"""
+Tests: speculations are only taken from the state they were made in
+
+Usage: python -m unittest discover tests
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("METRICS_PORT", "")
+
+import speculation
+from conversation import ConversationStore
+
+STATE = {"location": "forest", "health": 100, "inventory": ["sword"], "current_agent": "NarratorAgent"}
+CHOICES = ["Take path 1 into the hills", "Take path 2 along the river"]
+
+
+class FingerprintTest(unittest.IsolatedAsyncioTestCase):
+    def full_history(self) -> ConversationStore:
+        history = ConversationStore({"NarratorAgent": 4})
+        for n in range(4):
+            history.append("NarratorAgent", "user" if n % 2 == 0 else "assistant", f"turn {n}")
+        return history
+
+    async def story(self) -> str:
+        return "You climb into the hills."
+
+    def start(self, speculator: speculation.Speculator, history: ConversationStore):
+        speculator.start("s", speculation.fingerprint(STATE, history), CHOICES,
+                         lambda choice: speculation.Speculation("NarratorAgent", choice, {}, choice,
+                                                                asyncio.create_task(self.story()), 10))
+
+    def test_fingerprint_changes_on_a_full_buffer(self):
+        history = self.full_history()
+        before = speculation.fingerprint(STATE, history)
+        history.append("NarratorAgent", "user", "I wait")
+        self.assertEqual(len(history), 4)
+        self.assertNotEqual(speculation.fingerprint(STATE, history), before)
+        self.assertEqual(speculation.fingerprint(dict(STATE, current_agent="MonsterAgent"), history),
+                         speculation.fingerprint(STATE, history))
+
+    async def test_stale_speculation_discarded_when_history_advances(self):
+        speculator = speculation.Speculator()
+        history = self.full_history()
+        self.start(speculator, history)
+        history.append("NarratorAgent", "user", "I wait")
+        history.append("NarratorAgent", "assistant", "Nothing happens.")
+        self.assertIsNone(speculator.take("s", "1", speculation.fingerprint(STATE, history)))
+        self.assertEqual(speculator.stats["stale"], 1)
+
+        self.start(speculator, history)
+        taken = speculator.take("s", "1", speculation.fingerprint(STATE, history))
+        self.assertIsNotNone(taken)
+        self.assertEqual(await taken.task, "You climb into the hills.")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+"""
+Tests: copy-on-write game state snapshots
+
+Usage: python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rules
+from state import GameState
+
+START = {"health": 100, "inventory": ["sword", "potion"], "location": "village", "current_agent": "NarratorAgent"}
+
+
+class SnapshotTest(unittest.TestCase):
+    def test_reading_inventory_does_not_copy(self):
+        state = GameState.from_dict(START)
+        encoded = state.to_json()
+        before = state.snapshot()
+        self.assertIn("sword", state["inventory"])
+        self.assertEqual(", ".join(state["inventory"]), "sword, potion")
+        self.assertIs(state.inventory, before.inventory)
+        self.assertIn("inventory", state._fragments)
+        self.assertEqual(state.to_json(), encoded)
+
+    def test_adding_an_item_leaves_the_snapshot(self):
+        state = GameState.from_dict(START)
+        state.to_json()
+        before = state.snapshot()
+        rules.apply_event(state, {"type": "treasure", "item": "magic ring"})
+        self.assertEqual(before["inventory"].names(), ["sword", "potion"])
+        self.assertEqual(state.diff(before), {"inventory": ["sword", "potion", "magic ring"]})
+        self.assertIn('"magic ring"', state.to_json())
+        state.remove_item("sword")
+        self.assertEqual(state["inventory"].names(), ["potion", "magic ring"])
+        self.assertEqual(before["inventory"].names(), ["sword", "potion"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+"""
+Tests: per-session background task supervisor
+
+Usage: python -m unittest discover tests
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import supervisor
+
+
+class UiLaneTest(unittest.IsolatedAsyncioTestCase):
+    async def test_ui_not_held_up_by_background_work(self):
+        tasks = supervisor.Supervisor("test-ui", limit=supervisor.LIMIT)
+        release = asyncio.Event()
+        blocked = [tasks.spawn(release.wait(), "flavor") for _ in range(supervisor.LIMIT)]
+        queued = tasks.spawn(release.wait(), "memory")
+        await asyncio.sleep(0)
+
+        shown = []
+
+        async def send(text):
+            shown.append(text)
+
+        await asyncio.wait_for(tasks.ui(send("result")), timeout=0.5)
+        self.assertEqual(shown, ["result"])
+        self.assertFalse(any(task.done() for task in blocked + [queued]))
+
+        release.set()
+        self.assertTrue(await tasks.flush(1.0))
+
+    async def test_ui_keeps_order(self):
+        tasks = supervisor.Supervisor("test-order")
+        shown = []
+
+        async def send(text, delay):
+            await asyncio.sleep(delay)
+            shown.append(text)
+
+        tasks.ui(send("thinking", 0.02))
+        tasks.ui(send("result", 0))
+        await tasks.flush(1.0)
+        self.assertEqual(shown, ["thinking", "result"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+"""
+Tests: worlds saved by several processes to one store
+
+Usage: python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("METRICS_PORT", "")
+
+import session_store
+import world
+
+
+class SharedSaveTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        save_interval = world.SAVE_INTERVAL
+        world.SAVE_INTERVAL = 0
+        self.addCleanup(setattr, world, "SAVE_INTERVAL", save_interval)
+
+    async def process_world(self, store) -> world.World:
+        shared = world.build(world.DEFAULT_WORLD, publish_interval=None)
+        await shared.restore(store, "world:test")
+        return shared
+
+    async def test_conflicting_save_merges_the_other_process(self):
+        store = session_store.SessionStore(session_store.MemoryBackend())
+        first = await self.process_world(store)
+        second = await self.process_world(store)
+
+        first.place("map", "village")
+        first.post("village", "Ana hung a map on the well.", "a")
+        first.publish()
+        await first.saving
+
+        second.place("rope", "forest")
+        second.post("forest", "Bo left a rope by the pines.", "b")
+        second.publish()
+        await second.saving
+
+        record, _ = await store.load("world:test")
+        saved = {row[0]: row[4] for row in record["world"]["entities"]}
+        self.assertEqual(saved["map"], "village")
+        self.assertEqual(saved["rope"], "forest")
+        self.assertEqual({row[2] for row in record["world"]["news"]},
+                         {"Ana hung a map on the well.", "Bo left a rope by the pines."})
+
+        snapshot = second.snapshot
+        self.assertEqual(snapshot.entities["map"].location, "village")
+        self.assertEqual([event.text for event in snapshot.news_since("village", 0, exclude="b")],
+                         ["Ana hung a map on the well."])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,208 @@
+"""
+Turn log
+Compact append-only record of played turns (input, dice state, tool facts, model outputs, chosen
+agents, the state before the turn and its delta), queued by the turn and written by a background
+task; benchmarks/replay.py re-executes logged turns against the recorded model outputs
+
+File layout: MAGIC, then frames of <payload length u32><session key length u16><session key><payload>,
+payloads in the session store's codec; a frame with an empty session key is a header
+"""
+
+import asyncio
+import atexit
+import contextvars
+import mmap
+import os
+import struct
+import time
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import metrics
+import session_store
+
+# TURN_LOG=path enables logging ("{pid}" in the path is replaced, one file per worker)
+PATH = os.getenv("TURN_LOG", "")
+# Records waiting to be written; turns are dropped (and counted) rather than slowed down past this
+QUEUE_LIMIT = int(os.getenv("TURN_LOG_QUEUE", "10000"))
+BATCH = 256
+
+MAGIC = b"GTLOG1\n"
+_FRAME = struct.Struct("<IH")
+
+RECORDS = metrics.counter("game_turn_log_records_total", "Turn log records by outcome (written/dropped)")
+
+# The turn being recorded in the current task, if any
+_current = contextvars.ContextVar("turn_log_turn", default=None)
+
+
+def frame(session: str, payload: bytes) -> bytes:
+    key = session.encode()
+    return _FRAME.pack(len(payload), len(key)) + key + payload
+
+
+class TurnLog:
+    """Queues records from turns; a background task encodes and appends them in a thread"""
+
+    def __init__(self, path: str, header: Dict[str, Any], queue_limit: int = QUEUE_LIMIT):
+        self.path = path
+        self.header = header
+        self.queue_limit = queue_limit
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.file = None
+        self.written = 0
+        self.dropped = 0
+
+    def put(self, record: Dict[str, Any]):
+        """Queue a record without waiting (the writer starts with the first one)"""
+        if self.queue is None:
+            self.queue = asyncio.Queue(self.queue_limit)
+            self.task = asyncio.create_task(self._writer())
+        try:
+            self.queue.put_nowait(record)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            RECORDS.inc(outcome="dropped")
+
+    async def _writer(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < BATCH and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                print(f"[WARN] Turn log write failed, {len(batch)} records lost: {e}")
+            for _ in batch:
+                self.queue.task_done()
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        if self.file is None:
+            new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            self.file = open(self.path, "ab")
+            # Each process appends its own header, so a file can hold several runs
+            self.file.write((MAGIC if new else b"") + frame("", session_store.encode(self.header)))
+        self.file.write(b"".join(frame(record["s"], session_store.encode(record)) for record in batch))
+        self.file.flush()
+        self.written += len(batch)
+        RECORDS.inc(len(batch), outcome="written")
+
+    async def flush(self):
+        """Wait until every queued record is written"""
+        if self.queue is not None:
+            await self.queue.join()
+
+    def close(self):
+        """Write what is still queued (synchronously) and close the file"""
+        if self.task is not None:
+            self.task.cancel()
+        batch = []
+        while self.queue is not None and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        if batch:
+            self._write(batch)
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+_log: Optional[TurnLog] = None
+
+
+def configure(app: str, **settings) -> Optional[TurnLog]:
+    """Log this entry point's turns to TURN_LOG, if set; settings (e.g. modes) go into the header"""
+    global _log
+    if PATH and _log is None:
+        _log = TurnLog(PATH.replace("{pid}", str(os.getpid())),
+                       {"version": 1, "app": app, "created": time.time(), "pid": os.getpid(), **settings})
+        atexit.register(_log.close)
+    return _log
+
+
+def begin(session: str, action: str, agent: str, before, dice_state: Optional[list] = None) -> Optional[Dict]:
+    """Start recording a turn (None when logging is off); `before` is the state at the start of the turn"""
+    if _log is None:
+        return None
+    turn = {"s": session, "t": round(time.time(), 3), "in": action, "agent": agent, "state": before.to_state(),
+            "dice": dice_state, "facts": None, "out": []}
+    _current.set(turn)
+    return turn
+
+
+def note_facts(facts: Dict[str, Any]):
+    """Tool results (dice rolls, events) the current turn was played with"""
+    turn = _current.get()
+    if turn is not None:
+        turn["facts"] = facts
+
+
+def note_output(text: str):
+    """A model output (or cached/speculated story) the current turn used"""
+    turn = _current.get()
+    if turn is not None:
+        turn["out"].append(text)
+
+
+def end(turn: Optional[Dict], next_agent: str, delta: Dict[str, Any], seconds: float):
+    """Finish a turn and queue its record (turns that fail are not logged)"""
+    if turn is None:
+        return
+    turn["next"] = next_agent
+    turn["delta"] = delta
+    turn["ms"] = round(seconds * 1000, 3)
+    _current.set(None)
+    _log.put(turn)
+
+
+class LogReader:
+    """Memory-mapped reader; frames can be indexed by session without decoding their payloads"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a turn log")
+
+    def frames(self) -> Iterator[Tuple[int, str]]:
+        """(offset, session key) of every complete frame; headers have an empty key"""
+        data = self.map
+        pos, end = len(MAGIC), len(data)
+        while pos + _FRAME.size <= end:
+            length, key_length = _FRAME.unpack_from(data, pos)
+            stop = pos + _FRAME.size + key_length + length
+            if stop > end:
+                break  # torn final write
+            yield pos, data[pos + _FRAME.size:pos + _FRAME.size + key_length].decode()
+            pos = stop
+
+    def record_at(self, offset: int) -> Dict[str, Any]:
+        length, key_length = _FRAME.unpack_from(self.map, offset)
+        start = offset + _FRAME.size + key_length
+        return session_store.decode(self.map[start:start + length])
+
+    def headers(self) -> List[Dict[str, Any]]:
+        return [self.record_at(offset) for offset, session in self.frames() if not session]
+
+    def index(self) -> Dict[str, List[int]]:
+        """Record offsets per session, in log order"""
+        sessions: Dict[str, List[int]] = {}
+        for offset, session in self.frames():
+            if session:
+                sessions.setdefault(session, []).append(offset)
+        return sessions
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for offset, session in self.frames():
+            if session:
+                yield self.record_at(offset)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
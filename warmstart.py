@@ -0,0 +1,208 @@
+"""
+Warm start for chat workers
+Heavy provider libraries are imported lazily and warmed in a background thread (WARM_START),
+a readiness probe reports when the worker is warm, and the prefork launcher imports everything
+once and forks workers that share it copy-on-write
+
+Usage: python warmstart.py app.py --workers 4 [--port 8000] [--host 127.0.0.1] [-- extra chainlit args]
+"""
+
+import argparse
+import gc
+import importlib
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from typing import Callable, Dict, Any, List, Tuple
+import metrics
+
+# WARM_START modes:
+#   "background" - import heavy libraries and build shared state in a thread after startup (default)
+#   "eager"      - do it before the entry module finishes importing
+#   "off"        - nothing ahead of time; the first turn pays for it
+MODE = os.getenv("WARM_START", "background")
+
+# Libraries imported once by the prefork launcher (missing ones are skipped)
+PRELOAD = ("chainlit", "litellm", "agents", "openai", "httpx", "dotenv",
+           "metrics", "scheduler", "state", "dice", "rules", "compaction", "conversation", "session_store",
+           "prompts", "router", "speculation", "response_cache")
+
+_lock = threading.Lock()
+_steps: List[Tuple[str, Callable]] = []
+_status: Dict[str, Any] = {"ready": False, "mode": MODE, "pid": os.getpid(), "seconds": None,
+                           "steps": {}, "errors": {}}
+_process_started = time.perf_counter()
+
+
+class LazyModule:
+    """Stands in for a module until an attribute is first read or set"""
+
+    def __init__(self, name: str, on_load: Callable = None):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_on_load", on_load)
+        object.__setattr__(self, "_module", None)
+
+    def _load(self):
+        module = object.__getattribute__(self, "_module")
+        if module is not None:
+            return module
+        with _lock:
+            module = object.__getattribute__(self, "_module")
+            if module is None:
+                name = object.__getattribute__(self, "_name")
+                started = time.perf_counter()
+                module = importlib.import_module(name)
+                on_load = object.__getattribute__(self, "_on_load")
+                if on_load is not None:
+                    on_load(module)
+                object.__setattr__(self, "_module", module)
+                _status["steps"].setdefault(f"import {name}", round(time.perf_counter() - started, 4))
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr: str, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        module = object.__getattribute__(self, "_module")
+        return repr(module) if module is not None else f"<lazy module {object.__getattribute__(self, '_name')!r}>"
+
+
+def lazy_module(name: str, on_load: Callable = None) -> LazyModule:
+    """Module imported on first use (or during warm-up); on_load(module) runs once after import"""
+    return LazyModule(name, on_load)
+
+
+def load(module) -> Any:
+    """Import a lazy module now (no-op for a real module)"""
+    return module._load() if isinstance(module, LazyModule) else module
+
+
+def step(name: str, func: Callable):
+    """Register a warm-up step (import a library, build shared state)"""
+    _steps.append((name, func))
+
+
+def _run_steps():
+    started = time.perf_counter()
+    for name, func in _steps:
+        step_started = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            # Not fatal: the first turn that needs it will raise the real error
+            _status["errors"][name] = repr(e)
+            print(f"[WARN] Warm-up step {name} failed: {e}")
+        _status["steps"][name] = round(time.perf_counter() - step_started, 4)
+    _status["seconds"] = round(time.perf_counter() - started, 4)
+    _status["since_process_start"] = round(time.perf_counter() - _process_started, 4)
+    _status["ready"] = True
+
+
+def start():
+    """Warm up according to WARM_START; call at the end of the entry module"""
+    if MODE == "eager":
+        _run_steps()
+    elif MODE == "background":
+        threading.Thread(target=_run_steps, name="warmstart", daemon=True).start()
+    else:
+        _status["ready"] = True
+
+
+def ready() -> bool:
+    return _status["ready"]
+
+
+def status() -> Dict[str, Any]:
+    return dict(_status)
+
+
+def _probe() -> Tuple[int, bytes]:
+    return (200 if ready() else 503), json.dumps(status()).encode()
+
+
+metrics.add_route("/ready", _probe)
+metrics.add_route("/healthz", lambda: (200, b'{"alive": true}'))
+
+
+# Prefork launcher
+def preload(modules=PRELOAD) -> Dict[str, float]:
+    """Import shared libraries once and freeze them out of the GC so forked workers share their pages"""
+    timings = {}
+    for name in modules:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"[WARN] Preload skipped {name}: {e}")
+            continue
+        timings[name] = round(time.perf_counter() - started, 4)
+    gc.collect()
+    gc.freeze()
+    return timings
+
+
+def _run_worker(target: str, host: str, port: int, extra: List[str]):
+    sys.argv = ["chainlit", "run", target, "--headless", "--host", host, "--port", str(port), *extra]
+    from chainlit.cli import cli
+    try:
+        cli()
+    finally:
+        os._exit(0)
+
+
+def serve(target: str, workers: int, host: str, port: int, extra: List[str]):
+    """Fork `workers` Chainlit servers on consecutive ports, restarting any that exit"""
+    timings = preload()
+    print(f"[INFO] Preloaded {len(timings)} modules in {sum(timings.values()):.2f}s; starting {workers} workers")
+    children: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(target, host, port + index, extra)
+        children[pid] = index
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(workers):
+        spawn(index)
+    while children:
+        try:
+            pid, code = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if index is not None and not stopping:
+            print(f"[WARN] Worker {index} (pid {pid}) exited with status {code}; restarting")
+            spawn(index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefork Chainlit workers that share preloaded libraries")
+    parser.add_argument("target", help="entry module, e.g. app.py or main.py")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000, help="first worker's port; the others follow")
+    parser.add_argument("extra", nargs=argparse.REMAINDER, help="extra chainlit run arguments, after --")
+    args = parser.parse_args()
+    serve(args.target, args.workers, args.host, args.port, [a for a in args.extra if a != "--"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,478 @@
+"""
+Shared world
+One persistent world of locations, NPCs and items shared by every session of both entry points.
+The fixed part (locations, adjacency, name lookups, movement patterns) is indexed once; the
+changing part (where entities are, players per location, recent news) lives in immutable snapshots.
+Writers queue updates that are folded into a new snapshot at most every WORLD_PUBLISH_MS, so
+readers never take a lock, and each location's compact context card is rendered once per change
+and then reused by every turn played there
+"""
+
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, Any, Callable, Iterable, List, NamedTuple, Optional, Set, Tuple
+import metrics
+import session_store
+
+# GAME_WORLD=on gives the agents pre-retrieved location context, lets players move between
+# neighboring locations and shares news between players at the same place
+ENABLED = os.getenv("GAME_WORLD", "off") == "on"
+# World definition (JSON with "locations" and "entities"); the built-in world when unset
+PATH = os.getenv("WORLD_PATH", "")
+# Session store record the world's changing state is saved to ("" disables persistence)
+KEY = os.getenv("WORLD_KEY", "world:default")
+# Queued updates are published as a new snapshot at most this often
+PUBLISH_INTERVAL = float(os.getenv("WORLD_PUBLISH_MS", "50")) / 1000
+# A changed world is saved at most this often
+SAVE_INTERVAL = float(os.getenv("WORLD_SAVE_MS", "2000")) / 1000
+# News items kept per location
+NEWS_LIMIT = int(os.getenv("WORLD_NEWS_LIMIT", "8"))
+
+UPDATES = metrics.counter("game_world_updates_total", "Shared world updates applied, by kind")
+PUBLISH_SECONDS = metrics.histogram("game_world_publish_seconds", "Time to fold queued updates into a new snapshot",
+                                    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1))
+PLAYERS = metrics.gauge("game_world_players", "Players present in the shared world")
+
+# The built-in world; both entry points start in the village
+DEFAULT_WORLD = {
+    "locations": [
+        {"id": "village", "name": "Village", "description": "A quiet farming village with a well and a market square.",
+         "exits": ["forest", "river", "tavern", "road"], "aliases": ["town", "market"]},
+        {"id": "tavern", "name": "Tavern", "description": "The Sleeping Fox, smoky and loud, where travelers trade rumors.",
+         "exits": [], "aliases": ["inn"]},
+        {"id": "forest", "name": "Forest", "description": "Old pines close overhead; wolves hunt here after dark.",
+         "exits": ["ruins", "cave"], "aliases": ["woods"]},
+        {"id": "river", "name": "River", "description": "A wide, slow river crossed by a rope ferry.",
+         "exits": ["ruins"], "aliases": ["ferry"]},
+        {"id": "ruins", "name": "Ruins", "description": "A collapsed temple, its gate carved with glowing runes.",
+         "exits": [], "aliases": ["temple"]},
+        {"id": "cave", "name": "Cave", "description": "A damp cave that smells of smoke and old bones.",
+         "exits": ["mountain pass"], "aliases": []},
+        {"id": "road", "name": "King's Road", "description": "A rutted road where merchants travel under guard.",
+         "exits": ["mountain pass"], "aliases": ["road"]},
+        {"id": "mountain pass", "name": "Mountain Pass", "description": "A windy pass above the clouds, said to hide the Lost Gem.",
+         "exits": [], "aliases": ["pass", "mountains"]},
+    ],
+    "entities": [
+        {"id": "mara", "kind": "npc", "name": "Mara", "description": "innkeeper, hears every rumor", "location": "tavern"},
+        {"id": "borin", "kind": "npc", "name": "Borin", "description": "blacksmith, repairs arms", "location": "village"},
+        {"id": "elder", "kind": "npc", "name": "Elder Wyn", "description": "knows the tale of the Lost Gem", "location": "village"},
+        {"id": "ferryman", "kind": "npc", "name": "Old Tam", "description": "ferryman, asks a coin", "location": "river"},
+        {"id": "wizard", "kind": "npc", "name": "Ysolde", "description": "wizard studying the runes", "location": "ruins"},
+        {"id": "merchant", "kind": "npc", "name": "Pell", "description": "traveling merchant", "location": "road"},
+        {"id": "wolves", "kind": "creature", "name": "a wolf pack", "description": "hungry", "location": "forest"},
+        {"id": "troll", "kind": "creature", "name": "a cave troll", "description": "guards its hoard", "location": "cave"},
+        {"id": "lantern", "kind": "item", "name": "a rusty lantern", "description": "still holds oil", "location": "ruins"},
+        {"id": "rope", "kind": "item", "name": "a coil of rope", "description": "", "location": "river"},
+        {"id": "map", "kind": "item", "name": "a torn map", "description": "marks the pass", "location": "tavern"},
+    ],
+}
+
+MOVE_VERBS = ("go", "goes", "walk", "head", "travel", "enter", "return", "run", "ride", "climb", "sail", "journey",
+              "follow", "leave for", "set off", "cross", "move")
+
+
+class Location(NamedTuple):
+    id: str
+    name: str
+    description: str
+    exits: Tuple[str, ...]
+    aliases: Tuple[str, ...]
+
+
+class Entity(NamedTuple):
+    id: str
+    kind: str  # "npc", "creature" or "item"
+    name: str
+    description: str
+    location: Optional[str]
+
+
+class WorldEvent(NamedTuple):
+    version: int
+    location: str
+    text: str
+    session: Optional[str]
+    at: float
+
+
+class Graph:
+    """The world's fixed part: locations, symmetric adjacency and name lookups, built once"""
+
+    def __init__(self, locations: Iterable[Location]):
+        self.locations: Dict[str, Location] = {location.id: location for location in locations}
+        adjacency = {location_id: set() for location_id in self.locations}
+        for location in self.locations.values():
+            for exit_id in location.exits:
+                if exit_id not in self.locations:
+                    raise ValueError(f"Location {location.id!r} has an exit to unknown location {exit_id!r}")
+                adjacency[location.id].add(exit_id)
+                adjacency[exit_id].add(location.id)
+        self.adjacency: Dict[str, Tuple[str, ...]] = {key: tuple(sorted(value)) for key, value in adjacency.items()}
+        self.names: Dict[str, str] = {}
+        for location in self.locations.values():
+            for name in (location.id, location.name, *location.aliases):
+                self.names[name.lower()] = location.id
+        self.names_of: Dict[str, List[str]] = {}
+        for name, location_id in self.names.items():
+            self.names_of.setdefault(location_id, []).append(name)
+        self.moves = {}  # location -> movement pattern over its neighbors' names, compiled on first use
+
+    def _move_pattern(self, location_id: str):
+        names = sorted({name for other in self.adjacency[location_id] for name in self.names_of[other]},
+                       key=len, reverse=True)
+        if not names:
+            return None
+        verbs = "|".join(re.escape(verb) for verb in MOVE_VERBS)
+        return re.compile(rf"\b(?:{verbs})\b[^.!?]*?\b(?P<to>{'|'.join(re.escape(name) for name in names)})\b")
+
+    def resolve(self, name: Optional[str]) -> Optional[str]:
+        """Location id for an id, name or alias (any case)"""
+        return self.names.get(name.lower()) if name else None
+
+    def route(self, location: str, text: str) -> Optional[str]:
+        """The neighboring location a movement phrase in text heads to ("I head into the woods"), if any"""
+        location_id = self.resolve(location)
+        if location_id is None:
+            return None
+        pattern = self.moves.get(location_id, False)
+        if pattern is False:
+            pattern = self.moves[location_id] = self._move_pattern(location_id)
+        match = pattern.search(text.lower()) if pattern is not None else None
+        return self.names[match.group("to")] if match else None
+
+
+class Snapshot:
+    """Immutable view of the world; read it from any task or thread without locking"""
+
+    __slots__ = ("graph", "version", "entities", "at", "population", "news", "cards")
+
+    def __init__(self, graph: Graph, version: int, entities: Dict[str, Entity], at: Dict[str, Tuple[str, ...]],
+                 population: Dict[str, int], news: Dict[str, Tuple[WorldEvent, ...]], cards: Dict[str, str]):
+        self.graph = graph
+        self.version = version
+        self.entities = entities
+        self.at = at  # location -> ids of the entities there (inverted index)
+        self.population = population  # location -> players there
+        self.news = news  # location -> latest events there
+        self.cards = cards  # location -> rendered context, filled on first use
+
+    def here(self, location: str) -> List[Entity]:
+        return [self.entities[entity_id] for entity_id in self.at.get(self.graph.resolve(location), ())]
+
+    def context(self, location: str) -> str:
+        """Compact description of a location, its exits and who and what is there ("" if unknown)"""
+        location_id = self.graph.resolve(location)
+        if location_id is None:
+            return ""
+        card = self.cards.get(location_id)
+        if card is None:
+            # Concurrent readers may both render it; they store the same text
+            card = self.cards[location_id] = self._render(location_id)
+        return card
+
+    def _render(self, location_id: str) -> str:
+        graph = self.graph
+        location = graph.locations[location_id]
+        lines = [f"World - {location.name}: {location.description}"]
+        exits = ", ".join(graph.locations[other].name for other in graph.adjacency[location_id])
+        if exits:
+            lines.append(f"Exits: {exits}")
+        present = [self.entities[entity_id] for entity_id in self.at.get(location_id, ())]
+        people = [f"{e.name} ({e.description})" if e.description else e.name for e in present if e.kind != "item"]
+        if people:
+            lines.append(f"Here: {'; '.join(people)}")
+        items = [f"{e.name} ({e.description})" if e.description else e.name for e in present if e.kind == "item"]
+        if items:
+            lines.append(f"Items: {'; '.join(items)}")
+        return "\n".join(lines)
+
+    def news_since(self, location: str, version: int, exclude: Optional[str] = None) -> List[WorldEvent]:
+        """Events at a location after `version`, except those made by `exclude` (a session)"""
+        events = self.news.get(self.graph.resolve(location), ())
+        return [event for event in events if event.version > version and event.session != exclude]
+
+
+class EventBus:
+    """Synchronous fan-out of published world events, to all or to one location's subscribers"""
+
+    def __init__(self):
+        self.subscribers: Dict[Optional[str], List[Callable[[WorldEvent], None]]] = {}
+
+    def subscribe(self, callback: Callable[[WorldEvent], None], location: Optional[str] = None) -> Callable[[], None]:
+        """Call `callback` for each event (at `location` only, if given); returns an unsubscribe function"""
+        self.subscribers.setdefault(location, []).append(callback)
+        return lambda: self.subscribers[location].remove(callback)
+
+    def publish(self, events: List[WorldEvent]):
+        for event in events:
+            for callback in (*self.subscribers.get(None, ()), *self.subscribers.get(event.location, ())):
+                try:
+                    callback(event)
+                except Exception as e:
+                    print(f"[WARN] World event subscriber failed: {e}")
+
+
+class World:
+    """Single writer over a series of snapshots; updates are queued and published in batches
+
+    publish_interval: seconds queued updates wait for more before they are published
+    (None: only explicit publish() calls publish, e.g. from a batch job)
+    """
+
+    def __init__(self, graph: Graph, entities: Iterable[Entity], publish_interval: Optional[float] = PUBLISH_INTERVAL,
+                 news_limit: int = NEWS_LIMIT):
+        self.graph = graph
+        self.publish_interval = publish_interval
+        self.news_limit = news_limit
+        entities = {entity.id: entity for entity in entities}
+        at: Dict[str, Tuple[str, ...]] = {}
+        for entity in entities.values():
+            if entity.location is not None:
+                at[entity.location] = at.get(entity.location, ()) + (entity.id,)
+        self.snapshot = Snapshot(graph, 0, entities, at, {}, {}, {})
+        self.players: Dict[str, str] = {}  # session -> location
+        self.pending: List[tuple] = []
+        self.lock = threading.Lock()
+        self.scheduled = False
+        self.bus = EventBus()
+        self.store = None
+        self.key = KEY
+        self.stored_version = 0  # version of the world record last loaded or saved
+        self.changed: Set[str] = set()  # entities moved or added here since the last save
+        self.saving: Optional[asyncio.Task] = None
+        self.restoring: Optional[asyncio.Task] = None
+
+    def context(self, location: str) -> str:
+        return self.snapshot.context(location)
+
+    # Updates (queued; visible once published)
+
+    def move_player(self, session: str, location: Optional[str]):
+        self._queue(("player", session, self.graph.resolve(location)))
+
+    def leave(self, session: str):
+        self._queue(("player", session, None))
+
+    def place(self, entity_id: str, location: Optional[str]):
+        """Move an entity (None takes it out of the world, e.g. an item a player picked up)"""
+        self._queue(("place", entity_id, self.graph.resolve(location)))
+
+    def add_entity(self, entity: Entity):
+        self._queue(("add", entity))
+
+    def post(self, location: str, text: str, session: Optional[str] = None):
+        """News at a location, shown to the other players there"""
+        location_id = self.graph.resolve(location)
+        if location_id is not None:
+            self._queue(("news", location_id, text, session))
+
+    def _queue(self, update: tuple):
+        with self.lock:
+            self.pending.append(update)
+            if self.scheduled or self.publish_interval is None:
+                return
+            self.scheduled = True
+        try:
+            asyncio.get_running_loop().call_later(self.publish_interval, self.publish)
+        except RuntimeError:
+            self.publish()  # no event loop: publish at once
+
+    def publish(self) -> Snapshot:
+        """Fold queued updates into a new snapshot; unchanged parts are shared with the previous one"""
+        started = time.perf_counter()
+        with self.lock:
+            updates, self.pending = self.pending, []
+            self.scheduled = False
+            old = self.snapshot
+            if not updates:
+                return old
+            entities, at, population, news = old.entities, old.at, old.population, old.news
+            copied = set()
+            dirty = set()
+            events = []
+            version = old.version
+            for update in updates:
+                version += 1
+                kind = update[0]
+                UPDATES.inc(kind=kind)
+                if kind == "player":
+                    _, session, location = update
+                    if "population" not in copied:
+                        population = dict(population)
+                        copied.add("population")
+                    previous = self.players.pop(session, None)
+                    if previous is not None:
+                        population[previous] -= 1
+                    if location is not None:
+                        self.players[session] = location
+                        population[location] = population.get(location, 0) + 1
+                elif kind in ("place", "add"):
+                    if kind == "add":
+                        entity = update[1]
+                        previous = entities.get(entity.id)
+                    else:
+                        previous = entities.get(update[1])
+                        if previous is None:
+                            continue
+                        entity = previous._replace(location=update[2])
+                    if "entities" not in copied:
+                        entities, at = dict(entities), dict(at)
+                        copied.add("entities")
+                    entities[entity.id] = entity
+                    self.changed.add(entity.id)
+                    if previous is not None and previous.location is not None:
+                        at[previous.location] = tuple(e for e in at.get(previous.location, ()) if e != entity.id)
+                        dirty.add(previous.location)
+                    if entity.location is not None:
+                        at[entity.location] = at.get(entity.location, ()) + (entity.id,)
+                        dirty.add(entity.location)
+                elif kind == "news":
+                    _, location, text, session = update
+                    if "news" not in copied:
+                        news = dict(news)
+                        copied.add("news")
+                    event = WorldEvent(version, location, text, session, time.time())
+                    news[location] = (news.get(location, ()) + (event,))[-self.news_limit:]
+                    events.append(event)
+            # Cards of locations whose entities did not change carry over (dict() copies in one step,
+            # while readers may be adding cards)
+            cards = old.cards
+            if dirty:
+                cards = dict(cards)
+                for key in dirty:
+                    cards.pop(key, None)
+            snapshot = self.snapshot = Snapshot(self.graph, version, entities, at, population, news, cards)
+        PLAYERS.set(len(self.players))
+        PUBLISH_SECONDS.observe(time.perf_counter() - started)
+        self.bus.publish(events)
+        if self.store is not None and (events or dirty):
+            self._schedule_save()
+        return snapshot
+
+    # Persistence (entities and news; players rejoin with their sessions)
+
+    def to_state(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            "version": snapshot.version,
+            "entities": [list(entity) for entity in snapshot.entities.values()],
+            "news": [list(event) for events in snapshot.news.values() for event in events],
+        }
+
+    def _index(self, entities: Dict[str, Entity]) -> Dict[str, Tuple[str, ...]]:
+        at: Dict[str, Tuple[str, ...]] = {}
+        for entity in entities.values():
+            if entity.location in self.graph.locations:
+                at[entity.location] = at.get(entity.location, ()) + (entity.id,)
+        return at
+
+    def restore_state(self, state: Dict[str, Any]):
+        entities = {row[0]: Entity(*row) for row in state["entities"]}
+        at = self._index(entities)
+        news: Dict[str, Tuple[WorldEvent, ...]] = {}
+        for row in state["news"]:
+            event = WorldEvent(*row)
+            if event.location in self.graph.locations:
+                news[event.location] = news.get(event.location, ()) + (event,)
+        with self.lock:
+            self.snapshot = Snapshot(self.graph, state["version"], entities, at, dict(self.snapshot.population), news, {})
+
+    def merge_state(self, state: Dict[str, Any], changed: Iterable[str] = ()):
+        """Fold in a world another process saved: its news joins ours (as new events), and its entities
+        replace ours except the ones changed here since our last save"""
+        with self.lock:
+            old = self.snapshot
+            keep = set(changed) | self.changed
+            version = max(old.version, state["version"]) + 1
+            entities = dict(old.entities)
+            for row in state["entities"]:
+                if row[0] not in keep:
+                    entities[row[0]] = Entity(*row)
+            known = {event[1:] for events in old.news.values() for event in events}
+            news = {location: list(events) for location, events in old.news.items()}
+            events = []
+            for row in state["news"]:
+                event = WorldEvent(*row)
+                if event.location in self.graph.locations and event[1:] not in known:
+                    event = event._replace(version=version)
+                    news.setdefault(event.location, []).append(event)
+                    events.append(event)
+            news = {location: tuple(sorted(items, key=lambda event: event.at)[-self.news_limit:])
+                    for location, items in news.items()}
+            self.snapshot = Snapshot(self.graph, version, entities, self._index(entities), old.population, news, {})
+        UPDATES.inc(kind="merge")
+        self.bus.publish(events)
+
+    async def restore(self, store, key: str = KEY):
+        """Load the saved world once, then keep saving changes to the store (await it at session start)"""
+        if not key:
+            return
+        if self.restoring is None:
+            self.restoring = asyncio.ensure_future(self._restore(store, key))
+        await self.restoring
+
+    async def _restore(self, store, key: str):
+        record, self.stored_version = await store.load(key)
+        if record is not None:
+            self.restore_state(record["world"])
+        self.store, self.key = store, key
+
+    def _schedule_save(self):
+        if self.saving is None or self.saving.done():
+            try:
+                self.saving = asyncio.get_running_loop().create_task(self._save_later())
+            except RuntimeError:
+                pass  # saved with the next change made inside the event loop
+
+    async def _save_later(self):
+        await asyncio.sleep(SAVE_INTERVAL)
+        with self.lock:
+            changed, self.changed = self.changed, set()
+        for _ in range(3):
+            try:
+                self.stored_version = await self.store.save(self.key, {"world": self.to_state()}, self.stored_version)
+                return
+            except session_store.VersionConflict:
+                # Another process saved in between: take in its news and moves, then save the merged world
+                record, self.stored_version = await self.store.load(self.key)
+                if record is not None:
+                    self.merge_state(record["world"], changed)
+        with self.lock:
+            self.changed |= changed
+        print("[WARN] Shared world was not saved (version conflict)")
+
+
+def load_definition(path: str = PATH) -> Dict[str, Any]:
+    if not path:
+        return DEFAULT_WORLD
+    with open(path) as f:
+        return json.load(f)
+
+
+def build(definition: Dict[str, Any], **options) -> World:
+    graph = Graph(Location(row["id"], row.get("name", row["id"]), row.get("description", ""),
+                           tuple(row.get("exits", ())), tuple(row.get("aliases", ())))
+                  for row in definition["locations"])
+    entities = [Entity(row["id"], row.get("kind", "npc"), row.get("name", row["id"]), row.get("description", ""),
+                       row.get("location")) for row in definition.get("entities", ())]
+    return World(graph, entities, **options)
+
+
+_world: Optional[World] = None
+
+
+def get_world() -> World:
+    """The process-wide shared world (built from WORLD_PATH or the built-in world)"""
+    global _world
+    if _world is None:
+        _world = build(load_definition())
+    return _world
+
+
+def world_from_env() -> Optional[World]:
+    return get_world() if ENABLED else None